@@ -1,7 +1,5 @@
 from importlib import import_module as _import_module
 
-from . import gff, hmmer3, protein
-from ._cli import cli
 from ._testit import test
 
 try:
@@ -9,6 +7,23 @@ try:
 except ModuleNotFoundError:
     __version__ = "x.x.x"
 
+# Submodules are imported on first access, so that the command line interface
+# starts without loading nmm, imm, and pandas.
+_LAZY_SUBMODULES = ["gff", "hmmer3", "protein"]
+
+
+def __getattr__(name: str):
+    if name in _LAZY_SUBMODULES:
+        return _import_module(f"{__name__}.{name}")
+    if name == "cli":
+        return getattr(_import_module(f"{__name__}._cli"), "cli")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals().keys()) + _LAZY_SUBMODULES + ["cli"])
+
+
 __all__ = [
     "__version__",
     "cli",
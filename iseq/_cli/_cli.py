@@ -1,30 +1,96 @@
+from importlib import import_module
+from typing import Dict, List, NamedTuple, Optional
+
 import click
 
-from ._plot import plot
-from .amino_decode import amino_decode
-from .bscan import bscan
-from .gff_filter import gff_filter
-from .hscan import hscan
-from .press import press
-from .pscan import pscan
-from .pscan2 import pscan2
-from .pscan3 import pscan3
+LazyCommand = NamedTuple(
+    "LazyCommand", [("module", str), ("attr", str), ("short_help", str)]
+)
+
+
+class LazyGroup(click.Group):
+    """
+    Command group that imports a subcommand only when it is invoked.
+
+    Subcommands pull in heavy dependencies (nmm, imm, pandas, hmmer, ...) at
+    import time. Listing them in the group's help uses the short help given
+    here instead, so that neither ``iseq --help`` nor a subcommand pays for the
+    imports of the others.
+
+    Parameters
+    ----------
+    lazy_commands
+        Subcommands by name.
+    """
+
+    def __init__(
+        self, *args, lazy_commands: Optional[Dict[str, LazyCommand]] = None, **kwargs
+    ):
+        super().__init__(*args, **kwargs)
+        self._lazy_commands: Dict[str, LazyCommand] = dict(lazy_commands or {})
+
+    def list_commands(self, ctx: click.Context) -> List[str]:
+        names = set(super().list_commands(ctx)) | set(self._lazy_commands.keys())
+        return sorted(names)
 
+    def get_command(self, ctx: click.Context, cmd_name: str):
+        cmd = super().get_command(ctx, cmd_name)
+        if cmd is not None or cmd_name not in self._lazy_commands:
+            return cmd
 
-@click.group(name="iseq", context_settings=dict(help_option_names=["-h", "--help"]))
+        lazy = self._lazy_commands[cmd_name]
+        cmd = getattr(import_module(lazy.module, __package__), lazy.attr)
+        self.add_command(cmd, cmd_name)
+        return cmd
+
+    def format_commands(self, ctx: click.Context, formatter: click.HelpFormatter):
+        rows = []
+        for name in self.list_commands(ctx):
+            cmd = self.commands.get(name, None)
+            if cmd is None:
+                short_help = self._lazy_commands[name].short_help
+                cmd = click.Command(name, short_help=short_help)
+            if not cmd.hidden:
+                limit = formatter.width - 6 - len(name)
+                rows.append((name, cmd.get_short_help_str(limit)))
+
+        if len(rows) > 0:
+            with formatter.section("Commands"):
+                formatter.write_dl(rows)
+
+
+_SEARCH_HELP = "Search nucleotide sequence(s) against a protein profiles database."
+
+
+@click.group(
+    name="iseq",
+    cls=LazyGroup,
+    context_settings=dict(help_option_names=["-h", "--help"]),
+    lazy_commands={
+        "amino-decode": LazyCommand(".amino_decode", "amino_decode", ""),
+        "bscan": LazyCommand(".bscan", "bscan", "Binary scan."),
+        "gff-filter": LazyCommand(
+            ".gff_filter", "gff_filter", "Filter out items from a GFF_FILE file."
+        ),
+        "hscan": LazyCommand(
+            ".hscan",
+            "hscan",
+            "Search nucleotide sequence(s) against a profiles database.",
+        ),
+        "merge": LazyCommand(".merge", "merge", "Merge the outputs of sharded scans."),
+        "plot": LazyCommand("._plot", "plot", "Plot."),
+        "press": LazyCommand(
+            ".press",
+            "press",
+            "Convert a protein profiles database into binary models for bscan.",
+        ),
+        "pscan": LazyCommand(".pscan", "pscan", _SEARCH_HELP),
+        "pscan2": LazyCommand(".pscan2", "pscan2", _SEARCH_HELP),
+        "pscan3": LazyCommand(".pscan3", "pscan3", _SEARCH_HELP),
+    },
+)
 @click.version_option()
 def cli():
     """
     Find nucleotide sequences against protein profiles.
     """
-
-
-cli.add_command(amino_decode)
-cli.add_command(bscan)
-cli.add_command(gff_filter)
-cli.add_command(hscan)
-cli.add_command(plot)
-cli.add_command(press)
-cli.add_command(pscan)
-cli.add_command(pscan2)
-cli.add_command(pscan3)
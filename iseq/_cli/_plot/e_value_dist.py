@@ -1,7 +1,5 @@
 import click
 
-from iseq.gff import read as read_gff
-
 
 @click.command()
 @click.argument("gff_file", type=click.File("r"))
@@ -25,6 +23,8 @@ def e_value_dist(gff_file, output, quiet: bool):
     from matplotlib import pyplot as plt
     from numpy import finfo, log10
 
+    from iseq.gff import read as read_gff
+
     gff = read_gff(gff_file, verbose=not quiet)
     df = gff.to_dataframe()
 
@@ -1,7 +1,5 @@
 import click
 
-from iseq.gff import read as read_gff
-
 
 @click.command()
 @click.argument("gff_file", type=click.File("r"))
@@ -33,6 +31,8 @@ def length_ratio(
     from hmmer_reader import fetch_metadata
     from matplotlib import pyplot as plt
 
+    from iseq.gff import read as read_gff
+
     gff = read_gff(gff_file, verbose=not quiet)
     df = gff.to_dataframe()
 
@@ -1,7 +1,5 @@
 import click
 
-from iseq.gff import read as read_gff
-
 
 @click.command()
 @click.argument("gff_file", type=click.File("r"))
@@ -26,6 +24,8 @@ def profile_dist(gff_file, output, width, height, quiet: bool):
     import seaborn as sns
     from matplotlib import pyplot as plt
 
+    from iseq.gff import read as read_gff
+
     gff = read_gff(gff_file, verbose=not quiet)
     df = gff.to_dataframe()
 
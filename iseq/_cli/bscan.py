@@ -1,124 +1,154 @@
 import os
+import queue
 import sys
-import time
-from math import exp
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import Queue
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
 import click
-from fasta_reader import FASTAWriter, read_fasta
+from fasta_reader import FASTAItem, FASTAWriter, read_fasta
 from hmmer import HMMER
 from nmm import DNAAlphabet, Input, IUPACAminoAlphabet, RNAAlphabet
 from tqdm import tqdm
 
 from iseq.alphabet import alphabet_name
 from iseq.codon_table import CodonTable
+from iseq.gencode import GeneticCode
+from iseq.hmmer_index import index_hmmer
+from iseq.press_index import (
+    PressConfig,
+    PressedEntry,
+    PressedKmerTables,
+    open_pressed_index,
+    open_pressed_kmer_tables,
+    pressed_prefix,
+    read_press_header,
+)
 from iseq.profile import ProfileID
 from iseq.protein import ProteinProfile
 
 from .debug_writer import DebugWriter
 from .output_writer import OutputWriter
 from .pscan import infer_target_alphabet, update_gff_file
-
-
-class Counter:
-    def __init__(self):
-        self._count = 0
-
-    def increment(self):
-        self._count += 1
-
-    def get_and_reset(self):
-        count = self._count
-        self._count = 0
-        return count
+from .shard import SHARD, make_shard, shard_profiles, target_in_shard
+
+# Hits and debug rows of one profile against every target. `position` is the
+# profile position in the scanned list, which fixes the output order.
+ProfileResult = NamedTuple(
+    "ProfileResult",
+    [
+        ("position", int),
+        ("items", List[Tuple[tuple, str, str]]),
+        ("debug_rows", List[Tuple[str, list]]),
+    ],
+)
 
 
 class Worker:
     def __init__(
         self,
-        counter: Counter,
-        alt_filepath,
-        null_filepath,
-        target_abc_name: str,
+        prefix: str,
+        config: PressConfig,
         debug: bool,
+        engine: str,
     ):
-        self._counter = counter
-        self._afile = Input.create(alt_filepath)
-        self._nfile = Input.create(null_filepath)
-        if target_abc_name == "dna":
+        self._afile = Input.create((prefix + ".alt").encode())
+        self._nfile = Input.create((prefix + ".null").encode())
+        self._kmer_tables: Optional[PressedKmerTables] = None
+        if engine == "numpy":
+            self._kmer_tables = open_pressed_kmer_tables(prefix)
+        self._engine = engine
+        if config.alphabet == "dna":
             target_abc = DNAAlphabet()
-        elif target_abc_name == "rna":
+        elif config.alphabet == "rna":
             target_abc = RNAAlphabet()
         else:
             raise RuntimeError()
-        self._gcode = CodonTable(target_abc, IUPACAminoAlphabet())
-        self._output_items = []
-        self._codon_seqs = []
-        self._amino_seqs = []
+        gencode = GeneticCode(id=config.genetic_code)
+        self._gcode = CodonTable(target_abc, IUPACAminoAlphabet(), gencode)
         self._debug = debug
-        self._debug_table = []
-        self._seqids = []
-
-    def set_offset(self, alt_offset, null_offset):
-        self._afile.fseek(alt_offset)
-        self._nfile.fseek(null_offset)
-
-    def search(self, profids, targets, window):
-        for profid in iter([ProfileID(*i.split("\t")) for i in profids]):
-            alt = self._afile.read()
-            null = self._nfile.read()
-            prof = ProteinProfile.create_from_binary(profid, null, alt)
-            epsilon = prof.epsilon
-            prof.window_length = window
-
-            for tgt in targets:
-                seq = prof.create_sequence(tgt.sequence.encode())
-                search_results = prof.search(seq)
-                ifragments = search_results.ifragments()
-                seqid = f"{tgt.id}"
-
-                for ifrag in ifragments:
-                    start = ifrag.interval.start
-                    stop = ifrag.interval.stop
-                    self._output_items.append(
-                        (
-                            seqid,
-                            alphabet_name(self._gcode.base_alphabet),
-                            prof.profid,
-                            alphabet_name(prof.alphabet),
-                            start,
-                            stop,
-                            prof.window_length,
-                            {"Epsilon": epsilon},
-                        )
-                    )
-                    codon_frag = ifrag.fragment.decode()
-                    self._codon_seqs.append(str(codon_frag.sequence))
-                    amino_frag = codon_frag.decode(self._gcode)
-                    self._amino_seqs.append(str(amino_frag.sequence))
-
-                if self._debug:
-                    self._debug_table += search_results.debug_table()
-                self._seqids.append(seqid)
-
-            self._counter.increment()
-
-        self._afile.close()
-        self._nfile.close()
-
-    def output_items(self):
-        return self._output_items
-
-    def codon_seqs(self):
-        return self._codon_seqs
-
-    def amino_seqs(self):
-        return self._amino_seqs
-
-    def debug_table(self):
-        return self._debug_table
-
-    def seqids(self):
-        return self._seqids
+
+    def search(
+        self,
+        position: int,
+        db_idx: int,
+        entry: PressedEntry,
+        targets: List[FASTAItem],
+        window: int,
+    ) -> ProfileResult:
+        profid = ProfileID(entry.name, entry.acc)
+        self._afile.fseek(entry.alt_offset)
+        self._nfile.fseek(entry.null_offset)
+        alt = self._afile.read()
+        null = self._nfile.read()
+        prof = ProteinProfile.create_from_binary(profid, null, alt)
+        epsilon = prof.epsilon
+        prof.window_length = window
+        if self._kmer_tables is not None:
+            prof.kmer_tables = self._kmer_tables[db_idx]
+        prof.engine = self._engine
+
+        result = ProfileResult(position, [], [])
+        for tgt in targets:
+            seq = prof.create_sequence(tgt.sequence.encode())
+            search_results = prof.search(seq)
+            ifragments = search_results.ifragments()
+            seqid = f"{tgt.id}"
+
+            for ifrag in ifragments:
+                start = ifrag.interval.start
+                stop = ifrag.interval.stop
+                item = (
+                    seqid,
+                    alphabet_name(self._gcode.base_alphabet),
+                    prof.profid,
+                    alphabet_name(prof.alphabet),
+                    start,
+                    stop,
+                    prof.window_length,
+                    {"Epsilon": epsilon},
+                )
+                codon_frag = ifrag.fragment.decode()
+                amino_frag = codon_frag.decode(self._gcode)
+                codon = str(codon_frag.sequence)
+                amino = str(amino_frag.sequence)
+                result.items.append((item, codon, amino))
+
+            if self._debug:
+                for row in search_results.debug_table():
+                    result.debug_rows.append((seqid, row))
+
+        return result
+
+
+# Per-process state of the scanning processes, set by `_init_process`.
+_worker: Optional[Worker] = None
+_targets: List[FASTAItem] = []
+_window = 0
+_results: Optional[Queue] = None
+
+
+def _init_process(
+    prefix: str,
+    config: PressConfig,
+    targets: List[FASTAItem],
+    window: int,
+    debug: bool,
+    engine: str,
+    results: Queue,
+):
+    global _worker, _targets, _window, _results
+    _worker = Worker(prefix, config, debug, engine)
+    _targets = targets
+    _window = window
+    _results = results
+
+
+def _search_task(positions: List[int], db_idxs: List[int], entries: List[PressedEntry]):
+    assert _worker is not None and _results is not None
+    for pos, db_idx, entry in zip(positions, db_idxs, entries):
+        # Blocks while the parent is behind reading the results.
+        _results.put(_worker.search(pos, db_idx, entry, _targets, _window))
 
 
 @click.command()
@@ -127,6 +157,21 @@ class Worker:
     type=click.Path(exists=True, dir_okay=False, readable=True, resolve_path=True),
 )
 @click.argument("target", type=click.File("r"))
+@click.option(
+    "--epsilon", type=float, default=1e-2, help="Indel probability. Defaults to 1e-2."
+)
+@click.option(
+    "--model",
+    type=click.Choice(["1", "2"]),
+    help="Model 1 or 2. Defaults to 1.",
+    default="1",
+)
+@click.option(
+    "--genetic-code",
+    type=int,
+    help="NCBI genetic code id. Defaults to 1.",
+    default=1,
+)
 @click.option(
     "--output",
     type=click.Path(exists=False, dir_okay=False, writable=True, resolve_path=True),
@@ -180,9 +225,37 @@ class Worker:
     default="item",
     type=str,
 )
+@click.option(
+    "--profile-key",
+    "profile_keys",
+    help="Scan only the profile of this accession or name; may be given more than once. Defaults to all profiles.",
+    multiple=True,
+    type=str,
+)
+@click.option(
+    "--shard",
+    type=SHARD,
+    help="Only scan shard I of N, given as I/N; combine the shards with `iseq merge`. Defaults to none, which scans everything.",
+    default=None,
+)
+@click.option(
+    "--shard-by",
+    type=click.Choice(["profiles", "targets"]),
+    help="Split the profiles into contiguous ranges of similar total length, or deal the targets in blocks of bases. Defaults to `profiles`.",
+    default="profiles",
+)
+@click.option(
+    "--engine",
+    type=click.Choice(["imm", "numpy"]),
+    help="Viterbi engine: the generic state-graph one, or one vectorised over the profile nodes that uses the k-mer tables stored by `iseq press --kmer-tables`, building them if missing. Defaults to `imm`.",
+    default="imm",
+)
 def bscan(
     profile,
     target,
+    epsilon: float,
+    model: str,
+    genetic_code: int,
     output,
     ocodon,
     oamino,
@@ -192,9 +265,17 @@ def bscan(
     e_value: bool,
     ncpus: str,
     hit_prefix: str,
+    profile_keys: Tuple[str, ...],
+    shard: Optional[Tuple[int, int]],
+    shard_by: str,
+    engine: str,
 ):
     """
     Binary scan.
+
+    Search nucleotide sequence(s) against a protein profiles database pressed
+    by `iseq press` with the same model, target alphabet, epsilon and genetic
+    code.
     """
 
     num_cpus: int = 0
@@ -204,26 +285,6 @@ def bscan(
     else:
         num_cpus = int(ncpus)
 
-    alt_offsets = [int(line.strip()) for line in open(profile + ".alt.idx", "r")]
-    null_offsets = [int(line.strip()) for line in open(profile + ".null.idx", "r")]
-
-    num_cpus = min(num_cpus, len(alt_offsets))
-
-    owriter = OutputWriter(output, item_prefix=hit_prefix)
-    cwriter = FASTAWriter(ocodon, sys.maxsize)
-    awriter = FASTAWriter(oamino, sys.maxsize)
-    dwriter = DebugWriter(odebug)
-
-    alt_filepath = (profile + ".alt").encode()
-    null_filepath = (profile + ".null").encode()
-    meta_filepath = (profile + ".meta").encode()
-
-    profids_list = list(
-        split([line.strip() for line in open(meta_filepath, "r")], num_cpus)
-    )
-    alt_offsets = [i[0] for i in split(alt_offsets, num_cpus)]
-    null_offsets = [i[0] for i in split(null_offsets, num_cpus)]
-
     target_abc = infer_target_alphabet(target)
     if isinstance(target_abc, DNAAlphabet):
         tgt_abc_id = "dna"
@@ -232,46 +293,101 @@ def bscan(
     else:
         raise RuntimeError()
 
+    config = PressConfig(model, tgt_abc_id, epsilon, genetic_code)
+    prefix = pressed_prefix(profile, config)
+    if not os.path.exists(prefix + ".alt"):
+        opts = f"--model {model} --alphabet {tgt_abc_id} --epsilon {epsilon:g}"
+        opts += f" --genetic-code {genetic_code}"
+        raise click.UsageError(f"PROFILE is not pressed; run `iseq press {opts}`.")
+    if read_press_header(prefix) != config:
+        raise click.UsageError(f"{prefix} was not pressed with the requested options.")
+
+    index = open_pressed_index(prefix)
+    if len(profile_keys) > 0:
+        try:
+            db_idxs = [index.find(key) for key in profile_keys]
+        except KeyError as e:
+            raise click.BadParameter(str(e.args[0]), param_hint="--profile-key")
+    else:
+        db_idxs = list(range(len(index)))
+    entries = [index[i] for i in db_idxs]
+
+    job_shard = make_shard(shard, shard_by)
+    profiles = shard_profiles(_model_lengths(profile, db_idxs, entries), job_shard)
+    db_idxs = db_idxs[profiles.start : profiles.stop]
+    entries = entries[profiles.start : profiles.stop]
+
+    num_cpus = max(min(num_cpus, len(entries)), 1)
+
+    owriter = OutputWriter(output, item_prefix=hit_prefix)
+    cwriter = FASTAWriter(ocodon, sys.maxsize)
+    awriter = FASTAWriter(oamino, sys.maxsize)
+    dwriter = DebugWriter(odebug)
+
+    targets: List[FASTAItem] = []
+    offset = 0
     with read_fasta(target) as fasta:
-        targets = list(fasta)
-
-    workers = []
-    i = 0
-    counter = Counter()
-    for aoffset, noffset, profids in zip(alt_offsets, null_offsets, profids_list):
-        debug = odebug is not os.devnull
-        w = Worker(counter, alt_filepath, null_filepath, tgt_abc_id, debug)
-        w.set_offset(aoffset, noffset)
-        w.search(profids, targets, window)
-        workers.append(w)
-        i += 1
-
-    total = sum(len(profids) for profids in profids_list)
-    sleep_time = round(
-        max(0.3, 10 - 10 * exp(1 / 10.0) / exp(min(num_cpus / 10.0, 100)))
-    )
-    with tqdm(total=total, desc="Scan") as pbar:
-        while total > 0:
-            time.sleep(sleep_time)
-            v = counter.get_and_reset()
-            total -= v
-            pbar.update(v)
-
-    for w in workers:
-        output_items = w.output_items()
-        codon_seqs = w.codon_seqs()
-        amino_seqs = w.amino_seqs()
-        for item, cseq, aseq in zip(output_items, codon_seqs, amino_seqs):
+        for item in fasta:
+            if target_in_shard(offset, job_shard):
+                targets.append(item)
+            offset += len(item.sequence)
+
+    def write_result(result: ProfileResult):
+        for item, cseq, aseq in result.items:
             item_id = owriter.write_item(*item)
             cwriter.write_item(item_id, cseq)
             awriter.write_item(item_id, aseq)
-
-    if odebug is not os.devnull:
-        for w in workers:
-            seqids = w.seqids()
-            debug_table = w.debug_table()
-            for seqid, debug_row in zip(seqids, debug_table):
-                dwriter.write_row(seqid, debug_row)
+        for seqid, debug_row in result.debug_rows:
+            dwriter.write_row(seqid, debug_row)
+
+    debug = odebug is not os.devnull
+    results: Queue = Queue(maxsize=4 * num_cpus)
+    initargs = (prefix, config, targets, window, debug, engine, results)
+    tasks = split_tasks(len(entries), num_cpus)
+    # Profiles that may be scanned ahead of the next one to be written, which
+    # bounds the results waiting to be written in order.
+    lookahead = 2 * num_cpus * len(tasks[0]) if len(tasks) > 0 else 0
+    with ProcessPoolExecutor(
+        max_workers=num_cpus, initializer=_init_process, initargs=initargs
+    ) as executor:
+        # Small tasks handed out in database order keep the profiles being
+        # scanned close together, so few results wait to be written in order.
+        futures: List[Future] = []
+
+        def submit_tasks(next_position: int):
+            while len(futures) < len(tasks):
+                positions = tasks[len(futures)]
+                if positions[0] >= next_position + lookahead:
+                    break
+                task_idxs = [db_idxs[i] for i in positions]
+                task_entries = [entries[i] for i in positions]
+                futures.append(
+                    executor.submit(_search_task, positions, task_idxs, task_entries)
+                )
+
+        pending: Dict[int, ProfileResult] = {}
+        next_position = 0
+        submit_tasks(next_position)
+        with tqdm(total=len(entries), desc="Scan", disable=quiet) as pbar:
+            while next_position < len(entries):
+                try:
+                    profile_result = results.get(timeout=1.0)
+                except queue.Empty:
+                    for f in futures:
+                        if f.done() and f.exception() is not None:
+                            _abort_scan(executor, futures, results)
+                            raise f.exception()
+                    continue
+
+                pending[profile_result.position] = profile_result
+                while next_position in pending:
+                    write_result(pending.pop(next_position))
+                    next_position += 1
+                submit_tasks(next_position)
+                pbar.update(1)
+
+        for f in futures:
+            f.result()
 
     owriter.close()
     cwriter.close()
@@ -284,6 +400,39 @@ def bscan(
         update_gff_file(output, result.tbl)
 
 
-def split(a, n):
-    k, m = divmod(len(a), n)
-    return (a[i * k + min(i, m) : (i + 1) * k + min(i + 1, m)] for i in range(n))
+def _model_lengths(
+    profile: str, db_idxs: List[int], entries: List[PressedEntry]
+) -> List[int]:
+    """
+    Model lengths of the entries, read from PROFILE if the index lacks them.
+    """
+    lengths = [e.model_length for e in entries]
+    if all(length is not None for length in lengths):
+        return [length for length in lengths if length is not None]
+    blocks = index_hmmer(profile)
+    return [blocks[i].model_length for i in db_idxs]
+
+
+def _abort_scan(executor: ProcessPoolExecutor, futures: List[Future], results: Queue):
+    """
+    Cancel the tasks not yet started and let the running ones finish.
+
+    Running tasks may be blocked on the full results queue, so it is drained
+    until they are done; otherwise, shutting the pool down would hang.
+    """
+    for f in futures:
+        f.cancel()
+    executor.shutdown(wait=False)
+    while not all(f.done() for f in futures):
+        try:
+            results.get(timeout=0.1)
+        except queue.Empty:
+            pass
+
+
+def split_tasks(n: int, num_cpus: int, max_size: int = 16) -> List[List[int]]:
+    """
+    Split positions ``0..n-1`` into consecutive tasks, several per process.
+    """
+    size = max(min(n // (4 * num_cpus), max_size), 1)
+    return [list(range(i, min(i + size, n))) for i in range(0, n, size)]
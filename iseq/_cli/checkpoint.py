@@ -0,0 +1,98 @@
+import json
+import os
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional, Union
+
+__all__ = ["Checkpoint", "CheckpointState", "truncate_files"]
+
+CHECKPOINT_VERSION = 1
+
+# Progress of a scan. Target chunks before `chunk` are done, and so are the
+# profiles before `profile` in chunk `chunk`. `offsets` are the sizes of the
+# output files once that work was flushed to them.
+CheckpointState = NamedTuple(
+    "CheckpointState",
+    [
+        ("chunk", int),
+        ("profile", int),
+        ("item_idx", int),
+        ("offsets", Dict[str, int]),
+        ("spool_size", int),
+        ("prefilter_stats", Dict[str, int]),
+        ("scan_done", bool),
+        ("done", bool),
+    ],
+)
+
+
+class Checkpoint:
+    """
+    Manifest of a resumable scan.
+
+    The manifest is a JSON file rewritten atomically at each checkpoint. It
+    records how far the scan went and how long each output file was at that
+    point, so that a resumed scan can drop whatever was written after the
+    last checkpoint and carry on from there.
+
+    Parameters
+    ----------
+    filepath
+        Manifest file.
+    fingerprint
+        Inputs and options of the scan. Resuming a scan whose fingerprint
+        differs is refused.
+    """
+
+    def __init__(self, filepath: Union[str, Path], fingerprint: dict):
+        self._filepath = Path(filepath)
+        self._fingerprint = fingerprint
+
+    @property
+    def filepath(self) -> Path:
+        return self._filepath
+
+    def load(self) -> Optional[CheckpointState]:
+        """
+        Saved progress, or `None` if nothing was saved yet.
+        """
+        if not self._filepath.exists():
+            return None
+
+        with open(self._filepath, "r") as file:
+            manifest = json.load(file)
+
+        if manifest.get("version", None) != CHECKPOINT_VERSION:
+            raise ValueError(f"Unsupported checkpoint file {self._filepath}.")
+
+        if manifest["fingerprint"] != self._fingerprint:
+            raise ValueError(
+                f"Checkpoint file {self._filepath} belongs to a different scan."
+            )
+
+        return CheckpointState(**manifest["state"])
+
+    def save(self, state: CheckpointState):
+        """
+        Save progress.
+        """
+        manifest = {
+            "version": CHECKPOINT_VERSION,
+            "fingerprint": self._fingerprint,
+            "state": state._asdict(),
+        }
+        tmppath = self._filepath.with_name(self._filepath.name + ".tmp")
+        with open(tmppath, "w") as file:
+            json.dump(manifest, file, indent=2)
+            file.write("\n")
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmppath, self._filepath)
+
+
+def truncate_files(filepaths: Dict[str, str], offsets: Dict[str, int]):
+    """
+    Cut output files back to their sizes at a checkpoint.
+    """
+    for key, filepath in filepaths.items():
+        with open(filepath, "ab") as file:
+            file.truncate(offsets[key])
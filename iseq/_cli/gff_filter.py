@@ -2,8 +2,6 @@ import sys
 
 import click
 
-from iseq.gff import read as read_gff
-
 
 @click.command()
 @click.argument("gff_file", type=click.File("r"))
@@ -19,6 +17,7 @@ def gff_filter(gff_file, max_e_value):
 
     The resulting file will be written to the standard output.
     """
+    from iseq.gff import read as read_gff
 
     gff = read_gff(gff_file)
 
@@ -0,0 +1,88 @@
+import os
+import pickle
+import tempfile
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+from .scheduler import TileHit
+
+__all__ = ["HitSpool"]
+
+
+class HitSpool:
+    """
+    Hits spilled to a temporary file until their E-values are known.
+
+    Hits are appended as pickle records and read back once, in order, so that
+    the output files can be filtered and numbered in a single write.
+
+    Parameters
+    ----------
+    directory
+        Directory of the temporary file. Defaults to `None`, which means the
+        system default.
+    filepath
+        Append to this file instead, which already holds `size` hits. Defaults
+        to `None`.
+    size
+        Number of hits already in `filepath`. Defaults to 0.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[Union[str, Path]] = None,
+        filepath: Optional[Union[str, Path]] = None,
+        size: int = 0,
+    ):
+        if filepath is None:
+            fd, self._filepath = tempfile.mkstemp(
+                prefix=".iseq-", suffix=".hits", dir=directory
+            )
+            self._file = os.fdopen(fd, "wb")
+        else:
+            self._filepath = str(filepath)
+            self._file = open(self._filepath, "ab")
+        self._pickler = pickle.Pickler(self._file, pickle.HIGHEST_PROTOCOL)
+        self._size = size
+
+    def append(self, hit: TileHit):
+        self._pickler.dump(hit)
+        # Hits are independent; forget them so the pickler does not hold on
+        # to every object it has written.
+        self._pickler.clear_memo()
+        self._size += 1
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def filepath(self) -> str:
+        return self._filepath
+
+    def flush(self):
+        self._file.flush()
+
+    def __iter__(self) -> Iterator[TileHit]:
+        self._file.flush()
+        with open(self._filepath, "rb") as file:
+            unpickler = pickle.Unpickler(file)
+            for _ in range(self._size):
+                yield unpickler.load()
+
+    def close(self):
+        """
+        Close and remove the temporary file.
+        """
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self._filepath):
+            os.remove(self._filepath)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        del exception_type
+        del exception_value
+        del traceback
+        self.close()
@@ -1,7 +1,6 @@
 import os
 
 import click
-from fasta_reader import read_fasta
 from hmmer_reader import open_hmmer
 
 from iseq.alphabet import alphabet_name
@@ -11,6 +10,7 @@ from iseq.model import EntryDistr
 
 from .debug_writer import DebugWriter
 from .output_writer import OutputWriter
+from .target_reader import TargetReader
 
 
 @click.command()
@@ -51,6 +51,18 @@ from .output_writer import OutputWriter
     help="Save debug info into a tab-separated values file.",
     default=os.devnull,
 )
+@click.option(
+    "--chunk-size",
+    type=int,
+    help="Number of target bases to hold in memory at a time. Each chunk is scanned against every profile before the next one is read, so items are listed chunk by chunk and, within a chunk, profile by profile. Defaults to 100000000.",
+    default=100_000_000,
+)
+@click.option(
+    "--engine",
+    type=click.Choice(["imm", "numpy"]),
+    help="Viterbi engine: the generic state-graph one, or one vectorised over the profile nodes. Defaults to `imm`.",
+    default="imm",
+)
 def hscan(
     profile,
     target,
@@ -60,6 +72,8 @@ def hscan(
     hmmer3_compat: bool,
     entry_distr: str,
     odebug,
+    chunk_size: int,
+    engine: str,
 ):
     """
     Search nucleotide sequence(s) against a profiles database.
@@ -82,33 +96,36 @@ def hscan(
     else:
         click.get_text_stream("stdout")
 
-    with read_fasta(target) as fasta:
-        targets = list(fasta)
+    reader = TargetReader(target, chunk_size)
+    for chunk_idx, targets in enumerate(reader):
+        if chunk_idx > 0:
+            profile.seek(0)
 
-    for plain_model in open_hmmer(profile):
-        model = HMMERModel(plain_model)
-        prof = create_profile(model, hmmer3_compat, edistr, window)
-        for tgt in targets:
-            seq = prof.create_sequence(tgt.sequence.encode())
-            search_results = prof.search(seq)
-            ifragments = search_results.ifragments()
-            seqid = f"{tgt.id}"
-            for interval in [i.interval for i in ifragments]:
-                start = interval.start
-                stop = interval.stop
-                owriter.write_item(
-                    seqid,
-                    alphabet_name(seq.alphabet),
-                    prof.profid,
-                    alphabet_name(prof.alphabet),
-                    start,
-                    stop,
-                    prof.window_length,
-                )
+        for plain_model in open_hmmer(profile):
+            model = HMMERModel(plain_model)
+            prof = create_profile(model, hmmer3_compat, edistr, window, engine)
+            for tgt in targets:
+                seq = prof.create_sequence(tgt.sequence.encode())
+                search_results = prof.search(seq)
+                ifragments = search_results.ifragments()
+                seqid = f"{tgt.id}"
+                for interval in [i.interval for i in ifragments]:
+                    start = interval.start
+                    stop = interval.stop
+                    owriter.write_item(
+                        seqid,
+                        alphabet_name(seq.alphabet),
+                        prof.profid,
+                        alphabet_name(prof.alphabet),
+                        start,
+                        stop,
+                        prof.window_length,
+                    )
 
-            if odebug is not os.devnull:
-                for i in search_results.debug_table():
-                    dwriter.write_row(seqid, i)
+                if odebug is not os.devnull:
+                    for i in search_results.debug_table():
+                        dwriter.write_row(seqid, i)
+    reader.close()
 
     owriter.close()
     odebug.close_intelligently()
@@ -0,0 +1,178 @@
+import os
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+import click
+from fasta_reader import FASTAItem, FASTAWriter, read_fasta
+
+from iseq.gff import GFFItem, GFFWriter
+
+__all__ = ["merge"]
+
+# Output files of one shard.
+ShardFiles = NamedTuple(
+    "ShardFiles", [("output", str), ("ocodon", str), ("oamino", str)]
+)
+
+
+@click.command()
+@click.argument(
+    "shards",
+    nargs=-1,
+    required=True,
+    type=click.Path(exists=True, file_okay=False, readable=True, resolve_path=True),
+)
+@click.option(
+    "--shard-output",
+    help="Name of the GFF file in each shard directory. Defaults to `output.gff`.",
+    default="output.gff",
+)
+@click.option(
+    "--shard-ocodon",
+    help="Name of the codon FASTA file in each shard directory. Defaults to `ocodon.fasta`.",
+    default="ocodon.fasta",
+)
+@click.option(
+    "--shard-oamino",
+    help="Name of the amino acid FASTA file in each shard directory. Defaults to `oamino.fasta`.",
+    default="oamino.fasta",
+)
+@click.option(
+    "--output",
+    type=click.Path(exists=False, dir_okay=False, writable=True, resolve_path=True),
+    help="Save results to OUTPUT (GFF format).",
+    default="output.gff",
+)
+@click.option(
+    "--ocodon",
+    type=click.Path(exists=False, dir_okay=False, writable=True, resolve_path=True),
+    help="Save codon sequences to OCODON (FASTA format).",
+    default="ocodon.fasta",
+)
+@click.option(
+    "--oamino",
+    type=click.Path(exists=False, dir_okay=False, writable=True, resolve_path=True),
+    help="Save amino acid sequences to OAMINO (FASTA format).",
+    default="oamino.fasta",
+)
+@click.option(
+    "--hit-prefix",
+    help="Hit prefix. Defaults to `item`.",
+    default="item",
+    type=str,
+)
+@click.option(
+    "--e-value-z",
+    type=click.Choice(["models", "sequences"]),
+    help="What the database size of the shard E-values counts: profiles, which do not depend on the shard (pscan2, pscan3 and in-process E-values), or the amino acid sequences of the shard searched by HMMER (pscan and bscan). Defaults to `models`.",
+    default="models",
+)
+def merge(
+    shards: Tuple[str, ...],
+    shard_output: str,
+    shard_ocodon: str,
+    shard_oamino: str,
+    output: str,
+    ocodon: str,
+    oamino: str,
+    hit_prefix: str,
+    e_value_z: str,
+):
+    """
+    Merge the outputs of sharded scans.
+
+    Each SHARDS directory holds the outputs of a scan run with `--shard I/N`.
+    Items are written in the order the directories are given, and within a
+    shard in their original order, and renumbered from one.
+
+    E-values computed by HMMER against the amino acid sequences of a shard
+    account for that shard only. With `--e-value-z sequences`, they are scaled
+    to the number of sequences of every shard together.
+    """
+    files = [
+        ShardFiles(
+            os.path.join(d, shard_output),
+            os.path.join(d, shard_ocodon),
+            os.path.join(d, shard_oamino),
+        )
+        for d in shards
+    ]
+    for f in files:
+        for filepath in f:
+            if not os.path.isfile(filepath):
+                raise click.UsageError(f"{filepath} does not exist.")
+            if filepath in (output, ocodon, oamino):
+                raise click.UsageError(f"{filepath} would be overwritten.")
+
+    db_sizes: List[Optional[int]] = [None] * len(files)
+    if e_value_z == "sequences":
+        db_sizes = [_count_items(f.oamino) for f in files]
+    total = sum(n for n in db_sizes if n is not None)
+
+    with open(files[0].output, "r") as file:
+        header = file.readline().rstrip()
+
+    owriter = GFFWriter(output, header)
+    cwriter = FASTAWriter(ocodon)
+    awriter = FASTAWriter(oamino)
+
+    item_idx = 1
+    for f, db_size in zip(files, db_sizes):
+        scale = total / db_size if db_size else None
+        for item, codon, amino in _iter_shard(f):
+            item_id = f"{hit_prefix}{item_idx}"
+            item.set_attribute("ID", item_id)
+            if scale is not None:
+                _scale_e_value(item, scale)
+            owriter.write_item(item)
+            cwriter.write_item(item_id, codon.sequence)
+            awriter.write_item(item_id, amino.sequence)
+            item_idx += 1
+
+    owriter.close()
+    cwriter.close()
+    awriter.close()
+
+
+def _iter_shard(files: ShardFiles) -> Iterator[Tuple[GFFItem, FASTAItem, FASTAItem]]:
+    with open(files.output, "r") as gff:
+        with read_fasta(files.ocodon) as cfasta, read_fasta(files.oamino) as afasta:
+            citems = iter(cfasta)
+            aitems = iter(afasta)
+            for row in gff:
+                if row.startswith("#"):
+                    continue
+                item = GFFItem(*row.rstrip("\n").split("\t"))
+                item_id = item.get_attribute("ID")
+                codon = next(citems, None)
+                amino = next(aitems, None)
+                for fasta_item, filepath in [
+                    (codon, files.ocodon),
+                    (amino, files.oamino),
+                ]:
+                    if fasta_item is None or fasta_item.id != item_id:
+                        raise click.ClickException(
+                            f"{filepath} does not match {files.output} at {item_id}."
+                        )
+                yield item, codon, amino
+
+            if next(citems, None) is not None or next(aitems, None) is not None:
+                raise click.ClickException(
+                    f"{files.ocodon} or {files.oamino} has items missing from "
+                    f"{files.output}."
+                )
+
+
+def _count_items(filepath: str) -> int:
+    with read_fasta(filepath) as fasta:
+        return sum(1 for _ in fasta)
+
+
+def _scale_e_value(item: GFFItem, scale: float):
+    atts = dict(item.attributes_astuple())
+    if "E-value" not in atts:
+        return
+    try:
+        e_value = float(atts["E-value"])
+    except ValueError:
+        return
+    item.set_attribute("E-value", f"{e_value * scale:.2g}")
@@ -8,11 +8,40 @@ __all__ = ["OutputWriter"]
 
 
 class OutputWriter:
-    def __init__(self, file: Union[str, Path, IO[str]], item_prefix="item"):
-        self._gff = GFFWriter(file)
-        self._item_idx = 1
+    """
+    GFF writer of scan hits.
+
+    Parameters
+    ----------
+    file
+        File path or IO stream.
+    item_prefix
+        Prefix of item IDs. Defaults to `item`.
+    item_idx
+        Number of the next item ID. Defaults to 1.
+    append
+        Append items to an existing file, without writing the header. Defaults
+        to `False`.
+    """
+
+    def __init__(
+        self,
+        file: Union[str, Path, IO[str]],
+        item_prefix="item",
+        item_idx: int = 1,
+        append: bool = False,
+    ):
+        self._gff = GFFWriter(file, append=append)
+        self._item_idx = item_idx
         self._item_prefix = item_prefix
 
+    @property
+    def item_idx(self) -> int:
+        """
+        Number of the next item ID.
+        """
+        return self._item_idx
+
     def write_item(
         self,
         seqid: str,
@@ -23,9 +52,18 @@ class OutputWriter:
         end: int,
         window_length: int,
         att: Optional[dict] = None,
+        trailing_att: Optional[dict] = None,
     ):
+        """
+        Write an item and return its ID.
+
+        Attributes of `att` are written in key order, followed by those of
+        `trailing_att` in their own order.
+        """
         if att is None:
             att = dict()
+        if trailing_att is None:
+            trailing_att = dict()
 
         item_id = f"{self._item_prefix}{self._item_idx}"
         atts = f"ID={item_id}"
@@ -36,12 +74,20 @@ class OutputWriter:
         atts += f";Window={window_length}"
         for k in sorted(att.keys()):
             atts += f";{k}={att[k]}"
+        for k, v in trailing_att.items():
+            atts += f";{k}={v}"
 
         item = GFFItem(seqid, "iseq", ".", start + 1, end, "0.0", "+", ".", atts)
         self._gff.write_item(item)
         self._item_idx += 1
         return item_id
 
+    def flush(self):
+        """
+        Flush the associated stream.
+        """
+        self._gff.flush()
+
     def close(self):
         """
         Close the associated stream.
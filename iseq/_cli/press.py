@@ -1,9 +1,44 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from hashlib import blake2b
+from typing import BinaryIO, Dict, List, NamedTuple, Optional, Tuple
+
 import click
-from hmmer_reader import num_models, open_hmmer
-from nmm import DNAAlphabet, Model, Output
+from nmm import DNAAlphabet, Model, Output, RNAAlphabet
 
+from iseq.gencode import GeneticCode
+from iseq.hmmer_index import HMMERBlock, index_hmmer, read_hmmer_block
 from iseq.hmmer_model import HMMERModel
-from iseq.protein import create_profile
+from iseq.press_index import (
+    KMER_DTYPE,
+    PressConfig,
+    PressedIndex,
+    open_pressed_index,
+    open_pressed_kmer_tables,
+    pressed_index_filepath,
+    pressed_prefix,
+    read_pressed_offsets,
+    write_press_header,
+    write_pressed_index,
+)
+from iseq.protein import create_profile, create_profile2
+
+# Location of a binary model: file, offset and size.
+Blob = NamedTuple("Blob", [("filepath", str), ("offset", int), ("size", int)])
+
+# Binaries of one model: alt and null models, and k-mer tables if pressed.
+ModelBlobs = Tuple[Blob, Blob, Optional[Blob]]
+
+PressChunk = NamedTuple(
+    "PressChunk",
+    [
+        ("positions", List[int]),
+        ("blocks", List[HMMERBlock]),
+        ("alt_filepath", str),
+        ("null_filepath", str),
+        ("kmer_filepath", str),
+    ],
+)
 
 
 @click.command()
@@ -12,7 +47,29 @@ from iseq.protein import create_profile
     type=click.Path(exists=True, dir_okay=False, readable=True, resolve_path=True),
 )
 @click.option(
-    "--epsilon", type=float, default=1e-2, help="Indel probability. Defaults to 1e-2."
+    "--epsilon",
+    type=float,
+    multiple=True,
+    default=[1e-2],
+    help="Indel probability; may be given more than once to press one database per value. Defaults to 1e-2.",
+)
+@click.option(
+    "--model",
+    type=click.Choice(["1", "2"]),
+    help="Model 1 or 2. Defaults to 1.",
+    default="1",
+)
+@click.option(
+    "--alphabet",
+    type=click.Choice(["dna", "rna"]),
+    help="Target alphabet. Defaults to `dna`.",
+    default="dna",
+)
+@click.option(
+    "--genetic-code",
+    type=int,
+    help="NCBI genetic code id. Defaults to 1.",
+    default=1,
 )
 @click.option(
     "--quiet/--no-quiet",
@@ -20,45 +77,220 @@ from iseq.protein import create_profile
     help="Disable standard output.",
     default=False,
 )
+@click.option(
+    "--ncpus",
+    help="Number of processes building models. Defaults to `auto`.",
+    default="auto",
+    type=str,
+)
+@click.option(
+    "--incremental/--no-incremental",
+    help="Only rebuild models whose HMM text changed since the last press, copying the others from the existing binaries. Defaults to False.",
+    default=False,
+)
+@click.option(
+    "--kmer-tables/--no-kmer-tables",
+    help="Also store the emission log-probabilities of every k-mer of one to five bases for each state, used by `bscan --engine numpy`. Takes about 22 kB per state. Defaults to False.",
+    default=False,
+)
 def press(
     profile,
-    epsilon: float,
+    epsilon: Tuple[float, ...],
+    model: str,
+    alphabet: str,
+    genetic_code: int,
     quiet,
+    ncpus: str,
+    incremental: bool,
+    kmer_tables: bool,
 ):
     """
-    Press.
+    Convert a protein profiles database into binary models for bscan.
 
-    TODO: fix this doc.
-    Search nucleotide sequence(s) against a protein profiles database.
-
-    An OUTPUT line determines an association between a TARGET subsequence and
-    a PROFILE protein profile. An association maps a target subsequence to a
-    profile and represents a potential homology. Expect many false positive
-    associations as we are not filtering out by statistical significance.
+    One database is pressed per EPSILON value. The default configuration
+    (model 1, DNA, epsilon 1e-2 and the standard genetic code) is written
+    next to PROFILE; other configurations get their own tagged files. Each
+    database records its configuration in a header file.
     """
+    num_cpus: int = 0
+    if ncpus == "auto":
+        count = os.cpu_count()
+        num_cpus = count if count is not None else 1
+    else:
+        num_cpus = int(ncpus)
+
+    try:
+        GeneticCode(id=genetic_code)
+    except KeyError:
+        raise click.BadParameter(
+            f"Unknown genetic code {genetic_code}.", param_hint="--genetic-code"
+        )
+
+    blocks = index_hmmer(profile)
+    for eps in epsilon:
+        config = PressConfig(model, alphabet, eps, genetic_code)
+        _press_variant(
+            profile, blocks, config, num_cpus, incremental, kmer_tables, quiet
+        )
+
+
+def _press_variant(
+    profile: str,
+    blocks: List[HMMERBlock],
+    config: PressConfig,
+    num_cpus: int,
+    incremental: bool,
+    kmer_tables: bool,
+    quiet: bool,
+):
     from tqdm import tqdm
 
-    alt_filepath = (profile + ".alt").encode()
-    null_filepath = (profile + ".null").encode()
-    meta_filepath = (profile + ".meta").encode()
+    prefix = pressed_prefix(profile, config)
+    digests = _block_digests(profile, blocks, config)
 
-    base_abc = DNAAlphabet()
+    # Binaries of unchanged models, keyed by their database position.
+    reused: Dict[int, ModelBlobs] = {}
+    if incremental and pressed_index_filepath(prefix).exists():
+        reused = _reusable_blobs(prefix, open_pressed_index(prefix), digests)
+        if kmer_tables and any(b[2] is None for b in reused.values()):
+            # Models pressed without k-mer tables need them built.
+            reused = {}
 
-    if quiet:
-        total = 0
-    else:
-        click.echo("Estimating the number of models... ", nl=False)
-        total = num_models(profile)
-        click.echo("done.")
-
-    with Output.create(alt_filepath) as afile:
-        with Output.create(null_filepath) as nfile:
-            with open(meta_filepath, "w") as mfile:
-                parser = open_hmmer(profile)
-                desc = "Pressing"
-                for plain_model in tqdm(parser, total=total, desc=desc, disable=quiet):
-                    model = HMMERModel(plain_model)
-                    prof = create_profile(model, base_abc, 0, epsilon)
+    changed = [i for i in range(len(blocks)) if i not in reused]
+    if not quiet and incremental:
+        click.echo(f"Rebuilding {len(changed)} of {len(blocks)} models.")
+
+    num_cpus = max(min(num_cpus, len(changed)), 1)
+    chunks = _create_chunks(prefix, blocks, changed, num_cpus * 4)
+
+    built: Dict[int, ModelBlobs] = {}
+    desc = f"Pressing (epsilon={config.epsilon:g})"
+    try:
+        with tqdm(total=len(changed), desc=desc, disable=quiet) as pbar:
+            if num_cpus == 1:
+                for chunk in chunks:
+                    built.update(_press_chunk(profile, chunk, config, kmer_tables))
+                    pbar.update(len(chunk.positions))
+            else:
+                with ProcessPoolExecutor(max_workers=num_cpus) as executor:
+                    futures = {
+                        executor.submit(
+                            _press_chunk, profile, chunk, config, kmer_tables
+                        ): chunk
+                        for chunk in chunks
+                    }
+                    for f in as_completed(futures):
+                        built.update(f.result())
+                        pbar.update(len(futures[f].positions))
+
+        blobs = [built[i] if i in built else reused[i] for i in range(len(blocks))]
+        _assemble(prefix + ".alt", [b[0] for b in blobs])
+        _assemble(prefix + ".null", [b[1] for b in blobs])
+        if kmer_tables:
+            _assemble(prefix + ".kmer", [_kmer_blob(b) for b in blobs])
+        else:
+            _remove_pressed(prefix + ".kmer")
+    finally:
+        for chunk in chunks:
+            _remove_pressed(chunk.alt_filepath)
+            _remove_pressed(chunk.null_filepath)
+            _remove_pressed(chunk.kmer_filepath)
+
+    with open(prefix + ".meta", "w") as mfile:
+        for block in blocks:
+            mfile.write(f"{block.name}\t{block.acc}\n")
+
+    names = [block.name for block in blocks]
+    accs = [block.acc for block in blocks]
+    model_lengths = [block.model_length for block in blocks]
+    write_pressed_index(prefix, names, accs, model_lengths, digests)
+    write_press_header(prefix, config)
+
+
+def _block_digests(profile: str, blocks: List[HMMERBlock], config: PressConfig):
+    digests: List[str] = []
+    with open(profile, "rb") as file:
+        for block in blocks:
+            file.seek(block.offset)
+            h = blake2b(f"{tuple(config)!r}\n".encode(), digest_size=16)
+            h.update(file.read(block.size))
+            digests.append(h.hexdigest())
+    return digests
+
+
+def _reusable_blobs(
+    prefix: str, index: PressedIndex, digests: List[str]
+) -> Dict[int, ModelBlobs]:
+    """
+    Binaries of the previous press whose HMM text and settings are unchanged.
+
+    K-mer tables are only available if the previous press stored them.
+    """
+    kmers: List[Optional[Blob]] = [None] * len(index)
+    if open_pressed_kmer_tables(prefix) is not None:
+        kmers = list(_blobs(prefix + ".kmer"))
+        if len(kmers) != len(index):
+            kmers = [None] * len(index)
+
+    old: Dict[str, ModelBlobs] = {}
+    for e, kmer in zip(index, kmers):
+        if e.digest == "":
+            continue
+        alt = Blob(prefix + ".alt", e.alt_offset, e.alt_size)
+        null = Blob(prefix + ".null", e.null_offset, e.null_size)
+        old[e.digest] = (alt, null, kmer)
+
+    return {i: old[d] for i, d in enumerate(digests) if d in old}
+
+
+def _create_chunks(
+    prefix: str, blocks: List[HMMERBlock], positions: List[int], num_chunks: int
+) -> List[PressChunk]:
+    chunks: List[PressChunk] = []
+    dirname, basename = os.path.split(prefix)
+    k, m = divmod(len(positions), max(num_chunks, 1))
+    start = 0
+    for i in range(max(num_chunks, 1)):
+        stop = start + k + (1 if i < m else 0)
+        if stop == start:
+            break
+        pos = positions[start:stop]
+        prefix = os.path.join(dirname, f".{basename}.{os.getpid()}.{i}")
+        chunk = PressChunk(
+            pos,
+            [blocks[j] for j in pos],
+            prefix + ".alt",
+            prefix + ".null",
+            prefix + ".kmer",
+        )
+        chunks.append(chunk)
+        start = stop
+    return chunks
+
+
+def _press_chunk(
+    profile: str, chunk: PressChunk, config: PressConfig, kmer_tables: bool
+) -> Dict[int, ModelBlobs]:
+    """
+    Build the models of a chunk into their own binary files.
+    """
+    base_abc = DNAAlphabet() if config.alphabet == "dna" else RNAAlphabet()
+    gencode = GeneticCode(id=config.genetic_code)
+    create = create_profile if config.model == "1" else create_profile2
+    kmer_offsets: List[int] = []
+    with Output.create(chunk.alt_filepath.encode()) as afile:
+        with Output.create(chunk.null_filepath.encode()) as nfile:
+            with open(chunk.kmer_filepath, "wb") as kfile:
+                for block in chunk.blocks:
+                    model = HMMERModel(read_hmmer_block(profile, block))
+                    prof = create(
+                        model,
+                        base_abc,
+                        0,
+                        config.epsilon,
+                        gencode,
+                        kmer_tables=kmer_tables,
+                    )
 
                     hmm = prof.alt_model.hmm
                     dp = hmm.create_dp(prof.alt_model.special_node.T)
@@ -68,6 +300,71 @@ def press(
                     dp = hmm.create_dp(prof.null_model.state)
                     nfile.write(Model.create(hmm, dp))
 
-                    name = model.model_id.name
-                    acc = model.model_id.acc
-                    mfile.write(f"{name}\t{acc}\n")
+                    kmer_offsets.append(kfile.tell())
+                    if prof.kmer_tables is not None:
+                        kfile.write(prof.kmer_tables.astype(KMER_DTYPE).tobytes())
+
+    with open(chunk.kmer_filepath + ".idx", "w") as file:
+        file.write("".join(f"{i}\n" for i in kmer_offsets))
+
+    alts = _blobs(chunk.alt_filepath)
+    nulls = _blobs(chunk.null_filepath)
+    kmers: List[Optional[Blob]] = [None] * len(alts)
+    if kmer_tables:
+        kmers = list(_blobs(chunk.kmer_filepath))
+    return {p: (a, n, k) for p, a, n, k in zip(chunk.positions, alts, nulls, kmers)}
+
+
+def _blobs(filepath: str) -> List[Blob]:
+    offsets, sizes = read_pressed_offsets(filepath)
+    return [Blob(filepath, o, s) for o, s in zip(offsets, sizes)]
+
+
+def _kmer_blob(blobs: ModelBlobs) -> Blob:
+    assert blobs[2] is not None
+    return blobs[2]
+
+
+def _assemble(filepath: str, blobs: List[Blob]):
+    """
+    Write the models in database order, followed by their offsets index.
+
+    Models are copied byte for byte. Whatever precedes the first model of a
+    source file is written once, at the start of the new file.
+    """
+    tmppath = f"{filepath}.{os.getpid()}.tmp"
+    files: Dict[str, BinaryIO] = {}
+    offsets: List[int] = []
+    try:
+        with open(tmppath, "wb") as dst:
+            dst.write(_read_header(blobs))
+            for blob in blobs:
+                src = files.get(blob.filepath, None)
+                if src is None:
+                    src = files[blob.filepath] = open(blob.filepath, "rb")
+                src.seek(blob.offset)
+                offsets.append(dst.tell())
+                dst.write(src.read(blob.size))
+    finally:
+        for src in files.values():
+            src.close()
+
+    with open(tmppath + ".idx", "w") as file:
+        file.write("".join(f"{i}\n" for i in offsets))
+    os.replace(tmppath, filepath)
+    os.replace(tmppath + ".idx", filepath + ".idx")
+
+
+def _read_header(blobs: List[Blob]) -> bytes:
+    if len(blobs) == 0:
+        return b""
+    filepath = blobs[0].filepath
+    offsets = read_pressed_offsets(filepath)[0]
+    with open(filepath, "rb") as file:
+        return file.read(offsets[0])
+
+
+def _remove_pressed(filepath: str):
+    for path in [filepath, filepath + ".idx"]:
+        if os.path.exists(path):
+            os.remove(path)
@@ -2,7 +2,8 @@ import os
 import re
 import sys
 from collections import OrderedDict
-from typing import IO, List
+from itertools import islice
+from typing import IO, List, Optional, Tuple
 
 import click
 from fasta_reader import FASTAWriter, read_fasta
@@ -14,11 +15,16 @@ from tqdm import tqdm
 
 from iseq.alphabet import alphabet_name, infer_fasta_alphabet, infer_hmmer_alphabet
 from iseq.codon_table import CodonTable
-from iseq.hmmer_model import HMMERModel
+from iseq.evalue import create_evalue
+from iseq.hmmer_cache import iter_hmmer_models
+from iseq.hmmer_index import index_hmmer
+from iseq.prefilter import Prefilter, PrefilterStats
 from iseq.protein import create_profile, create_profile2
 
 from .debug_writer import DebugWriter
 from .output_writer import OutputWriter
+from .shard import SHARD, make_shard, shard_profiles
+from .target_reader import open_targets
 
 
 @click.command()
@@ -83,6 +89,46 @@ from .output_writer import OutputWriter
     default="item",
     type=str,
 )
+@click.option(
+    "--chunk-size",
+    type=int,
+    help="Number of target bases to hold in memory at a time. Each chunk is scanned against every profile before the next one is read, so items are listed chunk by chunk and, within a chunk, profile by profile. Defaults to 100000000.",
+    default=100_000_000,
+)
+@click.option(
+    "--prefilter/--no-prefilter",
+    help="Screen targets with an ungapped, translated search first. Defaults to False.",
+    default=False,
+)
+@click.option(
+    "--prefilter-threshold",
+    type=float,
+    help="Prefilter sensitivity threshold in bits; lower is more sensitive. Defaults to 2.0.",
+    default=2.0,
+)
+@click.option(
+    "--e-value-source",
+    type=click.Choice(["hmmer", "iseq"]),
+    help="Compute E-values by running HMMER on the amino acid sequences, or in-process from the profiles' STATS LOCAL VITERBI lines. Defaults to `hmmer`.",
+    default="hmmer",
+)
+@click.option(
+    "--model-cache/--no-model-cache",
+    help="Read models from a PROFILE.arrays sidecar file, creating it on first use, instead of parsing PROFILE. Defaults to False.",
+    default=False,
+)
+@click.option(
+    "--shard",
+    type=SHARD,
+    help="Only scan shard I of N, given as I/N; combine the shards with `iseq merge`. Defaults to none, which scans everything.",
+    default=None,
+)
+@click.option(
+    "--shard-by",
+    type=click.Choice(["profiles", "targets"]),
+    help="Split the profiles into contiguous ranges of similar total length, or deal the targets in blocks of bases. Defaults to `profiles`.",
+    default="profiles",
+)
 def pscan(
     profile,
     target,
@@ -96,6 +142,13 @@ def pscan(
     e_value: bool,
     model: str,
     hit_prefix: str,
+    chunk_size: int,
+    prefilter: bool,
+    prefilter_threshold: float,
+    e_value_source: str,
+    model_cache: bool,
+    shard: Optional[Tuple[int, int]],
+    shard_by: str,
 ):
     """
     Search nucleotide sequence(s) against a protein profiles database.
@@ -113,7 +166,9 @@ def pscan(
 
     with open(profile, "r") as file:
         profile_abc = _infer_profile_alphabet(file)
-    target_abc = infer_target_alphabet(target)
+    job_shard = make_shard(shard, shard_by)
+    reader = open_targets(target, chunk_size, job_shard)
+    target_abc = reader.alphabet
 
     assert isinstance(target_abc, BaseAlphabet) and isinstance(
         profile_abc, AminoAlphabet
@@ -121,54 +176,78 @@ def pscan(
 
     gcode = CodonTable(target_abc, IUPACAminoAlphabet())
 
-    with read_fasta(target) as fasta:
-        targets = list(fasta)
-
+    prefilter_stats = PrefilterStats()
     total = num_models(profile)
-    for plain_model in tqdm(
-        open_hmmer(profile), desc="Models", total=total, disable=quiet
-    ):
-        hmodel = HMMERModel(plain_model)
-        if model == "1":
-            prof = create_profile(hmodel, gcode.base_alphabet, window, epsilon)
-        else:
-            prof = create_profile2(hmodel, gcode.base_alphabet, window, epsilon)
-            assert model == "2"
-
-        for tgt in tqdm(targets, desc="Targets", leave=False, disable=quiet):
-            seq = prof.create_sequence(tgt.sequence.encode())
-            search_results = prof.search(seq)
-            ifragments = search_results.ifragments()
-            seqid = f"{tgt.id}"
-
-            for ifrag in ifragments:
-                start = ifrag.interval.start
-                stop = ifrag.interval.stop
-                item_id = owriter.write_item(
-                    seqid,
-                    alphabet_name(seq.alphabet),
-                    prof.profid,
-                    alphabet_name(prof.alphabet),
-                    start,
-                    stop,
-                    prof.window_length,
-                    {"Epsilon": epsilon},
-                )
-                codon_frag = ifrag.fragment.decode()
-                cwriter.write_item(item_id, str(codon_frag.sequence))
-                amino_frag = codon_frag.decode(gcode)
-                awriter.write_item(item_id, str(amino_frag.sequence))
-
-            if odebug is not os.devnull:
-                for i in search_results.debug_table():
-                    dwriter.write_row(seqid, i)
+    profiles = range(total)
+    if job_shard is not None:
+        profiles = shard_profiles(
+            [b.model_length for b in index_hmmer(profile)], job_shard
+        )
+    for targets in reader:
+        hmodels = iter_hmmer_models(profile, model_cache)
+        hmodels = islice(hmodels, profiles.start, profiles.stop)
+        for hmodel in tqdm(hmodels, desc="Models", total=len(profiles), disable=quiet):
+            if model == "1":
+                prof = create_profile(hmodel, gcode.base_alphabet, window, epsilon)
+            else:
+                prof = create_profile2(hmodel, gcode.base_alphabet, window, epsilon)
+                assert model == "2"
+
+            in_process = e_value and e_value_source == "iseq"
+            if in_process:
+                prof.evalue = create_evalue(hmodel, total)
+
+            prefilt = Prefilter(hmodel, prefilter_threshold) if prefilter else None
+
+            for tgt in tqdm(targets, desc="Targets", leave=False, disable=quiet):
+                data = tgt.sequence.encode()
+                regions = None
+                if prefilt is not None:
+                    regions = prefilt.regions(data)
+                    prefilter_stats.update(len(data), regions)
+                    if len(regions) == 0:
+                        continue
+
+                seq = prof.create_sequence(data)
+                search_results = prof.search(seq, regions)
+                ifragments = search_results.ifragments()
+                seqid = f"{tgt.id}"
+
+                for ifrag in ifragments:
+                    start = ifrag.interval.start
+                    stop = ifrag.interval.stop
+                    att = {"Epsilon": epsilon}
+                    if in_process:
+                        att["E-value"] = f"{ifrag.e_value:.2g}"
+                    item_id = owriter.write_item(
+                        seqid,
+                        alphabet_name(seq.alphabet),
+                        prof.profid,
+                        alphabet_name(prof.alphabet),
+                        start,
+                        stop,
+                        prof.window_length,
+                        att,
+                    )
+                    codon_frag = ifrag.fragment.decode()
+                    cwriter.write_item(item_id, str(codon_frag.sequence))
+                    amino_frag = codon_frag.decode(gcode)
+                    awriter.write_item(item_id, str(amino_frag.sequence))
+
+                if odebug is not os.devnull:
+                    for i in search_results.debug_table():
+                        dwriter.write_row(seqid, i)
+    reader.close()
 
     owriter.close()
     cwriter.close()
     awriter.close()
     odebug.close_intelligently()
 
-    if e_value:
+    if prefilter and not quiet:
+        click.echo(str(prefilter_stats))
+
+    if e_value and e_value_source == "hmmer":
         hmmer = HMMER(profile)
         result = hmmer.search(oamino, "/dev/null", tblout=True)
         update_gff_file(output, result.tbl)
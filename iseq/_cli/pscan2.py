@@ -1,24 +1,29 @@
+import dataclasses
 import os
-import re
-from collections import OrderedDict
-from typing import IO, Dict, List, Set, Tuple
+import time
+from math import log
+from typing import IO, Dict, List, Optional, Tuple
 
 import click
-from fasta_reader import FASTAWriter, read_fasta
+from fasta_reader import FASTAWriter
 from hmmer import HMMER
 from hmmer.typing import DomTBLRow
-from hmmer_reader import num_models, open_hmmer
-from nmm import AminoAlphabet, BaseAlphabet, IUPACAminoAlphabet
+from hmmer_reader import open_hmmer
+from nmm import AminoAlphabet, BaseAlphabet
 from tqdm import tqdm
 
-from iseq.alphabet import alphabet_name, infer_fasta_alphabet, infer_hmmer_alphabet
-from iseq.codon_table import CodonTable
-from iseq.gff import read as read_gff
-from iseq.hmmer_model import HMMERModel
-from iseq.protein import create_profile2
+from iseq.alphabet import alphabet_name, infer_hmmer_alphabet
+from iseq.hmmer_cache import open_hmmer_cache
+from iseq.hmmer_index import index_hmmer
+from iseq.prefilter import PrefilterStats
 
+from .checkpoint import Checkpoint, CheckpointState, truncate_files
 from .debug_writer import DebugWriter
+from .hit_spool import HitSpool
 from .output_writer import OutputWriter
+from .scheduler import HitFilter, TileHit, TileScheduler
+from .shard import SHARD, make_shard, shard_profiles
+from .target_reader import open_targets
 
 
 @click.command()
@@ -83,6 +88,80 @@ from .output_writer import OutputWriter
     help="Enable use of profile's GA gathering cutoffs to set all thresholding. Defaults to True.",
     default=True,
 )
+@click.option(
+    "--chunk-size",
+    type=int,
+    help="Number of target bases to hold in memory at a time. Each chunk is scanned against every profile before the next one is read, so items are listed chunk by chunk and, within a chunk, profile by profile. Defaults to 100000000.",
+    default=100_000_000,
+)
+@click.option(
+    "--ncpus",
+    help="Number of processes scanning profile/target tiles. Defaults to `auto`.",
+    default="auto",
+    type=str,
+)
+@click.option(
+    "--prefilter/--no-prefilter",
+    help="Screen targets with an ungapped, translated search first. Defaults to False.",
+    default=False,
+)
+@click.option(
+    "--prefilter-threshold",
+    type=float,
+    help="Prefilter sensitivity threshold in bits; lower is more sensitive. Defaults to 2.0.",
+    default=2.0,
+)
+@click.option(
+    "--e-value-source",
+    type=click.Choice(["hmmer", "iseq"]),
+    help="Compute E-values by running HMMER on the amino acid sequences, or in-process from the profiles' STATS LOCAL VITERBI lines. Defaults to `hmmer`.",
+    default="hmmer",
+)
+@click.option(
+    "--model-cache/--no-model-cache",
+    help="Read models from a PROFILE.arrays sidecar file, creating it on first use, instead of parsing PROFILE. Defaults to False.",
+    default=False,
+)
+@click.option(
+    "--score-only/--no-score-only",
+    help="Only compute the Viterbi scores of windows, building the alignments of those that reach --min-score. Defaults to False.",
+    default=False,
+)
+@click.option(
+    "--min-score",
+    type=float,
+    help="Bit score a window needs to get its alignment built with --score-only, which requires it. Defaults to none.",
+    default=None,
+)
+@click.option(
+    "--checkpoint",
+    type=click.Path(exists=False, dir_okay=False, writable=True, resolve_path=True),
+    help="Record progress in CHECKPOINT so that the scan can be resumed. Defaults to none.",
+    default=None,
+)
+@click.option(
+    "--checkpoint-interval",
+    type=float,
+    help="Seconds between checkpoints. Defaults to 60.",
+    default=60.0,
+)
+@click.option(
+    "--resume/--no-resume",
+    help="Resume the scan recorded in --checkpoint, if any, appending to its outputs. Defaults to False.",
+    default=False,
+)
+@click.option(
+    "--shard",
+    type=SHARD,
+    help="Only scan shard I of N, given as I/N; combine the shards with `iseq merge`. Defaults to none, which scans everything.",
+    default=None,
+)
+@click.option(
+    "--shard-by",
+    type=click.Choice(["profiles", "targets"]),
+    help="Split the profiles into contiguous ranges of similar total length, or deal the targets in blocks of bases. Defaults to `profiles`.",
+    default="profiles",
+)
 def pscan2(
     profile,
     target,
@@ -96,6 +175,19 @@ def pscan2(
     max_e_value: float,
     hit_prefix: str,
     cut_ga: bool,
+    chunk_size: int,
+    ncpus: str,
+    prefilter: bool,
+    prefilter_threshold: float,
+    e_value_source: str,
+    model_cache: bool,
+    score_only: bool,
+    min_score: Optional[float],
+    checkpoint: Optional[str],
+    checkpoint_interval: float,
+    resume: bool,
+    shard: Optional[Tuple[int, int]],
+    shard_by: str,
 ):
     """
     Search nucleotide sequence(s) against a protein profiles database.
@@ -104,93 +196,278 @@ def pscan2(
     a PROFILE protein profile. An association maps a target subsequence to a
     profile and represents a potential homology. Expect many false positive
     associations as we are not filtering out by statistical significance.
-    """
 
-    owriter = OutputWriter(output, item_prefix=hit_prefix)
-    cwriter = FASTAWriter(ocodon)
-    awriter = FASTAWriter(oamino)
+    With --checkpoint, progress is recorded every --checkpoint-interval
+    seconds. Running the same command again with --resume carries on from
+    the last checkpoint, which makes it safe to run on preemptible nodes.
+    """
+    if resume and checkpoint is None:
+        raise click.UsageError("--resume requires --checkpoint.")
+    if checkpoint is not None and odebug.name != os.devnull:
+        raise click.UsageError("--odebug cannot be used with --checkpoint.")
+    if score_only and min_score is None:
+        raise click.UsageError("--score-only requires --min-score.")
+
+    in_process = e_value_source == "iseq"
+
+    ckpt: Optional[Checkpoint] = None
+    state: Optional[CheckpointState] = None
+    if checkpoint is not None:
+        options = {
+            "epsilon": epsilon,
+            "window": window,
+            "max_e_value": max_e_value,
+            "hit_prefix": hit_prefix,
+            "cut_ga": cut_ga,
+            "chunk_size": chunk_size,
+            "prefilter": prefilter,
+            "prefilter_threshold": prefilter_threshold,
+            "e_value_source": e_value_source,
+            "score_only": score_only,
+            "min_score": min_score,
+            "shard": None if shard is None else list(shard),
+            "shard_by": shard_by,
+        }
+        ckpt = Checkpoint(checkpoint, scan_fingerprint(profile, target, options))
+        if resume:
+            try:
+                state = ckpt.load()
+            except ValueError as e:
+                raise click.UsageError(str(e))
+
+    if state is not None and state.done:
+        if not quiet:
+            click.echo("Nothing to resume: the scan is complete.")
+        return
+
+    # Files whose content is discarded past the last checkpoint on resume.
+    filepaths = {"output": output, "ocodon": ocodon, "oamino": oamino}
+
+    # Without in-process E-values, hits wait in a spool until HMMER has scored
+    # their amino acid sequences, and are then written out once.
+    spool: Optional[HitSpool] = None
+    spool_amino = ""
+    swriter: Optional[FASTAWriter] = None
+    if not in_process:
+        if checkpoint is None:
+            spool = HitSpool(os.path.dirname(oamino))
+            spool_amino = spool_fasta_filepath(oamino)
+        else:
+            spool_size = 0
+            if state is None:
+                open(checkpoint + ".hits", "wb").close()
+            else:
+                spool_size = state.spool_size
+            spool = HitSpool(filepath=checkpoint + ".hits", size=spool_size)
+            spool_amino = checkpoint + ".spool.fasta"
+        filepaths["spool"] = spool.filepath
+        filepaths["spool_amino"] = spool_amino
+
+    append = state is not None
+    if state is not None:
+        truncate_files(filepaths, state.offsets)
+
+    item_idx = 1 if state is None else state.item_idx
+    mode = "a" if append else "w"
+    files = {k: open(v, mode) for k, v in filepaths.items() if k != "spool"}
+    owriter = OutputWriter(files["output"], hit_prefix, item_idx, append)
+    cwriter = FASTAWriter(files["ocodon"])
+    awriter = FASTAWriter(files["oamino"])
     dwriter = DebugWriter(odebug)
+    if spool is not None:
+        swriter = FASTAWriter(files["spool_amino"])
 
     with open(profile, "r") as file:
         profile_abc = infer_profile_alphabet(file)
-    target_abc = infer_target_alphabet(target)
+    job_shard = make_shard(shard, shard_by)
+    reader = open_targets(target, chunk_size, job_shard)
+    target_abc = reader.alphabet
 
     assert isinstance(target_abc, BaseAlphabet) and isinstance(
         profile_abc, AminoAlphabet
     )
 
-    gcode = CodonTable(target_abc, IUPACAminoAlphabet())
-
-    with read_fasta(target) as fasta:
-        targets = list(fasta)
-
-    total = num_models(profile)
-    for plain_model in tqdm(
-        open_hmmer(profile), desc="Models", total=total, disable=quiet
-    ):
-        hmodel = HMMERModel(plain_model)
-        prof = create_profile2(hmodel, gcode.base_alphabet, window, epsilon)
-
-        for tgt in tqdm(targets, desc="Targets", leave=False, disable=quiet):
-            seq = prof.create_sequence(tgt.sequence.encode())
-            search_results = prof.search(seq)
-            ifragments = search_results.ifragments()
-            seqid = f"{tgt.id}"
-
-            for ifrag in ifragments:
-                start = ifrag.interval.start
-                stop = ifrag.interval.stop
-                item_id = owriter.write_item(
-                    seqid,
-                    alphabet_name(seq.alphabet),
-                    prof.profid,
-                    alphabet_name(prof.alphabet),
-                    start,
-                    stop,
-                    prof.window_length,
-                    {"Epsilon": epsilon},
-                )
-                codon_frag = ifrag.fragment.decode()
-                cwriter.write_item(item_id, str(codon_frag.sequence))
-                amino_frag = codon_frag.decode(gcode)
-                awriter.write_item(item_id, str(amino_frag.sequence))
-
-            if odebug is not os.devnull:
-                for i in search_results.debug_table():
-                    dwriter.write_row(seqid, i)
+    num_cpus: int = 0
+    if ncpus == "auto":
+        count = os.cpu_count()
+        num_cpus = count if count is not None else 1
+    else:
+        num_cpus = int(ncpus)
+
+    if model_cache:
+        blocks = open_hmmer_cache(profile).blocks
+    else:
+        blocks = index_hmmer(profile)
+    profiles = shard_profiles([b.model_length for b in blocks], job_shard)
+    num_cpus = max(min(num_cpus, len(profiles)), 1)
+    hit_filter = HitFilter(max_e_value, cut_ga) if in_process else None
+    scheduler = TileScheduler(
+        profile,
+        blocks,
+        alphabet_name(target_abc),
+        window,
+        epsilon,
+        num_cpus,
+        odebug is not os.devnull,
+        prefilter_threshold if prefilter else None,
+        hit_filter,
+        model_cache,
+        _min_score_nats(score_only, min_score),
+        profiles,
+    )
+
+    prefilter_stats = PrefilterStats()
+    if state is not None:
+        prefilter_stats = PrefilterStats(**state.prefilter_stats)
+
+    def write_hit(hit: TileHit, att: dict, trailing_att: Optional[dict] = None):
+        item_id = owriter.write_item(
+            hit.seqid,
+            hit.target_alph,
+            hit.profid,
+            hit.profile_alph,
+            hit.start,
+            hit.stop,
+            hit.window_length,
+            att,
+            trailing_att,
+        )
+        cwriter.write_item(item_id, hit.codon)
+        awriter.write_item(item_id, hit.amino)
+
+    def save_checkpoint(chunk: int, prof_idx: int, scan_done: bool) -> CheckpointState:
+        assert ckpt is not None
+        for f in files.values():
+            if not f.closed:
+                f.flush()
+        if spool is not None:
+            spool.flush()
+        offsets = {k: os.path.getsize(v) for k, v in filepaths.items()}
+        spool_size = 0 if spool is None else len(spool)
+        stats = dataclasses.asdict(prefilter_stats)
+        args = (chunk, prof_idx, owriter.item_idx, offsets, spool_size, stats)
+        saved = CheckpointState(*args, scan_done, False)
+        ckpt.save(saved)
+        return saved
+
+    first_chunk = 0 if state is None else state.chunk
+    first_profile = 0 if state is None else state.profile
+    scan_done = state is not None and state.scan_done
+    last_state = state
+    last_save = time.monotonic()
+
+    for chunk, targets in enumerate(reader):
+        if scan_done:
+            break
+        if chunk < first_chunk:
+            continue
+        start = first_profile if chunk == first_chunk else 0
+        start = max(start, profiles.start)
+        results = scheduler.scan(targets, start)
+        for prof_idx, target_results in enumerate(
+            tqdm(
+                results,
+                desc="Models",
+                total=len(profiles),
+                initial=start - profiles.start,
+                disable=quiet,
+            ),
+            start,
+        ):
+            for tgt_result in target_results:
+                for hit in tgt_result.hits:
+                    if spool is None:
+                        att = {"Epsilon": epsilon, "E-value": f"{hit.e_value:.2g}"}
+                        write_hit(hit, att)
+                    else:
+                        assert swriter is not None
+                        swriter.write_item(str(len(spool)), hit.amino)
+                        spool.append(hit)
+
+                for row in tgt_result.debug_rows:
+                    dwriter.write_row(tgt_result.seqid, row)
+
+                prefilter_stats += tgt_result.prefilter_stats
+
+            now = time.monotonic()
+            if ckpt is not None and now - last_save >= checkpoint_interval:
+                last_state = save_checkpoint(chunk, prof_idx + 1, False)
+                last_save = now
+
+        if ckpt is not None:
+            last_state = save_checkpoint(chunk + 1, 0, False)
+            last_save = time.monotonic()
+    reader.close()
+    odebug.close_intelligently()
+
+    if prefilter and not quiet:
+        click.echo(str(prefilter_stats))
+
+    if spool is not None:
+        assert swriter is not None
+        swriter.close()
+        if ckpt is not None and not scan_done:
+            last_state = save_checkpoint(0, 0, True)
+
+        if not quiet:
+            click.echo("Computing e-values... ", nl=False)
+        hmmer = HMMER(profile)
+        if not hmmer.is_pressed:
+            hmmer.press()
+        result = hmmer.scan(spool_amino, "/dev/null", domtblout=True, cut_ga=cut_ga)
+        score_table = ScoreTable(result.domtbl)
+
+        for i, hit in enumerate(spool):
+            key = (str(i), hit.profid.name, hit.profid.acc)
+            if not score_table.has(*key):
+                continue
+            e_value = score_table.e_value(*key)
+            if float(e_value) > max_e_value:
+                continue
+            write_hit(hit, {"Epsilon": epsilon}, {"E-value": e_value})
+        if not quiet:
+            click.echo("done.")
 
     owriter.close()
     cwriter.close()
     awriter.close()
-    odebug.close_intelligently()
 
-    if not quiet:
-        click.echo("Computing e-values... ", nl=False)
-    hmmer = HMMER(profile)
-    if not hmmer.is_pressed:
-        hmmer.press()
-    result = hmmer.scan(oamino, "/dev/null", domtblout=True, cut_ga=cut_ga)
-    score_table = ScoreTable(result.domtbl)
-
-    update_gff_file(output, score_table, max_e_value)
-    target_set = target_set_from_gff_file(output)
-    update_fasta_file(ocodon, target_set)
-    update_fasta_file(oamino, target_set)
-    if not quiet:
-        click.echo("done.")
-
-    def rep(k: str):
-        return int(k.replace(hit_prefix, ""))
-
-    if not quiet:
-        click.echo("Translating files... ", nl=False)
-    items = list(sorted(list(target_set), key=rep))
-    target_map = {item: f"{hit_prefix}{i+1}" for i, item in enumerate(items)}
-    translate_gff_file(output, target_map)
-    translate_fasta_file(ocodon, target_map)
-    translate_fasta_file(oamino, target_map)
-    if not quiet:
-        click.echo("done.")
+    if ckpt is not None:
+        # Keep the offsets of the last checkpoint: a scan marked as done is
+        # never resumed, but its manifest stays consistent.
+        if last_state is None:
+            last_state = save_checkpoint(0, 0, True)
+        ckpt.save(last_state._replace(scan_done=True, done=True))
+    if spool is not None:
+        spool.close()
+        os.remove(spool_amino)
+
+
+def scan_fingerprint(profile: str, target: IO[str], options: dict) -> dict:
+    """
+    Inputs and options that a resumed scan must share with the original one.
+    """
+    fingerprint = {"profile": os.path.abspath(profile)}
+    fingerprint["profile_size"] = os.path.getsize(profile)
+    fingerprint["target"] = os.path.abspath(target.name)
+    if os.path.isfile(target.name):
+        fingerprint["target_size"] = os.path.getsize(target.name)
+    fingerprint["options"] = options
+    return fingerprint
+
+
+def spool_fasta_filepath(oamino: str) -> str:
+    """
+    Temporary amino acid FASTA file given to HMMER.
+    """
+    dirname, basename = os.path.split(oamino)
+    return os.path.join(dirname, f".{basename}.{os.getpid()}.spool")
+
+
+def _min_score_nats(score_only: bool, min_score: Optional[float]) -> Optional[float]:
+    if not score_only or min_score is None:
+        return None
+    return min_score * log(2)
 
 
 def infer_profile_alphabet(profile: IO[str]):
@@ -202,15 +479,6 @@ def infer_profile_alphabet(profile: IO[str]):
     return hmmer_alphabet
 
 
-def infer_target_alphabet(target: IO[str]):
-    fasta = read_fasta(target)
-    target_alphabet = infer_fasta_alphabet(fasta)
-    target.seek(0)
-    if target_alphabet is None:
-        raise click.UsageError("Could not infer alphabet from TARGET.")
-    return target_alphabet
-
-
 class ScoreTable:
     def __init__(self, domtbldata: List[DomTBLRow]):
         self._tbldata: Dict[Tuple[str, str, str], DomTBLRow] = {}
@@ -230,119 +498,3 @@ class ScoreTable:
     def has(self, target_id: str, profile_name: str, profile_acc: str) -> bool:
         key = (target_id, profile_name, profile_acc)
         return key in self._tbldata
-
-
-def update_gff_file(filepath, score_table: ScoreTable, max_e_value: float):
-    import in_place
-
-    with in_place.InPlace(filepath) as file:
-        for row in file:
-            row = row.rstrip()
-            if row.startswith("#"):
-                file.write(row)
-                file.write("\n")
-                continue
-
-            match = re.match(r"^(.+\t)([^\t]+)$", row)
-            if match is None:
-                file.write(row)
-                file.write("\n")
-                continue
-
-            left = match.group(1)
-            right = match.group(2)
-
-            if right == ".":
-                file.write(row)
-                file.write("\n")
-                continue
-
-            fields_list = []
-            for v in right.split(";"):
-                name, value = v.split("=", 1)
-                fields_list.append((name, value))
-
-            attr = OrderedDict(fields_list)
-
-            key = (attr["ID"], attr["Profile_name"], attr["Profile_acc"])
-            if not score_table.has(*key):
-                continue
-
-            attr["E-value"] = score_table.e_value(*key)
-            if float(attr["E-value"]) > max_e_value:
-                continue
-
-            file.write(left + ";".join(k + "=" + v for k, v in attr.items()))
-            file.write("\n")
-
-
-def translate_gff_file(filepath, target_map: Dict[str, str]):
-    import in_place
-
-    with in_place.InPlace(filepath) as file:
-        for row in file:
-            row = row.rstrip()
-            if row.startswith("#"):
-                file.write(row)
-                file.write("\n")
-                continue
-
-            match = re.match(r"^(.+\t)([^\t]+)$", row)
-            if match is None:
-                file.write(row)
-                file.write("\n")
-                continue
-
-            left = match.group(1)
-            right = match.group(2)
-
-            if right == ".":
-                file.write(row)
-                file.write("\n")
-                continue
-
-            fields_list = []
-            for v in right.split(";"):
-                name, value = v.split("=", 1)
-                fields_list.append((name, value))
-
-            attr = OrderedDict(fields_list)
-
-            attr["ID"] = target_map[attr["ID"]]
-            file.write(left + ";".join(k + "=" + v for k, v in attr.items()))
-            file.write("\n")
-
-
-def target_set_from_gff_file(filepath) -> Set[str]:
-    gff = read_gff(filepath)
-    gff.ravel()
-    df = gff.dataframe
-    if len(df) == 0:
-        return set()
-    return set(df["att_ID"].tolist())
-
-
-def update_fasta_file(filepath, target_set: Set[str]):
-    with read_fasta(filepath) as fasta:
-        targets = list(fasta)
-
-    with FASTAWriter(filepath) as writer:
-        for target in targets:
-            tgt_id = target.id
-            if tgt_id in target_set:
-                writer.write_item(target.defline, target.sequence)
-
-
-def translate_fasta_file(filepath, target_map: Dict[str, str]):
-    with read_fasta(filepath) as fasta:
-        targets = list(fasta)
-
-    with FASTAWriter(filepath) as writer:
-        for target in targets:
-            old_tgt_id = target.id
-            tgt_id = target_map[old_tgt_id]
-            if target.has_desc:
-                defline = tgt_id + " " + target.desc
-            else:
-                defline = tgt_id
-            writer.write_item(defline, target.sequence)
@@ -1,24 +1,53 @@
-from io import StringIO
+import tempfile
+from itertools import islice
 from pathlib import Path
-from typing import Iterable, NamedTuple, TextIO
+from typing import Dict, Iterable, List, NamedTuple, Optional, TextIO, Tuple
 
 import click
-from fasta_reader import FASTAItem, FASTAWriter, read_fasta
+from fasta_reader import FASTAItem, FASTAWriter
 from hmmer import HMMER
-from hmmer_reader import num_models, open_hmmer
+from hmmer_reader import num_models
 from imm import Alphabet
 from nmm import IUPACAminoAlphabet
 from tqdm import tqdm
 
-from iseq.alphabet import alphabet_name, infer_fasta_alphabet
+from iseq.alphabet import alphabet_name
 from iseq.codon_table import CodonTable
-from iseq.hmmer_model import HMMERModel
+from iseq.evalue import create_evalue
+from iseq.hmmer_cache import iter_hmmer_models
+from iseq.hmmer_index import index_hmmer
+from iseq.prefilter import Prefilter, PrefilterStats
 from iseq.profile import ProfileID
 from iseq.protein import ProteinProfile, create_profile2
+from iseq.result import IFragment
 
 from .output_writer import OutputWriter
+from .shard import SHARD, make_shard, shard_profiles
+from .target_reader import open_targets
 
-HMMEROptions = NamedTuple("HMMEROptions", [("heuristic", bool), ("cut_ga", bool)])
+HMMEROptions = NamedTuple(
+    "HMMEROptions",
+    [
+        ("heuristic", bool),
+        ("cut_ga", bool),
+        ("in_process", bool),
+        ("batch_size", int),
+    ],
+)
+
+# Fragments of one profile waiting to be scored by HMMER, keyed by fragment
+# number and target ID, with their amino acid sequences.
+PendingProfile = NamedTuple(
+    "PendingProfile",
+    [
+        ("profid", ProfileID),
+        ("profile_abc", Alphabet),
+        ("window_length", int),
+        ("frags", Dict[Tuple[int, str], IFragment]),
+        ("aminos", Dict[Tuple[int, str], str]),
+        ("targets_abc", Dict[str, Alphabet]),
+    ],
+)
 
 
 @click.command()
@@ -76,6 +105,52 @@ HMMEROptions = NamedTuple("HMMEROptions", [("heuristic", bool), ("cut_ga", bool)
     help="Enable use of profile's GA gathering cutoffs to set all thresholding. Defaults to False.",
     default=False,
 )
+@click.option(
+    "--chunk-size",
+    type=int,
+    help="Number of target bases to hold in memory at a time. Each chunk is scanned against every profile before the next one is read, so items are listed chunk by chunk and, within a chunk, profile by profile. Defaults to 100000000.",
+    default=100_000_000,
+)
+@click.option(
+    "--prefilter/--no-prefilter",
+    help="Screen targets with an ungapped, translated search first. Defaults to False.",
+    default=False,
+)
+@click.option(
+    "--prefilter-threshold",
+    type=float,
+    help="Prefilter sensitivity threshold in bits; lower is more sensitive. Defaults to 2.0.",
+    default=2.0,
+)
+@click.option(
+    "--e-value-source",
+    type=click.Choice(["hmmer", "iseq"]),
+    help="Compute E-values by running HMMER on the amino acid sequences, or in-process from the profiles' STATS LOCAL VITERBI lines. In-process scores have no bias correction, so items get no Bias attribute. Defaults to `hmmer`.",
+    default="hmmer",
+)
+@click.option(
+    "--model-cache/--no-model-cache",
+    help="Read models from a PROFILE.arrays sidecar file, creating it on first use, instead of parsing PROFILE. Defaults to False.",
+    default=False,
+)
+@click.option(
+    "--hmmer-batch-size",
+    type=int,
+    help="Number of amino acid residues, from the fragments of as many profiles as needed, scored by each HMMER call. Defaults to 100000.",
+    default=100_000,
+)
+@click.option(
+    "--shard",
+    type=SHARD,
+    help="Only scan shard I of N, given as I/N; combine the shards with `iseq merge`. Defaults to none, which scans everything.",
+    default=None,
+)
+@click.option(
+    "--shard-by",
+    type=click.Choice(["profiles", "targets"]),
+    help="Split the profiles into contiguous ranges of similar total length, or deal the targets in blocks of bases. Defaults to `profiles`.",
+    default="profiles",
+)
 def pscan3(
     profile: str,
     target: TextIO,
@@ -88,6 +163,14 @@ def pscan3(
     hit_prefix: str,
     heuristic: bool,
     cut_ga: bool,
+    chunk_size: int,
+    prefilter: bool,
+    prefilter_threshold: float,
+    e_value_source: str,
+    model_cache: bool,
+    hmmer_batch_size: int,
+    shard: Optional[Tuple[int, int]],
+    shard_by: str,
 ):
     """
     Search nucleotide sequence(s) against a protein profiles database.
@@ -102,14 +185,27 @@ def pscan3(
     cwriter = FASTAWriter(ocodon)
     awriter = FASTAWriter(oamino)
 
-    target_abc = infer_target_alphabet(target)
+    job_shard = make_shard(shard, shard_by)
+    reader = open_targets(target, chunk_size, job_shard)
+    target_abc = reader.alphabet
 
     gcode = CodonTable(target_abc, IUPACAminoAlphabet())
-    opts = HMMEROptions(heuristic, cut_ga)
-    scan = PScan3(Path(profile), owriter, cwriter, awriter, gcode, opts)
-    scan.scan(target, window, epsilon, quiet)
+    in_process = e_value_source == "iseq"
+    opts = HMMEROptions(heuristic, cut_ga, in_process, hmmer_batch_size)
+    threshold = prefilter_threshold if prefilter else None
+    scan = PScan3(Path(profile), owriter, cwriter, awriter, gcode, opts, threshold)
+    scan.model_cache = model_cache
+    if job_shard is not None:
+        model_lengths = [b.model_length for b in index_hmmer(profile)]
+        scan.profiles = shard_profiles(model_lengths, job_shard)
+    for targets in reader:
+        scan.scan(targets, window, epsilon, quiet)
+    reader.close()
     scan.close()
 
+    if prefilter and not quiet:
+        click.echo(str(scan.prefilter_stats))
+
 
 class PScan3:
     def __init__(
@@ -120,6 +216,7 @@ class PScan3:
         oamino: FASTAWriter,
         codon_table: CodonTable,
         hmmer_options: HMMEROptions,
+        prefilter_threshold: Optional[float] = None,
     ):
         self._profile = profile
         self._output = output
@@ -127,96 +224,226 @@ class PScan3:
         self._oamino = oamino
         self._codon_table = codon_table
 
-        hmmer = HMMER(profile)
-        hmmer.timeout = 60
-        if not hmmer.is_indexed:
-            hmmer.index()
+        self._hmmer: Optional[HMMER] = None
+        if not hmmer_options.in_process:
+            hmmer = HMMER(profile)
+            hmmer.timeout = 60
+            if not hmmer.is_indexed:
+                hmmer.index()
+            self._hmmer = hmmer
 
-        self._hmmer = hmmer
         self._hmmer_options = hmmer_options
+        self._prefilter_threshold = prefilter_threshold
+        self._prefilter_stats = PrefilterStats()
+        self._gathering_cutoff: Optional[float] = None
+        self._model_cache = False
+        self._profiles: Optional[range] = None
+        self._pending: List[PendingProfile] = []
+        self._pending_residues = 0
+
+    @property
+    def model_cache(self) -> bool:
+        return self._model_cache
+
+    @model_cache.setter
+    def model_cache(self, model_cache: bool):
+        self._model_cache = model_cache
+
+    @property
+    def profiles(self) -> range:
+        """
+        Positions of the profiles to scan. Defaults to every profile.
+        """
+        if self._profiles is None:
+            return range(self.num_models)
+        return self._profiles
+
+    @profiles.setter
+    def profiles(self, profiles: range):
+        self._profiles = profiles
+
+    @property
+    def prefilter_stats(self) -> PrefilterStats:
+        return self._prefilter_stats
 
     @property
     def num_models(self) -> int:
         return num_models(self._profile)
 
-    def scan(self, target: TextIO, window: int, epsilon: float, quiet: bool):
-        with read_fasta(target) as fasta:
-            targets = list(fasta)
-
+    def scan(self, targets: List[FASTAItem], window: int, epsilon: float, quiet: bool):
         base_alphabet = self._codon_table.base_alphabet
-        with open_hmmer(self._profile) as pfile:
-            total = self.num_models
-            profiles = tqdm(iter(pfile), desc="Models", total=total, disable=quiet)
-            for plain_model in profiles:
-                hmodel = HMMERModel(plain_model)
-                prof = create_profile2(hmodel, base_alphabet, window, epsilon)
-                self._scan_targets(prof, targets, epsilon, quiet)
+        profiles = self.profiles
+        hmodels = iter_hmmer_models(self._profile, self._model_cache)
+        hmodels = islice(hmodels, profiles.start, profiles.stop)
+        total = len(profiles)
+        for hmodel in tqdm(hmodels, desc="Models", total=total, disable=quiet):
+            prof = create_profile2(hmodel, base_alphabet, window, epsilon)
+            if self._hmmer_options.in_process:
+                prof.evalue = create_evalue(hmodel)
+                self._gathering_cutoff = hmodel.gathering_cutoff
+            prefilter = None
+            if self._prefilter_threshold is not None:
+                prefilter = Prefilter(hmodel, self._prefilter_threshold)
+            self._scan_targets(prof, prefilter, targets, epsilon, quiet)
+        self._flush(epsilon)
 
     def _scan_targets(
         self,
         prof: ProteinProfile,
+        prefilter: Optional[Prefilter],
         targets: Iterable[FASTAItem],
         epsilon: float,
         quiet: bool,
     ):
-        wlen = prof.window_length
-        prof_abc = prof.alphabet
-        frags = {}
-        targets_abc = {}
+        frags: Dict[Tuple[int, str], IFragment] = {}
+        targets_abc: Dict[str, Alphabet] = {}
         for tgt in tqdm(targets, desc="Targets", leave=False, disable=quiet):
-            seq = prof.create_sequence(tgt.sequence.encode())
-            search_results = prof.search(seq)
+            data = tgt.sequence.encode()
+            regions = None
+            if prefilter is not None:
+                regions = prefilter.regions(data)
+                self._prefilter_stats.update(len(data), regions)
+                if len(regions) == 0:
+                    continue
+
+            seq = prof.create_sequence(data)
+            search_results = prof.search(seq, regions)
             ifragments = search_results.ifragments()
 
             targets_abc[tgt.id] = seq.alphabet
             for i, ifrag in enumerate(ifragments):
                 frags[(i, f"{tgt.id}")] = ifrag
 
-        scores = self._score_fragments(prof, frags)
-        for (i, tgt_id), frag in frags.items():
+        if self._hmmer is None:
+            scores = self._score_fragments_in_process(frags)
+            pending = PendingProfile(
+                prof.profid, prof.alphabet, prof.window_length, frags, {}, targets_abc
+            )
+            self._process_fragments(pending, scores, epsilon)
+            return
+
+        aminos: Dict[Tuple[int, str], str] = {}
+        for key, frag in frags.items():
+            codon_frag = frag.fragment.decode()
+            aminos[key] = str(codon_frag.decode(self._codon_table).sequence)
+            self._pending_residues += len(aminos[key])
+
+        self._pending.append(
+            PendingProfile(
+                prof.profid,
+                prof.alphabet,
+                prof.window_length,
+                frags,
+                aminos,
+                targets_abc,
+            )
+        )
+        if self._pending_residues >= self._hmmer_options.batch_size:
+            self._flush(epsilon)
+
+    def _flush(self, epsilon: float):
+        """
+        Score the pending fragments with a single HMMER call and write them.
+        """
+        pending = self._pending
+        self._pending = []
+        self._pending_residues = 0
+        if len(pending) == 0:
+            return
+
+        scores = self._score_fragments(pending)
+        for k, prof in enumerate(pending):
+            self._process_fragments(prof, scores.get(k, {}), epsilon)
+
+    def _process_fragments(self, prof: PendingProfile, scores, epsilon: float):
+        for (i, tgt_id), frag in prof.frags.items():
             score = scores.get((i, tgt_id), None)
             if score is None:
                 continue
             self._process_fragment(
                 frag,
                 tgt_id,
-                targets_abc[tgt_id],
+                prof.targets_abc[tgt_id],
                 prof.profid,
-                prof_abc,
-                wlen,
+                prof.profile_abc,
+                prof.window_length,
                 epsilon,
                 score[0],
                 score[1],
                 score[2],
             )
 
-    def _score_fragments(self, prof: ProteinProfile, frags):
+    def _score_fragments(self, pending: List[PendingProfile]):
+        """
+        Score the fragments of several profiles with one `hmmscan` against a
+        database made of those profiles only.
+
+        Each fragment is named after its profile position in `pending`, so
+        that hits of a fragment against other profiles of the batch are
+        discarded. With ``Z=1``, E-values are the same as those of a
+        `hmmsearch` of each profile against its own fragments.
+        """
+        assert self._hmmer is not None
+
         targets = []
-        for (i, tgt_id), frag in frags.items():
-            codon_frag = frag.fragment.decode()
-            amino_frag = codon_frag.decode(self._codon_table)
-            seqid = "_".join([str(i), tgt_id])
-            targets.append(f">{seqid}\n" + str(amino_frag.sequence))
-
-        result = self._hmmer.search(
-            StringIO("\n".join(targets)),
-            "/dev/null",
-            tblout=True,
-            heuristic=self._hmmer_options.heuristic,
-            cut_ga=self._hmmer_options.cut_ga,
-            hmmkey=prof.profid.acc,
-            Z=1,
-        )
+        for k, prof in enumerate(pending):
+            for (i, tgt_id), amino in prof.aminos.items():
+                seqid = "_".join([str(k), str(i), tgt_id])
+                targets.append(f">{seqid}\n{amino}\n")
+
+        scores: Dict[int, Dict[Tuple[int, str], Tuple[str, str, str]]] = {}
+        if len(targets) == 0:
+            return scores
+
+        accs = [prof.profid.acc for prof in pending]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            dbfile = Path(tmpdir) / "batch.hmm"
+            with open(dbfile, "w") as file:
+                file.write(self._hmmer.fetch(accs))
+                file.write("\n")
+            targetfile = Path(tmpdir) / "batch.fasta"
+            with open(targetfile, "w") as file:
+                file.write("".join(targets))
+
+            hmmer = HMMER(dbfile)
+            hmmer.timeout = self._hmmer.timeout
+            hmmer.press()
+            result = hmmer.scan(
+                targetfile,
+                "/dev/null",
+                tblout=True,
+                domtblout=False,
+                heuristic=self._hmmer_options.heuristic,
+                cut_ga=self._hmmer_options.cut_ga,
+                Z=1,
+            )
 
-        scores = {}
         for row in result.tbl:
             e_value = row.full_sequence.e_value
             score = row.full_sequence.score
             if score.lower() == "nan":
                 continue
             bias = row.full_sequence.bias
-            istr, tgt_id = row.target.name.partition("_")[::2]
-            scores[(int(istr), tgt_id)] = (e_value, score, bias)
+            kstr, istr, tgt_id = row.query.name.split("_", 2)
+            profid = pending[int(kstr)].profid
+            if (row.target.name, row.target.accession) != (profid.name, profid.acc):
+                continue
+            prof_scores = scores.setdefault(int(kstr), {})
+            prof_scores[(int(istr), tgt_id)] = (e_value, score, bias)
+
+        return scores
+
+    def _score_fragments_in_process(self, frags):
+        cutoff = self._gathering_cutoff
+        if not self._hmmer_options.cut_ga:
+            cutoff = None
+
+        scores = {}
+        for key, frag in frags.items():
+            if cutoff is not None and frag.bit_score < cutoff:
+                continue
+            e_value = f"{frag.e_value:.2g}"
+            scores[key] = (e_value, f"{frag.bit_score:.1f}", None)
 
         return scores
 
@@ -231,12 +458,15 @@ class PScan3:
         epsilon: float,
         e_value: str,
         score: str,
-        bias: str,
+        bias: Optional[str],
     ):
         start = frag.interval.start
         stop = frag.interval.stop
         codon_frag = frag.fragment.decode()
         amino_frag = codon_frag.decode(self._codon_table)
+        atts = {"Epsilon": epsilon, "E-value": e_value, "Score": score}
+        if bias is not None:
+            atts["Bias"] = bias
         item_id = self._output.write_item(
             target_id,
             alphabet_name(target_abc),
@@ -245,7 +475,7 @@ class PScan3:
             start,
             stop,
             window_length,
-            {"Epsilon": epsilon, "E-value": e_value, "Score": score, "Bias": bias},
+            atts,
         )
         self._ocodon.write_item(item_id, str(codon_frag.sequence))
         self._oamino.write_item(item_id, str(amino_frag.sequence))
@@ -254,12 +484,3 @@ class PScan3:
         self._output.close()
         self._ocodon.close()
         self._oamino.close()
-
-
-def infer_target_alphabet(target: TextIO):
-    fasta = read_fasta(target)
-    target_alphabet = infer_fasta_alphabet(fasta)
-    target.seek(0)
-    if target_alphabet is None:
-        raise click.UsageError("Could not infer alphabet from TARGET.")
-    return target_alphabet
@@ -0,0 +1,384 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from math import ceil
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from fasta_reader import FASTAItem
+from nmm import DNAAlphabet, IUPACAminoAlphabet, RNAAlphabet
+
+from iseq.alphabet import alphabet_name
+from iseq.codon_table import CodonTable
+from iseq.evalue import create_evalue
+from iseq.hmmer_cache import HMMERCache, cache_filepath
+from iseq.hmmer_index import HMMERBlock, read_hmmer_block
+from iseq.hmmer_model import HMMERModel
+from iseq.prefilter import Prefilter, PrefilterStats
+from iseq.profile import ProfileID
+from iseq.protein import ProteinProfile, create_profile2
+from iseq.result import DebugRow
+
+__all__ = [
+    "HitFilter",
+    "Tile",
+    "TileHit",
+    "TargetResult",
+    "TileScheduler",
+    "create_tiles",
+]
+
+HitFilter = NamedTuple("HitFilter", [("max_e_value", float), ("cut_ga", bool)])
+
+Tile = NamedTuple(
+    "Tile",
+    [
+        ("profile", int),
+        ("group", int),
+        ("target_start", int),
+        ("target_stop", int),
+        ("cost", int),
+    ],
+)
+
+TileHit = NamedTuple(
+    "TileHit",
+    [
+        ("seqid", str),
+        ("target_alph", str),
+        ("profid", ProfileID),
+        ("profile_alph", str),
+        ("start", int),
+        ("stop", int),
+        ("window_length", int),
+        ("codon", str),
+        ("amino", str),
+        ("e_value", float),
+    ],
+)
+
+TargetResult = NamedTuple(
+    "TargetResult",
+    [
+        ("seqid", str),
+        ("hits", List[TileHit]),
+        ("debug_rows", List[DebugRow]),
+        ("prefilter_stats", PrefilterStats),
+    ],
+)
+
+
+class TileScheduler:
+    """
+    Scan profiles against targets by cutting the (profile, target) space into tiles.
+
+    Results are yielded in database order: profile by profile, and target by
+    target within a profile, exactly as a serial scan would. Only the tiles of
+    a window of profiles, starting at the next one to be yielded, are handed
+    to the process pool at a time, which bounds the results held back until
+    the profiles before them are done. Within the window, tiles are handed out
+    in decreasing order of estimated cost (model length times the number of
+    target bases), so that the most expensive ones do not end up running
+    alone.
+
+    Parameters
+    ----------
+    profile
+        HMMER3 ASCII file.
+    blocks
+        Location of the models in `profile`.
+    base_abc_name
+        Target alphabet name: ``"dna"`` or ``"rna"``.
+    window
+        Window length.
+    epsilon
+        Indel probability.
+    num_cpus
+        Number of processes. One means an in-process, serial scan.
+    debug
+        Collect the debug table of every target.
+    prefilter
+        Threshold of the :class:`iseq.prefilter.Prefilter` screen applied
+        before the frame-aware search. Defaults to `None`, which disables it.
+    hit_filter
+        Compute E-values in-process, accounting for every profile in the
+        database, and drop hits that do not pass the filter. Defaults to `None`,
+        which leaves E-values undefined and keeps every hit.
+    model_cache
+        Load models from the sidecar cache of `profile`, which must be up to
+        date, instead of parsing their text. Defaults to `False`.
+    min_score
+        Only build the alignments of windows whose log-odds score, in nats, is
+        at least this; the others are scored only. Defaults to `None`, which
+        builds every window.
+    profiles
+        Positions of the profiles to scan. Defaults to `None`, which means
+        every profile.
+    """
+
+    def __init__(
+        self,
+        profile: str,
+        blocks: List[HMMERBlock],
+        base_abc_name: str,
+        window: int,
+        epsilon: float,
+        num_cpus: int,
+        debug: bool,
+        prefilter: Optional[float] = None,
+        hit_filter: Optional[HitFilter] = None,
+        model_cache: bool = False,
+        min_score: Optional[float] = None,
+        profiles: Optional[range] = None,
+    ):
+        self._profile = profile
+        self._blocks = blocks
+        self._base_abc_name = base_abc_name
+        self._window = window
+        self._epsilon = epsilon
+        self._num_cpus = max(num_cpus, 1)
+        self._debug = debug
+        self._prefilter = prefilter
+        self._hit_filter = hit_filter
+        self._model_cache = model_cache
+        self._min_score = min_score
+        self._profiles = range(len(blocks)) if profiles is None else profiles
+
+    def scan(
+        self, targets: List[FASTAItem], first_profile: int = 0
+    ) -> Iterator[List[TargetResult]]:
+        """
+        Scan targets against every profile.
+
+        It yields, for each profile of `profiles` in database order, the list of
+        target results in target order. Profiles before `first_profile` are
+        skipped.
+        """
+        start = max(first_profile, self._profiles.start)
+        stop = self._profiles.stop
+        if stop <= start or len(targets) == 0:
+            return
+
+        num_groups = 1
+        if self._num_cpus > 1:
+            num_groups = ceil(4 * self._num_cpus / (stop - start))
+        tiles = create_tiles(self._blocks, targets, num_groups, range(start, stop))
+
+        args = (self._profile, self._blocks, targets, self._base_abc_name)
+        args += (self._window, self._epsilon, self._debug, self._prefilter)
+        args += (self._hit_filter, self._model_cache, self._min_score)
+
+        if self._num_cpus == 1:
+            worker = _TileWorker(*args)
+            for profile_tiles in tiles:
+                results: List[TargetResult] = []
+                for tile in profile_tiles:
+                    results += worker.scan(tile)
+                yield results
+            return
+
+        yield from self._parallel_scan(tiles, args)
+
+    def _parallel_scan(
+        self, tiles: List[List[Tile]], args: tuple
+    ) -> Iterator[List[TargetResult]]:
+        # Enough profiles to give every process several tiles.
+        window = max(ceil(4 * self._num_cpus / len(tiles[0])), 1)
+
+        done: Dict[Tuple[int, int], List[TargetResult]] = {}
+        next_profile = 0
+        submitted = 0
+
+        with ProcessPoolExecutor(
+            max_workers=self._num_cpus, initializer=_init_process, initargs=args
+        ) as executor:
+            futures: Dict[Future, Tile] = {}
+
+            while next_profile < len(tiles):
+                stop = min(next_profile + window, len(tiles))
+                queue = [tile for pt in tiles[submitted:stop] for tile in pt]
+                queue.sort(key=lambda t: t.cost, reverse=True)
+                for tile in queue:
+                    futures[executor.submit(_scan_tile, tile)] = tile
+                submitted = max(submitted, stop)
+
+                finished, _ = wait(list(futures), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    tile = futures.pop(future)
+                    done[(tile.profile, tile.group)] = future.result()
+
+                while next_profile < len(tiles):
+                    profile_tiles = tiles[next_profile]
+                    keys = [(t.profile, t.group) for t in profile_tiles]
+                    if not all(k in done for k in keys):
+                        break
+
+                    results: List[TargetResult] = []
+                    for k in keys:
+                        results += done.pop(k)
+                    yield results
+                    next_profile += 1
+
+
+def create_tiles(
+    blocks: List[HMMERBlock],
+    targets: List[FASTAItem],
+    num_groups: int,
+    profiles: Optional[range] = None,
+) -> List[List[Tile]]:
+    """
+    Cut the (profile, target) space into tiles.
+
+    Targets are split into at most `num_groups` contiguous groups of roughly the
+    same number of bases. It returns, for each profile in `profiles` (every
+    profile by default), its tiles in target order.
+    """
+    sizes = [len(tgt.sequence) for tgt in targets]
+    num_groups = max(1, min(num_groups, len(targets)))
+    total = sum(sizes)
+
+    bounds = [0]
+    acc = 0
+    for i, size in enumerate(sizes[:-1]):
+        acc += size
+        if acc * num_groups >= total * len(bounds) and len(bounds) < num_groups:
+            bounds.append(i + 1)
+    bounds.append(len(targets))
+
+    groups = list(zip(bounds[:-1], bounds[1:]))
+    tiles: List[List[Tile]] = []
+    if profiles is None:
+        profiles = range(len(blocks))
+    for i in profiles:
+        block = blocks[i]
+        profile_tiles: List[Tile] = []
+        for j, (start, stop) in enumerate(groups):
+            cost = block.model_length * sum(sizes[start:stop])
+            profile_tiles.append(Tile(i, j, start, stop, cost))
+        tiles.append(profile_tiles)
+
+    return tiles
+
+
+class _TileWorker:
+    def __init__(
+        self,
+        profile: str,
+        blocks: List[HMMERBlock],
+        targets: List[FASTAItem],
+        base_abc_name: str,
+        window: int,
+        epsilon: float,
+        debug: bool,
+        prefilter: Optional[float],
+        hit_filter: Optional[HitFilter],
+        model_cache: bool,
+        min_score: Optional[float],
+    ):
+        self._profile = profile
+        self._blocks = blocks
+        self._targets = targets
+        if base_abc_name == "dna":
+            base_abc = DNAAlphabet()
+        elif base_abc_name == "rna":
+            base_abc = RNAAlphabet()
+        else:
+            raise ValueError(f"Unknown base alphabet {base_abc_name}.")
+        self._gcode = CodonTable(base_abc, IUPACAminoAlphabet())
+        self._window = window
+        self._epsilon = epsilon
+        self._debug = debug
+        self._prefilter = prefilter
+        self._hit_filter = hit_filter
+        self._min_score = min_score
+        self._gathering_cutoff: Optional[float] = None
+        self._cache: Optional[HMMERCache] = None
+        if model_cache:
+            self._cache = HMMERCache(cache_filepath(profile))
+        self._prof_idx = -1
+        self._prof: Optional[ProteinProfile] = None
+        self._filter: Optional[Prefilter] = None
+
+    def scan(self, tile: Tile) -> List[TargetResult]:
+        prof = self._get_profile(tile.profile)
+        gcode = self._gcode
+
+        results: List[TargetResult] = []
+        for tgt in self._targets[tile.target_start : tile.target_stop]:
+            data = tgt.sequence.encode()
+            seqid = f"{tgt.id}"
+            stats = PrefilterStats()
+            regions = None
+            if self._filter is not None:
+                regions = self._filter.regions(data)
+                stats.update(len(data), regions)
+                if len(regions) == 0:
+                    results.append(TargetResult(seqid, [], [], stats))
+                    continue
+
+            seq = prof.create_sequence(data)
+            search_results = prof.search(seq, regions, self._min_score)
+            ifragments = search_results.ifragments()
+
+            hits: List[TileHit] = []
+            for ifrag in ifragments:
+                if not self._keep(ifrag.bit_score, ifrag.e_value):
+                    continue
+                codon_frag = ifrag.fragment.decode()
+                amino_frag = codon_frag.decode(gcode)
+                hit = TileHit(
+                    seqid,
+                    alphabet_name(seq.alphabet),
+                    prof.profid,
+                    alphabet_name(prof.alphabet),
+                    ifrag.interval.start,
+                    ifrag.interval.stop,
+                    prof.window_length,
+                    str(codon_frag.sequence),
+                    str(amino_frag.sequence),
+                    ifrag.e_value,
+                )
+                hits.append(hit)
+
+            debug_rows: List[DebugRow] = []
+            if self._debug:
+                debug_rows = search_results.debug_table()
+            results.append(TargetResult(seqid, hits, debug_rows, stats))
+
+        return results
+
+    def _get_profile(self, idx: int) -> ProteinProfile:
+        if self._prof is None or self._prof_idx != idx:
+            if self._cache is None:
+                plain_model = read_hmmer_block(self._profile, self._blocks[idx])
+                hmodel = HMMERModel(plain_model)
+            else:
+                hmodel = self._cache[idx]
+            base_abc = self._gcode.base_alphabet
+            self._prof = create_profile2(hmodel, base_abc, self._window, self._epsilon)
+            if self._prefilter is not None:
+                self._filter = Prefilter(hmodel, self._prefilter)
+            if self._hit_filter is not None:
+                self._prof.evalue = create_evalue(hmodel, len(self._blocks))
+                self._gathering_cutoff = hmodel.gathering_cutoff
+            self._prof_idx = idx
+        return self._prof
+
+    def _keep(self, bit_score: float, e_value: float) -> bool:
+        hit_filter = self._hit_filter
+        if hit_filter is None:
+            return True
+        if e_value > hit_filter.max_e_value:
+            return False
+        cutoff = self._gathering_cutoff
+        return not (hit_filter.cut_ga and cutoff is not None and bit_score < cutoff)
+
+
+_worker: Optional[_TileWorker] = None
+
+
+def _init_process(*args):
+    global _worker
+    _worker = _TileWorker(*args)
+
+
+def _scan_tile(tile: Tile) -> List[TargetResult]:
+    assert _worker is not None
+    return _worker.scan(tile)
@@ -0,0 +1,104 @@
+from typing import List, NamedTuple, Optional
+
+import click
+
+__all__ = [
+    "SHARD",
+    "Shard",
+    "TARGET_SHARD_BLOCK",
+    "make_shard",
+    "shard_profiles",
+    "target_in_shard",
+]
+
+# Targets are dealt to shards in blocks of this many bases, by the position
+# of their first base in the stream of target sequences.
+TARGET_SHARD_BLOCK = 1_000_000
+
+# Part `index` (zero-based) of a job split into `count` parts, and whether
+# profiles or targets are split.
+Shard = NamedTuple("Shard", [("index", int), ("count", int), ("by", str)])
+
+
+class ShardParamType(click.ParamType):
+    """
+    Command-line shard given as ``I/N``, with ``1 <= I <= N``.
+    """
+
+    name = "I/N"
+
+    def convert(self, value, param, ctx):
+        if isinstance(value, tuple):
+            return value
+        i, sep, n = str(value).partition("/")
+        try:
+            index = int(i)
+            count = int(n)
+        except ValueError:
+            self.fail(f"{value} is not of the form I/N.", param, ctx)
+        if sep != "/" or not (1 <= index <= count):
+            self.fail(f"{value} is not of the form I/N, with 1 <= I <= N.", param, ctx)
+        return (index - 1, count)
+
+
+SHARD = ShardParamType()
+
+
+def make_shard(shard: Optional[tuple], by: str) -> Optional[Shard]:
+    """
+    Shard from the values of the ``--shard`` and ``--shard-by`` options.
+    """
+    if shard is None:
+        return None
+    return Shard(shard[0], shard[1], by)
+
+
+def shard_profiles(model_lengths: List[int], shard: Optional[Shard]) -> range:
+    """
+    Contiguous range of profiles that belong to a shard.
+
+    Profiles are split into ranges of roughly the same total model length, the
+    scanning cost of a profile being proportional to its length. Unknown
+    lengths, given as zeros, count as one. Without profile sharding, every
+    profile belongs to the range.
+
+    Parameters
+    ----------
+    model_lengths
+        Model length of every profile, in database order.
+    shard
+        Shard, or `None`.
+    """
+    n = len(model_lengths)
+    if shard is None or shard.by != "profiles":
+        return range(n)
+
+    model_lengths = [max(length, 1) for length in model_lengths]
+    total = sum(model_lengths)
+    bounds = [0]
+    acc = 0
+    for i, length in enumerate(model_lengths):
+        if len(bounds) == shard.count:
+            break
+        acc += length
+        if acc * shard.count >= total * len(bounds):
+            bounds.append(i + 1)
+    while len(bounds) < shard.count:
+        bounds.append(n)
+    bounds.append(n)
+
+    return range(bounds[shard.index], bounds[shard.index + 1])
+
+
+def target_in_shard(offset: int, shard: Optional[Shard]) -> bool:
+    """
+    Whether the target starting at base `offset` of the target stream belongs
+    to a shard.
+
+    Blocks of :data:`TARGET_SHARD_BLOCK` bases are dealt to the shards in turn,
+    which balances the number of bases without knowing the input size in
+    advance. Without target sharding, every target belongs to the shard.
+    """
+    if shard is None or shard.by != "targets":
+        return True
+    return (offset // TARGET_SHARD_BLOCK) % shard.count == shard.index
@@ -0,0 +1,118 @@
+from typing import IO, Iterator, List, Optional
+
+import click
+from fasta_reader import FASTAItem, read_fasta
+
+from iseq.alphabet import Alphabets, infer_alphabet
+
+from .shard import Shard, target_in_shard
+
+__all__ = ["TargetReader", "open_targets"]
+
+
+class TargetReader:
+    """
+    Read TARGET sequences in chunks.
+
+    A chunk holds as many sequences as needed to reach `chunk_size` bases, so
+    that the memory usage is bounded by the chunk size rather than by the size
+    of the input. The file is read only once and sequentially, which means that
+    non-seekable streams like the standard input are supported.
+
+    Parameters
+    ----------
+    file
+        FASTA file.
+    chunk_size
+        Number of bases per chunk. Defaults to zero, which means a single chunk
+        holding every sequence.
+    shard
+        Only read the sequences of this shard. Defaults to `None`.
+    """
+
+    def __init__(
+        self, file: IO[str], chunk_size: int = 0, shard: Optional[Shard] = None
+    ):
+        if chunk_size < 0:
+            raise ValueError("Chunk size must be greater than or equal to zero.")
+
+        self._fasta = iter(read_fasta(file))
+        self._file = file
+        self._chunk_size = chunk_size
+        self._shard = shard
+        self._offset = 0
+        # First sequence read, kept to infer the alphabet of a shard whose
+        # first chunk is empty.
+        self._probe: List[FASTAItem] = []
+        self._first: Optional[List[FASTAItem]] = self._read_chunk()
+        self._alphabet = _infer_chunk_alphabet(self._first + self._probe)
+        self._probe = []
+
+    @property
+    def alphabet(self) -> Optional[Alphabets]:
+        """
+        Alphabet inferred from the first chunk.
+        """
+        return self._alphabet
+
+    def __iter__(self) -> Iterator[List[FASTAItem]]:
+        chunk = self._first
+        self._first = None
+        if chunk is None:
+            return
+
+        while len(chunk) > 0:
+            yield chunk
+            del chunk
+            chunk = self._read_chunk()
+
+    def _read_chunk(self) -> List[FASTAItem]:
+        chunk: List[FASTAItem] = []
+        size = 0
+        for item in self._fasta:
+            offset = self._offset
+            self._offset += len(item.sequence)
+            if offset == 0:
+                self._probe.append(item)
+            if not target_in_shard(offset, self._shard):
+                continue
+            chunk.append(item)
+            size += len(item.sequence)
+            if self._chunk_size > 0 and size >= self._chunk_size:
+                break
+        return chunk
+
+    def close(self):
+        """
+        Close the associated stream.
+        """
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        del exception_type
+        del exception_value
+        del traceback
+        self.close()
+
+
+def _infer_chunk_alphabet(chunk: List[FASTAItem]) -> Optional[Alphabets]:
+    for item in chunk:
+        alphabet = infer_alphabet(item.sequence.encode())
+        if alphabet is not None:
+            return alphabet
+    return None
+
+
+def open_targets(
+    file: IO[str], chunk_size: int = 0, shard: Optional[Shard] = None
+) -> TargetReader:
+    """
+    Open TARGET for chunked reading, failing if its alphabet cannot be inferred.
+    """
+    reader = TargetReader(file, chunk_size, shard)
+    if reader.alphabet is None:
+        raise click.UsageError("Could not infer alphabet from TARGET.")
+    return reader
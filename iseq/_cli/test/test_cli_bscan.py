@@ -1,11 +1,15 @@
 import os
+import shutil
 
 from assertpy import assert_that, contents_of
 from click.testing import CliRunner
 
 from iseq import cli
+from iseq._cli.bscan import Worker
 from iseq.example import example_filepath
 
+EXTS = [".alt", ".alt.idx", ".null", ".null.idx", ".meta"]
+
 
 def test_cli_bscan_GALNBKIG_pfam10(tmp_path):
     os.chdir(tmp_path)
@@ -115,3 +119,141 @@ def test_cli_bscan_GALNBKIG_pfam10_ncpus2(tmp_path):
     assert_that(contents_of("bscan_output.gff")).is_equal_to(
         contents_of("pscan_output.gff")
     )
+
+
+def test_cli_press_parallel_incremental(tmp_path):
+    os.chdir(tmp_path)
+    invoke = CliRunner().invoke
+    profile = tmp_path / "Pfam-A.33.1_10.hmm"
+    shutil.copyfile(example_filepath("Pfam-A.33.1_10.hmm"), profile)
+
+    r = invoke(cli, ["press", str(profile), "--quiet", "--ncpus", "1"])
+    assert r.exit_code == 0, r.output
+    serial = {ext: (tmp_path / f"{profile.name}{ext}").read_bytes() for ext in EXTS}
+
+    r = invoke(cli, ["press", str(profile), "--quiet", "--ncpus", "2"])
+    assert r.exit_code == 0, r.output
+    for ext in EXTS:
+        assert (tmp_path / f"{profile.name}{ext}").read_bytes() == serial[ext]
+
+    r = invoke(cli, ["press", str(profile), "--quiet", "--incremental"])
+    assert r.exit_code == 0, r.output
+    for ext in EXTS:
+        assert (tmp_path / f"{profile.name}{ext}").read_bytes() == serial[ext]
+
+
+def test_cli_bscan_GALNBKIG_pfam10_model2(tmp_path):
+    os.chdir(tmp_path)
+    invoke = CliRunner().invoke
+    profile = tmp_path / "Pfam-A.33.1_10.hmm"
+    shutil.copyfile(example_filepath("Pfam-A.33.1_10.hmm"), profile)
+    fasta = example_filepath("GALNBKIG_00914_ont_01_plus_strand.fasta")
+
+    r = invoke(cli, ["pscan", str(profile), str(fasta), "--model", "2", "--quiet"])
+    assert r.exit_code == 0, r.output
+
+    r = invoke(cli, ["bscan", str(profile), str(fasta), "--model", "2"])
+    assert r.exit_code != 0
+
+    r = invoke(cli, ["press", str(profile), "--model", "2", "--quiet"])
+    assert r.exit_code == 0, r.output
+
+    r = invoke(
+        cli,
+        [
+            "bscan",
+            str(profile),
+            str(fasta),
+            "--model",
+            "2",
+            "--output",
+            "bscan_output.gff",
+            "--ocodon",
+            "bscan_ocodon.fasta",
+            "--oamino",
+            "bscan_oamino.fasta",
+            "--quiet",
+        ],
+    )
+    assert r.exit_code == 0, r.output
+
+    assert_that(contents_of("bscan_oamino.fasta")).is_equal_to(
+        contents_of("oamino.fasta")
+    )
+    assert_that(contents_of("bscan_ocodon.fasta")).is_equal_to(
+        contents_of("ocodon.fasta")
+    )
+
+
+def test_cli_bscan_GALNBKIG_pfam10_kmer_tables(tmp_path):
+    os.chdir(tmp_path)
+    invoke = CliRunner().invoke
+    profile = tmp_path / "Pfam-A.33.1_10.hmm"
+    shutil.copyfile(example_filepath("Pfam-A.33.1_10.hmm"), profile)
+    fasta = example_filepath("GALNBKIG_00914_ont_01_plus_strand.fasta")
+
+    r = invoke(cli, ["pscan", str(profile), str(fasta), "--quiet"])
+    assert r.exit_code == 0, r.output
+
+    r = invoke(cli, ["press", str(profile), "--quiet", "--kmer-tables"])
+    assert r.exit_code == 0, r.output
+    kmer = tmp_path / f"{profile.name}.kmer"
+    assert kmer.exists()
+    tables = kmer.read_bytes()
+
+    r = invoke(
+        cli, ["press", str(profile), "--quiet", "--incremental", "--kmer-tables"]
+    )
+    assert r.exit_code == 0, r.output
+    assert kmer.read_bytes() == tables
+
+    r = invoke(
+        cli,
+        [
+            "bscan",
+            str(profile),
+            str(fasta),
+            "--engine",
+            "numpy",
+            "--output",
+            "bscan_output.gff",
+            "--ocodon",
+            "bscan_ocodon.fasta",
+            "--oamino",
+            "bscan_oamino.fasta",
+            "--quiet",
+        ],
+    )
+    assert r.exit_code == 0, r.output
+
+    assert_that(contents_of("bscan_oamino.fasta")).is_equal_to(
+        contents_of("oamino.fasta")
+    )
+    assert_that(contents_of("bscan_ocodon.fasta")).is_equal_to(
+        contents_of("ocodon.fasta")
+    )
+
+    r = invoke(cli, ["press", str(profile), "--quiet"])
+    assert r.exit_code == 0, r.output
+    assert not kmer.exists()
+
+
+def _failing_search(self, position, db_idx, entry, targets, window):
+    raise RuntimeError(f"Failed to scan {entry.acc}.")
+
+
+def test_cli_bscan_failing_profile(tmp_path, monkeypatch):
+    os.chdir(tmp_path)
+    invoke = CliRunner().invoke
+    profile = tmp_path / "Pfam-A.33.1_10.hmm"
+    shutil.copyfile(example_filepath("Pfam-A.33.1_10.hmm"), profile)
+    fasta = example_filepath("GALNBKIG_00914_ont_01_plus_strand.fasta")
+
+    r = invoke(cli, ["press", str(profile), "--quiet"])
+    assert r.exit_code == 0, r.output
+
+    # Worker processes are forked, so they inherit the patched method.
+    monkeypatch.setattr(Worker, "search", _failing_search)
+    r = invoke(cli, ["bscan", str(profile), str(fasta), "--quiet", "--ncpus", "2"])
+    assert r.exit_code != 0
+    assert isinstance(r.exception, RuntimeError)
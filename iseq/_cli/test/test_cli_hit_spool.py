@@ -0,0 +1,55 @@
+import os
+import shutil
+
+from iseq._cli.hit_spool import HitSpool
+from iseq._cli.scheduler import TileHit
+from iseq.profile import ProfileID
+
+
+def _hits(n: int):
+    profid = ProfileID("PF03373", "PF03373.14")
+    hits = []
+    for i in range(n):
+        codon = "ATG" * (i + 1)
+        amino = "M" * (i + 1)
+        hit = TileHit(f"seq{i}", "dna", profid, "amino", i, i + 3, 0, codon, amino, 0.1)
+        hits.append(hit)
+    return hits
+
+
+def test_cli_hit_spool(tmp_path):
+    hits = _hits(5)
+    spool = HitSpool(tmp_path)
+    assert os.path.dirname(spool.filepath) == str(tmp_path)
+    assert list(spool) == []
+
+    for hit in hits:
+        spool.append(hit)
+    assert len(spool) == 5
+    # The memo is cleared after each hit, so the profile shared by the hits
+    # is written and read back with every one of them.
+    assert list(spool) == hits
+    assert list(spool) == hits
+
+    spool.close()
+    assert not os.path.exists(spool.filepath)
+    spool.close()
+
+
+def test_cli_hit_spool_resume(tmp_path):
+    hits = _hits(5)
+    filepath = tmp_path / "checkpoint.json.hits"
+    # Spool left behind by an interrupted run.
+    with HitSpool(tmp_path) as spool:
+        for hit in hits[:3]:
+            spool.append(hit)
+        spool.flush()
+        shutil.copyfile(spool.filepath, filepath)
+
+    with HitSpool(filepath=filepath, size=3) as spool:
+        assert list(spool) == hits[:3]
+        for hit in hits[3:]:
+            spool.append(hit)
+        assert len(spool) == 5
+        assert list(spool) == hits
+    assert not filepath.exists()
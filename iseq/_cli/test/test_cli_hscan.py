@@ -171,6 +171,43 @@ def test_cli_hscan_window200(tmp_path):
     assert_allclose(actual["alt_viterbi_score"], desired["alt_viterbi_score"])
 
 
+def test_cli_hscan_window200_numpy(tmp_path):
+    os.chdir(tmp_path)
+
+    hmm_filepath = example_filepath("2OG-FeII_Oxy_3-nt.hmm")
+    fasta_filepath = example_filepath("2OG-FeII_Oxy_3-nt_unilocal.fasta")
+
+    invoke = CliRunner().invoke
+    r = invoke(
+        cli,
+        [
+            "hscan",
+            str(hmm_filepath),
+            str(fasta_filepath),
+            "--output",
+            "output.gff",
+            "--odebug",
+            "debug.tsv",
+            "--window",
+            200,
+            "--hmmer3-compat",
+            "--engine",
+            "numpy",
+        ],
+    )
+    assert r.exit_code == 0, r.output
+    actual = pd.read_csv("debug.tsv", sep="\t", header=0)
+
+    desired = pd.read_csv(StringIO(_desired_hscan_window200), sep="\t", header=0)
+
+    assert all(a == b for a, b in zip(actual["defline"], desired["defline"]))
+    assert all(a == b for a, b in zip(actual["window"], desired["window"]))
+    assert all(a == b for a, b in zip(actual["start"], desired["start"]))
+    assert all(a == b for a, b in zip(actual["stop"], desired["stop"]))
+    assert_allclose(actual["alt_viterbi_score"], desired["alt_viterbi_score"])
+    assert_allclose(actual["null_viterbi_score"], desired["null_viterbi_score"])
+
+
 _output_window_auto = """\
 ##gff-version 3
 2OG-FeII_Oxy_3-seed0	iseq	.	252	288	0.0	+	.	ID=item1;Target_alph=dna;Profile_name=2OG-FeII_Oxy_3;Profile_alph=dna;Profile_acc=-;Window=630
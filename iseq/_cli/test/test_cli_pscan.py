@@ -99,6 +99,37 @@ def test_cli_pscan_gff_output(tmp_path, GALNBKIG_cut):
     assert_that(contents_of("amino.fasta")).is_equal_to(contents_of(amino))
 
 
+def test_cli_pscan_gff_output_stdin_chunks(tmp_path, GALNBKIG_cut):
+    os.chdir(tmp_path)
+    PF03373 = example_filepath("PF03373.hmm")
+    invoke = CliRunner().invoke
+    fasta = GALNBKIG_cut["fasta"]
+    output = GALNBKIG_cut["gff"]
+    codon = GALNBKIG_cut["codon.fasta"]
+    amino = GALNBKIG_cut["amino.fasta"]
+    r = invoke(
+        cli,
+        [
+            "pscan",
+            str(PF03373),
+            "-",
+            "--output",
+            "output.gff",
+            "--ocodon",
+            "codon.fasta",
+            "--oamino",
+            "amino.fasta",
+            "--chunk-size",
+            "1",
+        ],
+        input=contents_of(str(fasta)),
+    )
+    assert r.exit_code == 0, r.output
+    assert_that(contents_of("output.gff")).is_equal_to(contents_of(output))
+    assert_that(contents_of("codon.fasta")).is_equal_to(contents_of(codon))
+    assert_that(contents_of("amino.fasta")).is_equal_to(contents_of(amino))
+
+
 def test_cli_pscan_window0(tmp_path, large_rna):
     os.chdir(tmp_path)
     PF03373 = example_filepath("PF03373.hmm")
@@ -1,10 +1,13 @@
+import json
 import os
 
 from assertpy import assert_that, contents_of
 from click.testing import CliRunner
+from fasta_reader import read_fasta
 
 from iseq import cli
 from iseq.example import example_filepath
+from iseq.gff import read as read_gff
 
 
 def test_cli_pscan2_pfam24(tmp_path):
@@ -23,3 +26,186 @@ def test_cli_pscan2_pfam24(tmp_path):
     assert_that(contents_of("oamino.fasta")).is_equal_to(contents_of(oamino))
     assert_that(contents_of("ocodon.fasta")).is_equal_to(contents_of(ocodon))
     assert_that(contents_of("output.gff")).is_equal_to(contents_of(output))
+
+
+def test_cli_pscan2_pfam24_ncpus(tmp_path):
+    os.chdir(tmp_path)
+    invoke = CliRunner().invoke
+    profile = example_filepath("Pfam-A_24.hmm")
+    fasta = example_filepath("AE014075.1_subset_nucl.fasta")
+    oamino = example_filepath("AE014075.1_subset_oamino.fasta")
+    ocodon = example_filepath("AE014075.1_subset_ocodon.fasta")
+    output = example_filepath("AE014075.1_subset_output.gff")
+    for ncpus in ["1", "3"]:
+        r = invoke(
+            cli,
+            [
+                "pscan2",
+                str(profile),
+                str(fasta),
+                "--max-e-value",
+                "1e-10",
+                "--ncpus",
+                ncpus,
+                "--quiet",
+            ],
+        )
+        assert r.exit_code == 0, r.output
+
+        assert_that(contents_of("oamino.fasta")).is_equal_to(contents_of(oamino))
+        assert_that(contents_of("ocodon.fasta")).is_equal_to(contents_of(ocodon))
+        assert_that(contents_of("output.gff")).is_equal_to(contents_of(output))
+
+
+def test_cli_pscan2_pfam24_resume(tmp_path):
+    os.chdir(tmp_path)
+    invoke = CliRunner().invoke
+    profile = example_filepath("Pfam-A_24.hmm")
+    fasta = example_filepath("AE014075.1_subset_nucl.fasta")
+    oamino = example_filepath("AE014075.1_subset_oamino.fasta")
+    ocodon = example_filepath("AE014075.1_subset_ocodon.fasta")
+    output = example_filepath("AE014075.1_subset_output.gff")
+    args = ["pscan2", str(profile), str(fasta), "--max-e-value", "1e-10"]
+    args += ["--checkpoint", "checkpoint.json", "--resume", "--quiet"]
+
+    r = invoke(cli, args)
+    assert r.exit_code == 0, r.output
+    with open("checkpoint.json", "r") as file:
+        manifest = json.load(file)
+    assert manifest["state"]["done"]
+
+    # Pretend the run stopped while writing the outputs.
+    manifest["state"]["done"] = False
+    with open("checkpoint.json", "w") as file:
+        json.dump(manifest, file)
+    with open("output.gff", "a") as file:
+        file.write("partial")
+
+    r = invoke(cli, args)
+    assert r.exit_code == 0, r.output
+
+    assert_that(contents_of("oamino.fasta")).is_equal_to(contents_of(oamino))
+    assert_that(contents_of("ocodon.fasta")).is_equal_to(contents_of(ocodon))
+    assert_that(contents_of("output.gff")).is_equal_to(contents_of(output))
+
+    r = invoke(cli, args[:-3] + ["--window", "10"] + args[-3:])
+    assert r.exit_code != 0
+
+
+def test_cli_pscan2_pfam24_shard(tmp_path):
+    os.chdir(tmp_path)
+    invoke = CliRunner().invoke
+    profile = example_filepath("Pfam-A_24.hmm")
+    fasta = example_filepath("AE014075.1_subset_nucl.fasta")
+    oamino = example_filepath("AE014075.1_subset_oamino.fasta")
+    ocodon = example_filepath("AE014075.1_subset_ocodon.fasta")
+    output = example_filepath("AE014075.1_subset_output.gff")
+    for shard_by in ["profiles", "targets"]:
+        shards = []
+        for i in range(1, 4):
+            shard = tmp_path / f"{shard_by}{i}"
+            shard.mkdir()
+            shards.append(str(shard))
+            r = invoke(
+                cli,
+                [
+                    "pscan2",
+                    str(profile),
+                    str(fasta),
+                    "--max-e-value",
+                    "1e-10",
+                    "--shard",
+                    f"{i}/3",
+                    "--shard-by",
+                    shard_by,
+                    "--output",
+                    str(shard / "output.gff"),
+                    "--ocodon",
+                    str(shard / "ocodon.fasta"),
+                    "--oamino",
+                    str(shard / "oamino.fasta"),
+                    "--quiet",
+                ],
+            )
+            assert r.exit_code == 0, r.output
+
+        r = invoke(cli, ["merge"] + shards)
+        assert r.exit_code == 0, r.output
+
+        assert_that(contents_of("oamino.fasta")).is_equal_to(contents_of(oamino))
+        assert_that(contents_of("ocodon.fasta")).is_equal_to(contents_of(ocodon))
+        assert_that(contents_of("output.gff")).is_equal_to(contents_of(output))
+
+
+def test_cli_pscan2_pfam24_score_only(tmp_path):
+    os.chdir(tmp_path)
+    invoke = CliRunner().invoke
+    profile = example_filepath("Pfam-A_24.hmm")
+    fasta = example_filepath("AE014075.1_subset_nucl.fasta")
+    oamino = example_filepath("AE014075.1_subset_oamino.fasta")
+    ocodon = example_filepath("AE014075.1_subset_ocodon.fasta")
+    output = example_filepath("AE014075.1_subset_output.gff")
+    args = ["pscan2", str(profile), str(fasta), "--max-e-value", "1e-10", "--quiet"]
+
+    r = invoke(cli, args + ["--score-only"])
+    assert r.exit_code != 0
+
+    # Windows holding hits this significant all score above zero bits.
+    r = invoke(cli, args + ["--score-only", "--min-score", "0"])
+    assert r.exit_code == 0, r.output
+
+    assert_that(contents_of("oamino.fasta")).is_equal_to(contents_of(oamino))
+    assert_that(contents_of("ocodon.fasta")).is_equal_to(contents_of(ocodon))
+    assert_that(contents_of("output.gff")).is_equal_to(contents_of(output))
+
+    r = invoke(cli, args + ["--score-only", "--min-score", "10000"])
+    assert r.exit_code == 0, r.output
+
+    with open("output.gff", "r") as file:
+        items = [row for row in file if not row.startswith("#")]
+    assert items == []
+    assert_that(contents_of("oamino.fasta")).is_empty()
+
+
+def test_cli_pscan2_pfam24_chunks(tmp_path):
+    os.chdir(tmp_path)
+    invoke = CliRunner().invoke
+    profile = example_filepath("Pfam-A_24.hmm")
+    fasta = example_filepath("AE014075.1_subset_nucl.fasta")
+    oamino = example_filepath("AE014075.1_subset_oamino.fasta")
+    output = example_filepath("AE014075.1_subset_output.gff")
+    # A chunk per target.
+    opts = ["--max-e-value", "1e-10", "--chunk-size", "1", "--quiet"]
+    r = invoke(cli, ["pscan2", str(profile), str(fasta)] + opts)
+    assert r.exit_code == 0, r.output
+
+    with read_fasta(str(fasta)) as file:
+        target_ids = [item.id for item in file]
+    assert len(target_ids) > 1
+
+    # Items of a single chunk are listed profile by profile, whereas several
+    # chunks list them target by target, keeping the profile order within
+    # each target.
+    items = list(read_gff(output).items())
+    assert len(set(item.get_attribute("Profile_acc") for item in items)) > 1
+    items.sort(key=lambda item: target_ids.index(item.seqid))
+    chunk_items = list(read_gff("output.gff").items())
+    assert len(chunk_items) == len(items)
+
+    with read_fasta(str(oamino)) as file:
+        aminos = {item.id: item.sequence for item in file}
+    with read_fasta("oamino.fasta") as file:
+        chunk_aminos = {item.id: item.sequence for item in file}
+
+    for i, (chunk_item, item) in enumerate(zip(chunk_items, items)):
+        assert chunk_item.get_attribute("ID") == f"item{i + 1}"
+        attrs = [a for a in item.attributes_astuple() if a[0] != "ID"]
+        chunk_attrs = [a for a in chunk_item.attributes_astuple() if a[0] != "ID"]
+        assert chunk_attrs == attrs
+        assert (chunk_item.seqid, chunk_item.start, chunk_item.end) == (
+            item.seqid,
+            item.start,
+            item.end,
+        )
+        item_id = item.get_attribute("ID")
+        assert chunk_aminos[f"item{i + 1}"] == aminos[item_id]
@@ -1,11 +1,15 @@
 import os
+from io import StringIO
 from pathlib import Path
 
 from assertpy import assert_that, contents_of
 from click.testing import CliRunner
+from fasta_reader import read_fasta
+from hmmer import HMMER
 
 from iseq import cli
 from iseq.example import example_filepath
+from iseq.gff import read as read_gff
 
 _desired_output = """##gff-version 3
 Homoserine_dh-consensus	iseq	.	1	519	0.0	+	.	ID=item1;Target_alph=dna;Profile_name=Homoserine_dh;Profile_alph=dna;Profile_acc=PF00742.20;Window=0;Bias=0.2;E-value=2.3e-86;Epsilon=0.01;Score=274.3
@@ -186,3 +190,52 @@ def test_cli_pscan3_pfam4(tmp_path: Path):
     assert_that(contents_of("oamino.fasta")).is_equal_to(contents_of(oamino))
     assert_that(contents_of("ocodon.fasta")).is_equal_to(contents_of(ocodon))
     assert_that(contents_of("output.gff")).is_equal_to(contents_of(output))
+
+
+def test_cli_pscan3_pfam24_hmmer_batches(tmp_path: Path):
+    os.chdir(tmp_path)
+    invoke = CliRunner().invoke
+    profile = example_filepath("Pfam-A_24.hmm")
+    fasta = example_filepath("AE014075.1_subset_nucl.fasta")
+    output = example_filepath("output_pfam24.gff")
+    opts = ["--hmmer-batch-size", "1000", "--quiet"]
+    r = invoke(cli, ["pscan3", str(profile), str(fasta)] + opts)
+    assert r.exit_code == 0, r.output
+    assert_that(contents_of("output.gff")).is_equal_to(contents_of(output))
+
+    # Scores of the batched hmmscan calls are those of a hmmsearch of each
+    # profile against its own fragments.
+    with read_fasta("oamino.fasta") as file:
+        aminos = {item.id: item.sequence for item in file}
+    hmmer = HMMER(profile)
+    items = list(read_gff("output.gff").items())
+    assert len(items) > 0
+    for item in items:
+        item_id = item.get_attribute("ID")
+        target = StringIO(f">{item_id}\n{aminos[item_id]}\n")
+        acc = item.get_attribute("Profile_acc")
+        result = hmmer.search(
+            target, "/dev/null", tblout=True, domtblout=False, hmmkey=acc, Z=1
+        )
+        row = result.tbl[0].full_sequence
+        assert item.get_attribute("E-value") == row.e_value
+        assert item.get_attribute("Score") == row.score
+        assert item.get_attribute("Bias") == row.bias
+
+
+def test_cli_pscan3_pfam24_in_process_e_values(tmp_path: Path):
+    os.chdir(tmp_path)
+    invoke = CliRunner().invoke
+    profile = example_filepath("Pfam-A_24.hmm")
+    fasta = example_filepath("AE014075.1_subset_nucl.fasta")
+    opts = ["--e-value-source", "iseq", "--quiet"]
+    r = invoke(cli, ["pscan3", str(profile), str(fasta)] + opts)
+    assert r.exit_code == 0, r.output
+
+    items = list(read_gff("output.gff").items())
+    assert len(items) > 0
+    for item in items:
+        names = [name for name, _ in item.attributes_astuple()]
+        assert "E-value" in names
+        assert "Score" in names
+        assert "Bias" not in names
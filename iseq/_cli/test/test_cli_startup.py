@@ -0,0 +1,70 @@
+import os
+import subprocess
+import sys
+
+import click
+from click.testing import CliRunner
+
+from iseq import cli
+
+# Cumulative import time of `iseq` and its command line interface, in
+# microseconds. Override with ISEQ_IMPORT_BUDGET_US on slow machines.
+IMPORT_BUDGET_US = int(os.environ.get("ISEQ_IMPORT_BUDGET_US", "150000"))
+
+HEAVY_MODULES = ["Bio", "fasta_reader", "hmmer", "imm", "nmm", "pandas", "tqdm"]
+
+
+def _run(code: str) -> subprocess.CompletedProcess:
+    cmd = [sys.executable, "-X", "importtime", "-c", code]
+    return subprocess.run(cmd, capture_output=True, text=True, check=True)
+
+
+def _iseq_import_us(stderr: str) -> int:
+    """
+    Cumulative import time of the top-level `iseq` entries of `-X importtime`.
+    """
+    total = 0
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:") :].split("|")
+        name = fields[2][1:]
+        if name.startswith("iseq"):
+            total += int(fields[1])
+    return total
+
+
+def test_cli_startup_help():
+    code = "from iseq import cli; cli.main(['--help'], standalone_mode=False)"
+    r = _run(code)
+    assert "pscan2" in r.stdout
+
+    elapsed = _iseq_import_us(r.stderr)
+    assert elapsed > 0
+    assert elapsed <= IMPORT_BUDGET_US, r.stderr
+
+
+def test_cli_startup_heavy_modules():
+    code = (
+        "import sys; from iseq import cli; cli.main(['--help'], standalone_mode=False)"
+    )
+    code += f"; print([m for m in {HEAVY_MODULES!r} if m in sys.modules])"
+    r = _run(code)
+    assert r.stdout.splitlines()[-1] == "[]"
+
+
+def test_cli_startup_commands():
+    r = CliRunner().invoke(cli, ["--help"])
+    assert r.exit_code == 0, r.output
+    for name in cli.list_commands(None):
+        assert name in r.output
+        assert cli.get_command(None, name) is not None
+
+
+def test_cli_startup_short_help():
+    for name, lazy in cli._lazy_commands.items():
+        short_help = click.Command(name, short_help=lazy.short_help)
+        cmd = cli.get_command(None, name)
+        assert cmd is not None
+        limit = 1000
+        assert short_help.get_short_help_str(limit) == cmd.get_short_help_str(limit)
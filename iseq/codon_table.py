@@ -44,6 +44,7 @@ class CodonTable:
 
         if gencode is None:
             gencode = GeneticCode("Standard")
+        self._gencode = gencode
         table = translation_table(gencode)
 
         def replace(seq: bytes):
@@ -112,6 +113,10 @@ class CodonTable:
     def amino_acids(self) -> List[bytes]:
         return list(set(self._amino_acid.values()))
 
+    @property
+    def gencode(self) -> GeneticCode:
+        return self._gencode
+
     @property
     def base_alphabet(self) -> Union[DNAAlphabet, RNAAlphabet]:
         return self._base_alphabet
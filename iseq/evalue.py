@@ -0,0 +1,70 @@
+from math import exp, expm1, log
+
+from .hmmer_model import HMMERModel, ScoreStats
+
+__all__ = ["EValue", "create_evalue"]
+
+
+class EValue:
+    """
+    Statistical significance of alt-vs-null scores.
+
+    Scores are converted to bits and assumed to follow the Gumbel distribution
+    that `hmmbuild` calibrates for local Viterbi scores, as stored in the
+    `STATS LOCAL VITERBI` line of a HMMER3 model.
+
+    Parameters
+    ----------
+    stats
+        Gumbel location (mu) and scale (lambda) of bit scores.
+    db_size
+        Number of comparisons an E-value accounts for, like HMMER's `-Z`.
+        Defaults to one.
+    """
+
+    def __init__(self, stats: ScoreStats, db_size: int = 1):
+        if db_size < 1:
+            raise ValueError("Database size must be greater than zero.")
+        self._stats = stats
+        self._db_size = db_size
+
+    @property
+    def stats(self) -> ScoreStats:
+        return self._stats
+
+    @property
+    def db_size(self) -> int:
+        return self._db_size
+
+    def p_value(self, score: float) -> float:
+        """
+        P-value of a score given in nats.
+        """
+        z = -self._stats.lambda_ * (score / log(2) - self._stats.mu)
+        if z > 700:
+            return 1.0
+        return -expm1(-exp(z))
+
+    def __call__(self, score: float) -> float:
+        """
+        E-value of a score given in nats.
+        """
+        return self._db_size * self.p_value(score)
+
+
+def create_evalue(hmm: HMMERModel, db_size: int = 1) -> EValue:
+    """
+    Create an E-value calculator from the local Viterbi statistics of a model.
+
+    Parameters
+    ----------
+    hmm
+        HMMER model.
+    db_size
+        Number of comparisons an E-value accounts for. Defaults to one.
+    """
+    stats = hmm.local_stats("VITERBI")
+    if stats is None:
+        name = hmm.model_id.name
+        raise ValueError(f"Model {name} has no STATS LOCAL VITERBI line.")
+    return EValue(stats, db_size)
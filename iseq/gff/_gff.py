@@ -37,6 +37,7 @@ ctg123 . exon            5000  5500  .  +  .  ID=exon00004;Parent=mrna0001
 ctg123 . exon            7000  9000  .  +  .  ID=exon00005;Parent=mrna0001
 ```
 """
+
 from __future__ import annotations
 
 import dataclasses
@@ -220,16 +221,21 @@ class GFF:
 
 class GFFWriter:
     def __init__(
-        self, file: Union[str, pathlib.Path, IO[str]], header: Optional[str] = None
+        self,
+        file: Union[str, pathlib.Path, IO[str]],
+        header: Optional[str] = None,
+        append: bool = False,
     ):
 
         if isinstance(file, str):
             file = pathlib.Path(file)
 
         if isinstance(file, pathlib.Path):
-            file = open(file, "w")
+            file = open(file, "a" if append else "w")
 
         self._file = file
+        if append:
+            return
         if header is None:
             self._file.write("##gff-version 3\n")
         else:
@@ -250,6 +256,12 @@ class GFFWriter:
         self._file.write("\t".join(cols))
         self._file.write("\n")
 
+    def flush(self):
+        """
+        Flush the associated stream.
+        """
+        self._file.flush()
+
     def close(self):
         """
         Close the associated stream.
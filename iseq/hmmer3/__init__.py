@@ -1,4 +1,5 @@
 from . import typing
+from ._plan7 import Plan7Viterbi
 from ._profile import HMMER3Profile, create_profile
 
-__all__ = ["HMMER3Profile", "create_profile", "typing"]
+__all__ = ["HMMER3Profile", "Plan7Viterbi", "create_profile", "typing"]
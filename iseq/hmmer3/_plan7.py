@@ -0,0 +1,425 @@
+from typing import List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from imm import Alphabet
+
+from iseq.model import EntryDistr, SpecialTransitions, Transitions, entry_costs
+
+__all__ = [
+    "BATCH_CELLS",
+    "Plan7Result",
+    "Plan7Viterbi",
+    "plan7_buckets",
+    "plan7_windows",
+]
+
+# State kinds of the steps of a Plan7 path.
+S, N, B, E, J, C, T, M, I, D = range(10)
+
+# Alignment of a sequence: its Viterbi score, in nats, and, if asked for, its
+# steps as (state kind, node) pairs from S to T. Nodes count from zero and are
+# only meaningful for M, I and D steps.
+Plan7Result = NamedTuple(
+    "Plan7Result",
+    [("score", float), ("steps", Optional[List[Tuple[int, int]]])],
+)
+
+# Number of DP cells, padding included, of a bucket of sequences searched
+# together.
+BATCH_CELLS = 1 << 20
+
+_NEG = -np.inf
+
+
+class Plan7Viterbi:
+    """
+    Viterbi algorithm specialised for the Plan7 layout of HMMER3 profiles.
+
+    The generic state-graph engine of `imm` knows nothing about the model
+    layout. Here, match, insert and delete scores are held in vectors over
+    the M model nodes, and each row of the dynamic programming matrix is
+    computed with a handful of vector operations. The chain of delete states
+    within a row, the only dependency between nodes of the same row, is
+    solved with a prefix maximum. It computes the same scores as the `imm`
+    model built by :class:`iseq.hmmer3.HMMER3Profile`.
+
+    Parameters
+    ----------
+    alphabet
+        Alphabet of the target sequences.
+    match_log_odds
+        M×K match emission log-odds, with K symbols in alphabet order.
+    core_trans
+        Transitions of nodes 0 to M, as in a HMMER3 file.
+    entry_distr
+        Entry distribution.
+    """
+
+    def __init__(
+        self,
+        alphabet: Alphabet,
+        match_log_odds: np.ndarray,
+        core_trans: List[Transitions],
+        entry_distr: EntryDistr,
+        hmmer3_compat: bool = False,
+    ):
+        nodes, nsymbols = match_log_odds.shape
+
+        # Emission row of every byte, the last row for unknown symbols.
+        self._codes = np.full(256, nsymbols, dtype=np.intp)
+        for i, symbol in enumerate(alphabet.symbols[:nsymbols]):
+            self._codes[symbol] = i
+        emission = np.full((nsymbols + 1, nodes), _NEG)
+        emission[:nsymbols] = match_log_odds.T
+        self._emission = emission
+        self._unknown = nsymbols
+
+        # Transitions from node k to node k + 1, for k in 0..M-2.
+        trans = core_trans[1:nodes]
+        self._MM = np.array([t.MM for t in trans], dtype=float)
+        self._MI = np.array([t.MI for t in trans], dtype=float)
+        self._MD = np.array([t.MD for t in trans], dtype=float)
+        self._IM = np.array([t.IM for t in trans], dtype=float)
+        self._II = np.array([t.II for t in trans], dtype=float)
+        self._DM = np.array([t.DM for t in trans], dtype=float)
+        self._DD = np.array([t.DD for t in trans], dtype=float)
+        self._entry = np.array(entry_costs(entry_distr, core_trans), dtype=float)
+
+        # Delete scores are a prefix maximum shifted by the cumulative DD
+        # costs, which only works while those costs are finite.
+        self._DD_cumsum: Optional[np.ndarray] = None
+        if np.all(np.isfinite(self._DD)):
+            self._DD_cumsum = np.cumsum(self._DD)
+
+        self._nodes = nodes
+        self._hmmer3_compat = hmmer3_compat
+        self._special = self._special_scores(SpecialTransitions())
+
+    @property
+    def nodes(self) -> int:
+        return self._nodes
+
+    def set_special_transitions(self, special_trans: SpecialTransitions):
+        """
+        Set the transitions of the special states used by :meth:`viterbi`.
+        """
+        self._special = self._special_scores(special_trans)
+
+    def encode(self, sequence: bytes) -> np.ndarray:
+        """
+        Emission rows of the symbols of a sequence.
+        """
+        return self._codes[np.frombuffer(sequence, dtype=np.uint8)]
+
+    def viterbi(self, codes: np.ndarray, path: bool = True) -> Plan7Result:
+        """
+        Viterbi score and, optionally, path of an encoded sequence.
+
+        Parameters
+        ----------
+        codes
+            Sequence encoded by :meth:`encode`.
+        path
+            Trace the best path back. Defaults to `True`.
+        """
+        return self._viterbi_bucket([codes], self._special[:, None], path)[0]
+
+    def viterbi_batch(
+        self,
+        codes: List[np.ndarray],
+        special_trans: List[SpecialTransitions],
+        path: bool = False,
+    ) -> List[Plan7Result]:
+        """
+        Viterbi scores and, optionally, paths of several encoded sequences.
+
+        Sequences are sorted by length and cut into buckets of at most
+        :data:`BATCH_CELLS` DP cells, padding included. Each bucket is run as
+        one DP vectorised over both the sequences and the model nodes.
+
+        Parameters
+        ----------
+        codes
+            Sequences encoded by :meth:`encode`.
+        special_trans
+            Transitions of the special states for each sequence, which depend
+            on its target length.
+        path
+            Trace the best paths back. Defaults to `False`.
+        """
+        results: List[Optional[Plan7Result]] = [None] * len(codes)
+        for bucket in plan7_buckets([len(c) for c in codes], self._nodes):
+            special = np.array([self._special_scores(special_trans[j]) for j in bucket])
+            bucket_results = self._viterbi_bucket(
+                [codes[j] for j in bucket], special.T, path
+            )
+            for j, result in zip(bucket, bucket_results):
+                results[j] = result
+
+        return [r for r in results if r is not None]
+
+    def _special_scores(self, t: SpecialTransitions) -> np.ndarray:
+        """
+        Special transitions in the order unpacked by :meth:`_viterbi_bucket`.
+
+        With hmmer3 compatibility, the N, C and J loops are free, as in
+        :meth:`iseq.model.AltModel.set_special_transitions`.
+        """
+        NN = CC = JJ = 0.0
+        if not self._hmmer3_compat:
+            NN, CC, JJ = t.NN, t.CC, t.JJ
+        return np.array(
+            [
+                NN,
+                t.NB,
+                CC,
+                t.CT,
+                t.EC + CC,
+                t.EC + t.CT,
+                JJ,
+                t.JB,
+                t.EJ + JJ,
+                t.EJ + t.JB,
+            ]
+        )
+
+    def _viterbi_bucket(
+        self, codes: List[np.ndarray], special: np.ndarray, path: bool
+    ) -> List[Plan7Result]:
+        n = len(codes)
+        lengths = np.array([len(c) for c in codes])
+        if np.any(lengths == 0):
+            raise ValueError("Sequence length cannot be zero.")
+        L = int(lengths.max())
+
+        X = np.full((n, L), self._unknown, dtype=np.intp)
+        for b, c in enumerate(codes):
+            X[b, : len(c)] = c
+
+        NN, NB, CC, CT, EC, ECT, JJ, JB, EJ, EJB = special
+        nodes = self._nodes
+        emission = self._emission
+        MM, MI, MD = self._MM, self._MI, self._MD
+        IM, II, DM, DD = self._IM, self._II, self._DM, self._DD
+
+        ptrs: Optional[_Pointers] = None
+        if path:
+            ptrs = _Pointers(
+                np.zeros((L + 1, n, nodes), dtype=np.int8),
+                np.zeros((L + 1, n, nodes), dtype=np.bool_),
+                np.zeros((L + 1, n, nodes), dtype=np.bool_),
+                np.zeros((L + 1, n), dtype=np.intp),
+                np.zeros((L + 1, n), dtype=np.int8),
+                np.zeros((L + 1, n), dtype=np.bool_),
+                np.zeros((L + 1, n), dtype=np.bool_),
+            )
+
+        Mv = np.full((n, nodes), _NEG)
+        Iv = np.full((n, nodes), _NEG)
+        Dv = np.full((n, nodes), _NEG)
+        Nv = np.full(n, _NEG)
+        Jv = np.full(n, _NEG)
+        Cv = np.full(n, _NEG)
+        Ev = np.full(n, _NEG)
+        Bv = NB.copy()
+        score = np.full(n, _NEG)
+        end_in_C = np.zeros(n, dtype=np.bool_)
+
+        # Candidates of a match state: from B, M, I and D.
+        cand = np.full((4, n, nodes), _NEG)
+        Mn = np.empty((n, nodes))
+        In = np.full((n, nodes), _NEG)
+        rows = np.arange(n)
+        for i in range(1, L + 1):
+            np.add(self._entry, Bv[:, None], out=cand[0])
+            np.add(Mv[:, :-1], MM, out=cand[1, :, 1:])
+            np.add(Iv[:, :-1], IM, out=cand[2, :, 1:])
+            np.add(Dv[:, :-1], DM, out=cand[3, :, 1:])
+            if ptrs is not None:
+                src = cand.argmax(0)
+                ptrs.M[i] = src
+                best = np.take_along_axis(cand, src[None], 0)[0]
+            else:
+                best = cand.max(0)
+            np.add(best, emission[X[:, i - 1]], out=Mn)
+
+            fromM = Mv[:, :-1] + MI
+            fromI = Iv[:, :-1] + II
+            np.maximum(fromM, fromI, out=In[:, :-1])
+            if ptrs is not None:
+                ptrs.I[i, :, :-1] = fromI > fromM
+
+            Nv = (0.0 if i == 1 else Nv) + NN
+            fromE = Ev + EJ
+            fromJ = Jv + JJ
+            Jv = np.maximum(fromE, fromJ)
+            if ptrs is not None:
+                ptrs.J[i] = fromJ > fromE
+            fromE = Ev + EC
+            fromC = Cv + CC
+            Cv = np.maximum(fromE, fromC)
+            if ptrs is not None:
+                ptrs.C[i] = fromC > fromE
+
+            Mv, Mn = Mn, Mv
+            Iv, In = In, Iv
+
+            Dv = self._delete_scan(Mv)
+            if ptrs is not None:
+                ptrs.D[i, :, 1:] = Dv[:, :-1] + DD > Mv[:, :-1] + MD
+
+            kM = Mv.argmax(1)
+            Ev = Mv[rows, kM]
+            if ptrs is not None:
+                ptrs.E[i] = kM
+            if nodes > 1:
+                kD = Dv[:, 1:].argmax(1) + 1
+                fromD = Dv[rows, kD]
+                use_D = fromD > Ev
+                Ev = np.where(use_D, fromD, Ev)
+                if ptrs is not None:
+                    ptrs.E[i] = np.where(use_D, nodes + kD, kM)
+
+            fromN = Nv + NB
+            fromE = Ev + EJB
+            fromJ = Jv + JB
+            Bv = np.maximum(np.maximum(fromN, fromE), fromJ)
+            if ptrs is not None:
+                ptrs.B[i] = np.where(Bv == fromN, 0, np.where(Bv == fromE, 1, 2))
+
+            ended = lengths == i
+            if np.any(ended):
+                fromE = Ev[ended] + ECT[ended]
+                fromC = Cv[ended] + CT[ended]
+                score[ended] = np.maximum(fromE, fromC)
+                end_in_C[ended] = fromC > fromE
+
+        results: List[Plan7Result] = []
+        for b in range(n):
+            steps = None
+            if ptrs is not None:
+                steps = _traceback(ptrs, b, int(lengths[b]), nodes, end_in_C[b])
+            results.append(Plan7Result(float(score[b]), steps))
+        return results
+
+    def _delete_scan(self, Mv: np.ndarray) -> np.ndarray:
+        """
+        Delete scores of a row from its match scores.
+        """
+        Dv = np.full(Mv.shape, _NEG)
+        if self._nodes < 2:
+            return Dv
+
+        fromM = Mv[:, :-1] + self._MD
+        shift = self._DD_cumsum
+        if shift is not None:
+            Dv[:, 1:] = np.maximum.accumulate(fromM - shift, axis=1) + shift
+            return Dv
+
+        for k in range(1, self._nodes):
+            Dv[:, k] = np.maximum(fromM[:, k - 1], Dv[:, k - 1] + self._DD[k - 1])
+        return Dv
+
+
+# Back pointers of a bucket, indexed by row, sequence and, for M, I and D,
+# node. M points to B, M, I or D; E to a match node, or to a delete node
+# offset by the number of nodes; B to N, E or J. The others tell whether the
+# state loops on itself.
+_Pointers = NamedTuple(
+    "_Pointers",
+    [
+        ("M", np.ndarray),
+        ("I", np.ndarray),
+        ("D", np.ndarray),
+        ("E", np.ndarray),
+        ("B", np.ndarray),
+        ("J", np.ndarray),
+        ("C", np.ndarray),
+    ],
+)
+
+
+def _traceback(
+    ptrs: _Pointers, b: int, L: int, nodes: int, end_in_C: bool
+) -> List[Tuple[int, int]]:
+    steps: List[Tuple[int, int]] = [(T, 0)]
+    state, k, i = (C if end_in_C else E), 0, L
+    while state != S:
+        steps.append((state, k))
+        if state == M:
+            src = ptrs.M[i, b, k]
+            i -= 1
+            state, k = [(B, 0), (M, k - 1), (I, k - 1), (D, k - 1)][src]
+        elif state == I:
+            state = I if ptrs.I[i, b, k] else M
+            i -= 1
+        elif state == D:
+            state, k = (D if ptrs.D[i, b, k] else M), k - 1
+        elif state == E:
+            node = int(ptrs.E[i, b])
+            state, k = (D, node - nodes) if node >= nodes else (M, node)
+        elif state == B:
+            state = S if i == 0 else [N, E, J][ptrs.B[i, b]]
+        elif state == N:
+            state = N if i > 1 else S
+            i -= 1
+        elif state == J:
+            state = J if ptrs.J[i, b] else E
+            i -= 1
+        elif state == C:
+            state = C if ptrs.C[i, b] else E
+            i -= 1
+    steps.append((S, 0))
+    steps.reverse()
+    return steps
+
+
+def plan7_windows(length: int, window_length: int) -> List[Tuple[int, int]]:
+    """
+    Windows of a sequence, as (start, stop) pairs.
+
+    Windows of `window_length` symbols start every `window_length // 2`
+    symbols, the last one reaching the end of the sequence, as the windows of
+    `imm`. Zero means a single window over the whole sequence.
+    """
+    if window_length <= 0 or window_length >= length:
+        return [(0, length)]
+
+    offset = max(window_length // 2, 1)
+    windows: List[Tuple[int, int]] = []
+    start = 0
+    while True:
+        stop = min(start + window_length, length)
+        windows.append((start, stop))
+        if stop == length:
+            break
+        start += offset
+    return windows
+
+
+def plan7_buckets(lengths: List[int], nodes: int) -> List[List[int]]:
+    """
+    Indices of sequences grouped into buckets of similar lengths.
+
+    Sequences are sorted by length, and a bucket is closed once its padded DP
+    matrix would exceed :data:`BATCH_CELLS` cells. A sequence too long for
+    any bucket gets one of its own.
+
+    Parameters
+    ----------
+    lengths
+        Sequence lengths.
+    nodes
+        Number of model nodes.
+    """
+    buckets: List[List[int]] = []
+    bucket: List[int] = []
+    for i in sorted(range(len(lengths)), key=lambda i: lengths[i]):
+        cells = (len(bucket) + 1) * (lengths[i] + 1) * nodes
+        if len(bucket) > 0 and cells > BATCH_CELLS:
+            buckets.append(bucket)
+            bucket = []
+        bucket.append(i)
+    if len(bucket) > 0:
+        buckets.append(bucket)
+    return buckets
@@ -1,12 +1,26 @@
-from typing import List, TypeVar
+from math import inf
+from typing import Iterator, List, Optional, Tuple, TypeVar
 
-from imm import Alphabet, Interval, MuteState, NormalState, Path, Sequence, SequenceABC
+import numpy as np
+from imm import (
+    Alphabet,
+    Interval,
+    MuteState,
+    NormalState,
+    Path,
+    Sequence,
+    SequenceABC,
+    State,
+    Step,
+)
 from nmm import DNAAlphabet, NTTranslator, NullTranslator, RNAAlphabet
 
 from iseq.hmmer_model import HMMERModel
-from iseq.model import EntryDistr, Node, Transitions
+from iseq.model import EntryDistr, Node, SpecialTransitions, Transitions
 from iseq.profile import Profile, ProfileID
+from iseq.result import WindowScore
 
+from ._plan7 import Plan7Viterbi, plan7_windows
 from .typing import (
     HMMER3AltModel,
     HMMER3Fragment,
@@ -25,8 +39,36 @@ __all__ = [
 
 TAlphabet = TypeVar("TAlphabet", bound=Alphabet)
 
+# Window of a sequence with its alt path, if any, and its alt and null Viterbi
+# scores.
+_WindowResult = Tuple[Interval, Optional[Path[HMMER3Step]], float, float]
+
 
 class HMMER3Profile(Profile[TAlphabet, NormalState]):
+    """
+    HMMER3 profile.
+
+    Parameters
+    ----------
+    profid
+        Profile name and accession.
+    alphabet
+        Alphabet.
+    null_log_odds
+        Emission log-odds of the insert and special states.
+    core_nodes
+        Match, insert and delete states of every node.
+    core_trans
+        Transitions of nodes 0 to M, as in a HMMER3 file.
+    entry_distr
+        Entry distribution.
+    hmmer3_compat
+        Enable full HMMER3 compatibility. Defaults to `False`.
+    plan7
+        Viterbi engine specialised for the Plan7 layout, used instead of the
+        generic `imm` engine. Defaults to `None`.
+    """
+
     def __init__(
         self,
         profid: ProfileID,
@@ -36,6 +78,7 @@ class HMMER3Profile(Profile[TAlphabet, NormalState]):
         core_trans: List[Transitions],
         entry_distr: EntryDistr,
         hmmer3_compat=False,
+        plan7: Optional[Plan7Viterbi] = None,
     ):
         R = NormalState.create(b"R", alphabet, null_log_odds)
         null_model = HMMER3NullModel.create(R)
@@ -60,6 +103,16 @@ class HMMER3Profile(Profile[TAlphabet, NormalState]):
         else:
             self._translator = NullTranslator()
 
+        self._plan7 = plan7
+        self._plan7_states: Optional[List[Tuple[State, int]]] = None
+
+    @property
+    def engine(self) -> str:
+        """
+        Viterbi engine: ``"imm"`` or ``"numpy"``.
+        """
+        return "imm" if self._plan7 is None else "numpy"
+
     @property
     def window_length(self) -> int:
         return super().window_length
@@ -77,46 +130,254 @@ class HMMER3Profile(Profile[TAlphabet, NormalState]):
         seq = self._translator.translate(sequence, self.alphabet)
         return Sequence.create(seq, self.alphabet)
 
-    def search(self, sequence: SequenceABC[TAlphabet]) -> HMMER3SearchResults:
+    def search(
+        self, sequence: SequenceABC[TAlphabet], min_score: Optional[float] = None
+    ) -> HMMER3SearchResults:
+        """
+        Search a sequence.
 
-        self._set_target_length_model(len(sequence))
+        Parameters
+        ----------
+        sequence
+            Target sequence.
+        min_score
+            Only build the path and fragments of windows whose log-odds score,
+            in nats, is at least this. Defaults to `None`, which builds every
+            window.
+        """
 
-        alt_results = self._alt_model.viterbi(sequence, self.window_length)
+        results = self._viterbi(sequence, min_score)
+        return self._search_results(sequence, results, min_score)
+
+    def search_batch(
+        self,
+        sequences: List[SequenceABC[TAlphabet]],
+        min_score: Optional[float] = None,
+    ) -> List[HMMER3SearchResults]:
+        """
+        Search several sequences.
+
+        With the Plan7 engine, the windows of every sequence are aligned
+        together, in buckets of similar lengths, which amortises the Python
+        overhead of each DP row over many short sequences. The results are the
+        same as those of :meth:`search`.
+
+        Parameters
+        ----------
+        sequences
+            Target sequences.
+        min_score
+            Only build the path and fragments of windows whose log-odds score,
+            in nats, is at least this. Defaults to `None`, which builds every
+            window.
+        """
+        plan7 = self._plan7
+        if plan7 is None:
+            return super().search_batch(sequences, min_score)
 
+        windows: List[Tuple[int, Interval, float]] = []
+        codes: List[np.ndarray] = []
+        special: List[SpecialTransitions] = []
+        for idx, sequence in enumerate(sequences):
+            t = self._special_transitions(len(sequence))
+            seq_codes = plan7.encode(bytes(sequence))
+            for start, stop in plan7_windows(len(seq_codes), self.window_length):
+                windows.append(
+                    (idx, Interval(start, stop), _null_score(stop - start, t))
+                )
+                codes.append(seq_codes[start:stop])
+                special.append(t)
+
+        results = plan7.viterbi_batch(codes, special, min_score is None)
+        if min_score is not None:
+            hits = [
+                i
+                for i, (result, window) in enumerate(zip(results, windows))
+                if result.score - window[2] >= min_score
+            ]
+            hit_results = plan7.viterbi_batch(
+                [codes[i] for i in hits], [special[i] for i in hits], True
+            )
+            for i, result in zip(hits, hit_results):
+                results[i] = result
+
+        items: List[List[_WindowResult]] = [[] for _ in sequences]
+        for (idx, window, viterbi_score0), result in zip(windows, results):
+            path = None
+            if result.steps is not None:
+                path = self._plan7_path(result.steps)
+            items[idx].append((window, path, result.score, viterbi_score0))
+
+        return [
+            self._search_results(seq, iter(seq_items), min_score)
+            for seq, seq_items in zip(sequences, items)
+        ]
+
+    def score(self, sequence: SequenceABC[TAlphabet]) -> List[WindowScore]:
+        """
+        Alt and null Viterbi scores of every window of a sequence.
+
+        Parameters
+        ----------
+        sequence
+            Target sequence.
+        """
+        scores: List[WindowScore] = []
+        results = self._viterbi(sequence, inf)
+        for window, _, viterbi_score1, viterbi_score0 in results:
+            score = viterbi_score1 - viterbi_score0
+            if self._hmmer3_compat:
+                viterbi_score1 -= 3
+            scores.append(WindowScore(window, score, viterbi_score1, viterbi_score0))
+        return scores
+
+    def _search_results(
+        self,
+        sequence: SequenceABC[TAlphabet],
+        results: Iterator[_WindowResult],
+        min_score: Optional[float],
+    ) -> HMMER3SearchResults:
         def create_fragment(
             seq: SequenceABC[TAlphabet], path: Path[HMMER3Step], homologous: bool
         ):
             return HMMER3Fragment(seq, path, homologous)
 
-        search_results = HMMER3SearchResults(sequence, create_fragment)
+        search_results = HMMER3SearchResults(sequence, create_fragment, self.evalue)
 
-        for alt_result in alt_results:
-            subseq = alt_result.sequence
-            viterbi_score0 = self._null_model.likelihood(subseq)
-            viterbi_score1 = alt_result.loglikelihood
+        for window, path, viterbi_score1, viterbi_score0 in results:
             score = viterbi_score1 - viterbi_score0
-            window = Interval(subseq.start, subseq.start + len(subseq))
             if self._hmmer3_compat:
                 viterbi_score1 -= 3
-            search_results.append(
-                score, window, alt_result.path, viterbi_score1, viterbi_score0
-            )
+            if path is None or min_score is not None and score < min_score:
+                search_results.append_score(
+                    score, window, viterbi_score1, viterbi_score0
+                )
+                continue
+            search_results.append(score, window, path, viterbi_score1, viterbi_score0)
 
         return search_results
 
+    def _viterbi(
+        self, sequence: SequenceABC[TAlphabet], min_score: Optional[float] = None
+    ) -> Iterator[_WindowResult]:
+        """
+        Windows of a sequence with their alt path and Viterbi scores.
+
+        The Plan7 engine only traces back the paths of windows whose log-odds
+        score is at least `min_score`.
+        """
+        self._set_target_length_model(len(sequence))
+
+        if self._plan7 is not None:
+            yield from self._plan7_viterbi(sequence, min_score)
+            return
+
+        alt_results = self._alt_model.viterbi(sequence, self.window_length)
+
+        for alt_result in alt_results:
+            subseq = alt_result.sequence
+            viterbi_score0 = self._null_model.likelihood(subseq)
+            window = Interval(subseq.start, subseq.start + len(subseq))
+            yield window, alt_result.path, alt_result.loglikelihood, viterbi_score0
+
+    def _plan7_viterbi(
+        self, sequence: SequenceABC[TAlphabet], min_score: Optional[float]
+    ) -> Iterator[_WindowResult]:
+        plan7 = self._plan7
+        assert plan7 is not None
+        special_trans = self._special_transitions(len(sequence))
+        plan7.set_special_transitions(special_trans)
+
+        codes = plan7.encode(bytes(sequence))
+        for start, stop in plan7_windows(len(codes), self.window_length):
+            viterbi_score0 = _null_score(stop - start, special_trans)
+            window_codes = codes[start:stop]
+
+            result = plan7.viterbi(window_codes, min_score is None)
+            if result.steps is None:
+                assert min_score is not None
+                if result.score - viterbi_score0 < min_score:
+                    yield Interval(start, stop), None, result.score, viterbi_score0
+                    continue
+                result = plan7.viterbi(window_codes)
+
+            path = self._plan7_path(result.steps)
+            yield Interval(start, stop), path, result.score, viterbi_score0
+
+    def _plan7_path(self, steps: List[Tuple[int, int]]) -> Path[HMMER3Step]:
+        """
+        Path of `imm` steps from the steps of a Plan7 result.
+        """
+        if self._plan7_states is None:
+            sn = self._alt_model.special_node
+            self._plan7_states = [
+                (sn.S, 0),
+                (sn.N, 1),
+                (sn.B, 0),
+                (sn.E, 0),
+                (sn.J, 1),
+                (sn.C, 1),
+                (sn.T, 0),
+            ]
+        special = self._plan7_states
+        nodes = self._alt_model.core_nodes()
+
+        imm_steps: List[HMMER3Step] = []
+        for kind, k in steps:
+            if kind < len(special):
+                state, seq_len = special[kind]
+            else:
+                # Kinds M, I and D follow the special ones.
+                node = nodes[k]
+                core = ((node.M, 1), (node.I, 1), (node.D, 0))
+                state, seq_len = core[kind - len(special)]
+            imm_steps.append(Step.create(state, seq_len))
+        return Path.create(imm_steps)
+
+
+def _null_score(length: int, special_trans: SpecialTransitions) -> float:
+    """
+    Null Viterbi score of a window, whose R state emits with zero log-odds.
+    """
+    return (length - 1) * special_trans.RR
+
 
 def create_profile(
     hmm: HMMERModel,
     hmmer3_compat: bool = False,
     entry_distr: EntryDistr = EntryDistr.OCCUPANCY,
     window_length: int = 0,
+    engine: str = "imm",
 ) -> HMMER3Profile:
+    """
+    Create a HMMER3 profile.
+
+    Parameters
+    ----------
+    hmm
+        HMMER model.
+    hmmer3_compat
+        Enable full HMMER3 compatibility. Defaults to `False`.
+    entry_distr
+        Entry distribution. Defaults to occupancy.
+    window_length
+        Window length. Defaults to zero, which means no window.
+    engine
+        Viterbi engine: ``"imm"``, the generic state-graph engine, or
+        ``"numpy"``, the engine specialised for the Plan7 layout. Both give
+        the same scores. Defaults to ``"imm"``.
+    """
+    if engine not in ("imm", "numpy"):
+        raise ValueError(f"Unknown engine {engine}.")
+
     null_lprobs = hmm.null_lprobs
     null_log_odds = [0.0] * len(null_lprobs)
 
     nodes: List[HMMER3Node] = []
+    match_lodds: List[List[float]] = []
     for m in range(1, hmm.model_length + 1):
         lodds = [v0 - v1 for v0, v1 in zip(hmm.match_lprobs(m), null_lprobs)]
+        match_lodds.append(lodds)
         M = NormalState.create(f"M{m}".encode(), hmm.alphabet, lodds)
         I = NormalState.create(f"I{m}".encode(), hmm.alphabet, null_log_odds)
         D = MuteState.create(f"D{m}".encode(), hmm.alphabet)
@@ -125,6 +386,13 @@ def create_profile(
 
     trans = hmm.transitions
 
+    plan7: Optional[Plan7Viterbi] = None
+    if engine == "numpy":
+        lodds_table = np.array(match_lodds, dtype=float)
+        plan7 = Plan7Viterbi(
+            hmm.alphabet, lodds_table, trans, entry_distr, hmmer3_compat
+        )
+
     profid = ProfileID(hmm.model_id.name, hmm.model_id.acc)
     prof = HMMER3Profile(
         profid,
@@ -134,6 +402,7 @@ def create_profile(
         trans,
         entry_distr,
         hmmer3_compat,
+        plan7,
     )
     prof.window_length = window_length
     return prof
@@ -0,0 +1,226 @@
+import json
+import os
+from pathlib import Path
+from typing import IO, Dict, Iterator, List, Union
+
+import hmmer_reader
+import numpy as np
+
+from .hmmer_index import HMMERBlock, index_hmmer
+from .hmmer_model import TRANSITIONS, HMMERModel, ModelID, ScoreStats
+
+__all__ = ["HMMERCache", "cache_filepath", "iter_hmmer_models", "open_hmmer_cache"]
+
+_VERSION = 1
+_STATS_KINDS = ["MSV", "VITERBI", "FORWARD"]
+
+
+class HMMERCache:
+    """
+    Array-backed models of a HMMER3 file, memory-mapped from its sidecar cache.
+
+    The sidecar file is a sequence of NumPy ``.npy`` records: a JSON header
+    followed by the match, insert, and transition arrays of every model laid
+    end to end. Models are served as views into the mapped arrays, so opening
+    the cache costs nothing and processes mapping the same file share its pages.
+
+    Parameters
+    ----------
+    filepath
+        Sidecar cache file, as created by :func:`open_hmmer_cache`.
+    """
+
+    def __init__(self, filepath: Union[str, Path]):
+        with open(filepath, "rb") as file:
+            header = _read_record(file, filepath)
+            meta = json.loads(bytes(header).decode())
+            if meta["version"] != _VERSION:
+                raise ValueError(f"Unsupported cache version {meta['version']}.")
+            self._match = _read_record(file, filepath)
+            self._insert = _read_record(file, filepath)
+            self._trans = _read_record(file, filepath)
+
+        self._meta = meta
+        self._models: List[dict] = meta["models"]
+
+        self._match_offsets = [0]
+        self._trans_offsets = [0]
+        for m in self._models:
+            size = m["M"] * len(m["symbols"])
+            self._match_offsets.append(self._match_offsets[-1] + size)
+            size = (m["M"] + 1) * len(TRANSITIONS)
+            self._trans_offsets.append(self._trans_offsets[-1] + size)
+
+    @property
+    def source_size(self) -> int:
+        return self._meta["source_size"]
+
+    @property
+    def source_mtime_ns(self) -> int:
+        return self._meta["source_mtime_ns"]
+
+    @property
+    def blocks(self) -> List[HMMERBlock]:
+        """
+        Location of the models in the HMMER3 file.
+        """
+        return [HMMERBlock(*m["block"]) for m in self._models]
+
+    def __len__(self) -> int:
+        return len(self._models)
+
+    def __getitem__(self, idx: int) -> HMMERModel:
+        m = self._models[idx]
+        M = m["M"]
+        K = len(m["symbols"])
+        i0, i1 = self._match_offsets[idx], self._match_offsets[idx + 1]
+        t0, t1 = self._trans_offsets[idx], self._trans_offsets[idx + 1]
+
+        local_stats: Dict[str, ScoreStats] = {}
+        for kind, stats in m["stats"].items():
+            local_stats[kind] = ScoreStats(*stats)
+
+        return HMMERModel.create(
+            m["symbols"],
+            self._match[i0:i1].reshape(M, K),
+            self._insert[i0:i1].reshape(M, K),
+            self._trans[t0:t1].reshape(M + 1, len(TRANSITIONS)),
+            ModelID(m["name"], m["acc"]),
+            local_stats,
+            m["ga"],
+        )
+
+    def __iter__(self) -> Iterator[HMMERModel]:
+        for idx in range(len(self)):
+            yield self[idx]
+
+
+def cache_filepath(filepath: Union[str, Path]) -> Path:
+    """
+    Sidecar cache file of a HMMER3 file.
+    """
+    return Path(str(filepath) + ".arrays")
+
+
+def open_hmmer_cache(filepath: Union[str, Path]) -> HMMERCache:
+    """
+    Open the sidecar cache of a HMMER3 file.
+
+    The cache is built, by parsing the HMMER3 file once, if it does not exist or
+    if the HMMER3 file has changed since it was built.
+
+    Parameters
+    ----------
+    filepath
+        HMMER3 ASCII file.
+    """
+    cachepath = cache_filepath(filepath)
+    stat = os.stat(filepath)
+
+    if cachepath.exists():
+        try:
+            cache = HMMERCache(cachepath)
+        except (ValueError, KeyError, EOFError):
+            pass
+        else:
+            if (
+                cache.source_size == stat.st_size
+                and cache.source_mtime_ns == stat.st_mtime_ns
+            ):
+                return cache
+            del cache
+
+    _write_cache(filepath, cachepath, stat.st_size, stat.st_mtime_ns)
+    return HMMERCache(cachepath)
+
+
+def iter_hmmer_models(
+    filepath: Union[str, Path], use_cache: bool = False
+) -> Iterator[HMMERModel]:
+    """
+    Iterate over the models of a HMMER3 file.
+
+    Parameters
+    ----------
+    filepath
+        HMMER3 ASCII file.
+    use_cache
+        Read models from the sidecar cache, building it if needed, instead of
+        parsing the text file. Defaults to `False`.
+    """
+    if use_cache:
+        yield from open_hmmer_cache(filepath)
+        return
+
+    with hmmer_reader.open_hmmer(filepath) as reader:
+        for plain_model in reader:
+            yield HMMERModel(plain_model)
+
+
+def _write_cache(filepath: Union[str, Path], cachepath: Path, size: int, mtime_ns: int):
+    blocks = index_hmmer(filepath)
+
+    models: List[dict] = []
+    match: List[np.ndarray] = []
+    insert: List[np.ndarray] = []
+    trans: List[np.ndarray] = []
+    with hmmer_reader.open_hmmer(filepath) as reader:
+        for block, plain_model in zip(blocks, reader):
+            hmm = HMMERModel(plain_model)
+            symbols = hmm.alphabet.symbols.decode()
+            stats: Dict[str, List[float]] = {}
+            for kind in _STATS_KINDS:
+                s = hmm.local_stats(kind)
+                if s is not None:
+                    stats[kind] = list(s)
+            models.append(
+                {
+                    "name": hmm.model_id.name,
+                    "acc": hmm.model_id.acc,
+                    "symbols": symbols,
+                    "M": hmm.model_length,
+                    "ga": hmm.gathering_cutoff,
+                    "stats": stats,
+                    "block": list(block),
+                }
+            )
+            match.append(hmm.match_table.ravel())
+            insert.append(hmm.insert_table.ravel())
+            trans.append(hmm.transition_table.ravel())
+
+    meta = {
+        "version": _VERSION,
+        "source_size": size,
+        "source_mtime_ns": mtime_ns,
+        "models": models,
+    }
+    header = np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8)
+
+    tmppath = cachepath.with_name(cachepath.name + f".{os.getpid()}.tmp")
+    with open(tmppath, "wb") as file:
+        np.lib.format.write_array(file, header)
+        np.lib.format.write_array(file, _concat(match))
+        np.lib.format.write_array(file, _concat(insert))
+        np.lib.format.write_array(file, _concat(trans))
+    os.replace(tmppath, cachepath)
+
+
+def _concat(arrays: List[np.ndarray]) -> np.ndarray:
+    if len(arrays) == 0:
+        return np.zeros(0)
+    return np.ascontiguousarray(np.concatenate(arrays), dtype=float)
+
+
+def _read_record(file: IO[bytes], filepath: Union[str, Path]) -> np.ndarray:
+    version = np.lib.format.read_magic(file)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(file)
+    else:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(file)
+    offset = file.tell()
+    size = int(np.prod(shape)) * dtype.itemsize
+    file.seek(offset + size)
+    if size == 0:
+        return np.zeros(shape, dtype=dtype)
+    order = "F" if fortran_order else "C"
+    return np.memmap(filepath, dtype, "r", offset, shape, order)
@@ -0,0 +1,76 @@
+from io import StringIO
+from pathlib import Path
+from typing import List, NamedTuple, Union
+
+import hmmer_reader
+
+__all__ = ["HMMERBlock", "index_hmmer", "read_hmmer_block"]
+
+HMMERBlock = NamedTuple(
+    "HMMERBlock",
+    [
+        ("offset", int),
+        ("size", int),
+        ("name", str),
+        ("acc", str),
+        ("model_length", int),
+    ],
+)
+
+
+def index_hmmer(filepath: Union[str, Path]) -> List[HMMERBlock]:
+    """
+    Locate the text block of every model in a HMMER3 ASCII file.
+
+    The file is read once without parsing the emission and transition tables,
+    which makes it cheap to find and later load a single model.
+
+    Parameters
+    ----------
+    filepath
+        HMMER3 ASCII file.
+    """
+    blocks: List[HMMERBlock] = []
+
+    offset = 0
+    start = 0
+    name = acc = "-"
+    model_length = 0
+    with open(filepath, "rb") as file:
+        for line in file:
+            if line.startswith(b"HMMER3"):
+                start = offset
+                name = acc = "-"
+                model_length = 0
+            elif line.startswith(b"NAME "):
+                name = line[5:].strip().decode()
+            elif line.startswith(b"ACC "):
+                acc = line[4:].strip().decode()
+            elif line.startswith(b"LENG "):
+                model_length = int(line[5:].strip())
+            elif line.startswith(b"//"):
+                size = offset + len(line) - start
+                blocks.append(HMMERBlock(start, size, name, acc, model_length))
+            offset += len(line)
+
+    return blocks
+
+
+def read_hmmer_block(
+    filepath: Union[str, Path], block: HMMERBlock
+) -> hmmer_reader.HMMERModel:
+    """
+    Parse the model stored in a given block.
+
+    Parameters
+    ----------
+    filepath
+        HMMER3 ASCII file.
+    block
+        Model location, as returned by :func:`index_hmmer`.
+    """
+    with open(filepath, "rb") as file:
+        file.seek(block.offset)
+        text = file.read(block.size).decode()
+
+    return hmmer_reader.open_hmmer(StringIO(text)).read_model()
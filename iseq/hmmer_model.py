@@ -1,7 +1,10 @@
+from __future__ import annotations
+
 from math import log
-from typing import List, Mapping, NamedTuple
+from typing import Dict, List, NamedTuple, Optional, Type
 
 import hmmer_reader
+import numpy as np
 from imm import lprob_zero
 from nmm import IUPACAminoAlphabet
 
@@ -9,15 +12,22 @@ from .alphabet import infer_alphabet
 from .model import Transitions
 from .typing import HMMERAlphabet
 
-__all__ = ["HMMERModel", "ModelID"]
+__all__ = ["HMMERModel", "ModelID", "ScoreStats", "TRANSITIONS"]
+
+TRANSITIONS = ["MM", "MI", "MD", "IM", "II", "DM", "DD"]
 
 ModelID = NamedTuple("ModelID", [("name", str), ("acc", str)])
+ScoreStats = NamedTuple("ScoreStats", [("mu", float), ("lambda_", float)])
 
 
 class HMMERModel:
     """
     HMMER model.
 
+    Emissions and transitions are held in NumPy arrays: an M×K array for match
+    and insert emissions, with K symbols in alphabet order, and an (M+1)×7
+    array for transitions, in `TRANSITIONS` order.
+
     Parameters
     ----------
     hmmer_model
@@ -25,34 +35,129 @@ class HMMERModel:
     """
 
     def __init__(self, hmmer_model: hmmer_reader.HMMERModel):
-        self._original_symbols: str = hmmer_model.alphabet
-        alphabet = infer_alphabet(self._original_symbols.encode())
+        symbols: str = hmmer_model.alphabet
+        M = hmmer_model.M
+        K = len(symbols)
+
+        match = [v for i in range(1, M + 1) for v in hmmer_model.match(i).values()]
+        insert = [v for i in range(1, M + 1) for v in hmmer_model.insert(i).values()]
+        trans = [v for m in range(0, M + 1) for v in hmmer_model.trans(m).values()]
+
+        mt = dict(hmmer_model.metadata)
+        model_id = ModelID(mt.get("NAME", "-"), mt.get("ACC", "-"))
+
+        local_stats: Dict[str, ScoreStats] = {}
+        for key, value in hmmer_model.metadata:
+            if key != "STATS":
+                continue
+            fields = value.split()
+            if len(fields) == 4 and fields[0] == "LOCAL":
+                stats = ScoreStats(float(fields[2]), float(fields[3]))
+                local_stats[fields[1]] = stats
+
+        gathering_cutoff: Optional[float] = None
+        if "GA" in mt:
+            gathering_cutoff = float(mt["GA"].split()[0].rstrip(";"))
+
+        self._setup(
+            symbols,
+            np.array(match, dtype=float).reshape(M, K),
+            np.array(insert, dtype=float).reshape(M, K),
+            np.array(trans, dtype=float).reshape(M + 1, len(TRANSITIONS)),
+            model_id,
+            local_stats,
+            gathering_cutoff,
+        )
+
+    @classmethod
+    def create(
+        cls: Type[HMMERModel],
+        symbols: str,
+        match: np.ndarray,
+        insert: np.ndarray,
+        trans: np.ndarray,
+        model_id: ModelID,
+        local_stats: Dict[str, ScoreStats],
+        gathering_cutoff: Optional[float],
+    ) -> HMMERModel:
+        """
+        Create a model from arrays laid out as in the HMMER3 file.
+
+        Parameters
+        ----------
+        symbols
+            Alphabet symbols in the order of the HMMER3 file columns.
+        match
+            M×K match emissions, in `symbols` order.
+        insert
+            M×K insert emissions, in `symbols` order.
+        trans
+            (M+1)×7 transitions, in `TRANSITIONS` order.
+        model_id
+            Model name and accession.
+        local_stats
+            Score distribution parameters by score kind.
+        gathering_cutoff
+            Sequence gathering cutoff, if any.
+        """
+        hmm = cls.__new__(cls)
+        hmm._setup(
+            symbols, match, insert, trans, model_id, local_stats, gathering_cutoff
+        )
+        return hmm
+
+    def _setup(
+        self,
+        symbols: str,
+        match: np.ndarray,
+        insert: np.ndarray,
+        trans: np.ndarray,
+        model_id: ModelID,
+        local_stats: Dict[str, ScoreStats],
+        gathering_cutoff: Optional[float],
+    ):
+        self._original_symbols = symbols
+        alphabet = infer_alphabet(symbols.encode())
 
         if alphabet is None:
             raise ValueError("Could not infer alphabet from HMMER model.")
         self._alphabet = alphabet
 
         if isinstance(self._alphabet, IUPACAminoAlphabet):
-            self._null_lprobs = _null_amino_lprobs(self._original_symbols)
+            self._null_lprobs = _null_amino_lprobs(symbols)
         else:
             k = alphabet.length
             self._null_lprobs = [log(1 / k)] * k
 
-        self._match_lprobs = [
-            self._sort(hmmer_model.match(i)) for i in range(1, hmmer_model.M + 1)
-        ]
-        self._insert_lprobs = [
-            self._sort(hmmer_model.insert(i)) for i in range(1, hmmer_model.M + 1)
-        ]
-        self._model_length = hmmer_model.M
+        # Columns of the file in alphabet order; missing symbols get a zero
+        # probability.
+        cols = [symbols.find(chr(c)) for c in alphabet.symbols]
+        self._match = _sort_columns(match, cols)
+        self._insert = _sort_columns(insert, cols)
+        self._trans = trans
+        self._model_length = match.shape[0]
+
+        self._model_id = model_id
+        self._local_stats = local_stats
+        self._gathering_cutoff = gathering_cutoff
+
+    def local_stats(self, kind: str) -> Optional[ScoreStats]:
+        """
+        Score distribution parameters from a `STATS LOCAL` line.
+
+        Parameters
+        ----------
+        kind
+            Score kind: ``"MSV"``, ``"VITERBI"``, or ``"FORWARD"``.
+        """
+        return self._local_stats.get(kind, None)
 
-        self._transitions: List[Transitions] = []
-        for m in range(0, hmmer_model.M + 1):
-            t = Transitions(**hmmer_model.trans(m))
-            self._transitions.append(t)
-
-        mt = dict(hmmer_model.metadata)
-        self._model_id = ModelID(mt.get("NAME", "-"), mt.get("ACC", "-"))
+    @property
+    def gathering_cutoff(self) -> Optional[float]:
+        """
+        Sequence gathering cutoff (GA), in bits.
+        """
+        return self._gathering_cutoff
 
     @property
     def model_id(self) -> ModelID:
@@ -60,7 +165,7 @@ class HMMERModel:
 
     @property
     def transitions(self) -> List[Transitions]:
-        return self._transitions
+        return [Transitions(*row) for row in self._trans.tolist()]
 
     @property
     def model_length(self) -> int:
@@ -74,15 +179,40 @@ class HMMERModel:
     def null_lprobs(self) -> List[float]:
         return self._null_lprobs
 
+    @property
+    def match_table(self) -> np.ndarray:
+        """
+        M×K match emissions in alphabet order.
+        """
+        return self._match
+
+    @property
+    def insert_table(self) -> np.ndarray:
+        """
+        M×K insert emissions in alphabet order.
+        """
+        return self._insert
+
+    @property
+    def transition_table(self) -> np.ndarray:
+        """
+        (M+1)×7 transitions in `TRANSITIONS` order.
+        """
+        return self._trans
+
     def match_lprobs(self, m: int) -> List[float]:
-        return self._match_lprobs[m - 1]
+        return self._match[m - 1].tolist()
 
     def insert_lprobs(self, m: int) -> List[float]:
-        return self._insert_lprobs[m - 1]
+        return self._insert[m - 1].tolist()
+
 
-    def _sort(self, lprobs: Mapping[str, float]) -> List[float]:
-        symbols = self._alphabet.symbols.decode()
-        return [lprobs.get(sym, lprob_zero()) for sym in symbols]
+def _sort_columns(table: np.ndarray, cols: List[int]) -> np.ndarray:
+    sorted_table = np.full((table.shape[0], len(cols)), lprob_zero())
+    for i, j in enumerate(cols):
+        if j >= 0:
+            sorted_table[:, i] = table[:, j]
+    return sorted_table
 
 
 def _null_amino_lprobs(symbols: str):
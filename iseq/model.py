@@ -30,6 +30,7 @@ __all__ = [
     "SpecialNode",
     "SpecialTransitions",
     "Transitions",
+    "entry_costs",
 ]
 
 
@@ -155,6 +156,7 @@ class NullModel(Generic[TState]):
     def __init__(self, hmm: HMM, state: TState):
         self._hmm = hmm
         self._state = state
+        self._lprob: Optional[float] = None
 
     @classmethod
     def create(cls: Type[NullModel], state: TState) -> NullModel:
@@ -179,6 +181,7 @@ class NullModel(Generic[TState]):
 
     def set_transition(self, lprob: float):
         self._hmm.set_transition(self.state, self.state, lprob)
+        self._lprob = lprob
 
     def likelihood(self, sequence: Sequence):
         steps = [Step.create(self.state, 1) for i in range(len(sequence))]
@@ -186,7 +189,8 @@ class NullModel(Generic[TState]):
         return self._hmm.likelihood(sequence, path)
 
     def set_special_transitions(self, special_trans: SpecialTransitions):
-        self.set_transition(special_trans.RR)
+        if self._lprob != special_trans.RR:
+            self.set_transition(special_trans.RR)
 
     def __str__(self):
         return f"{self._hmm}"
@@ -206,6 +210,8 @@ class AltModel(Generic[TState]):
         self._states: Dict[CData, MutableState[TState]] = states
         self._hmm = hmm
         self._dp: Optional[DP[TState]] = dp
+        self._special_state_pairs: Optional[List[Tuple[State, State]]] = None
+        self._special_lprobs: Optional[List[float]] = None
 
     @classmethod
     def create(
@@ -399,14 +405,7 @@ class AltModel(Generic[TState]):
     def set_entry_transitions(
         self, entry_distr: EntryDistr, core_trans: List[Transitions]
     ):
-        if entry_distr == EntryDistr.UNIFORM:
-            M = self.core_length
-            costs = [log(2.0 / (M * (M + 1)))] * M
-
-        elif entry_distr == EntryDistr.OCCUPANCY:
-            log_occ, logZ = _calculate_occupancy(core_trans)
-            costs = [locc - logZ for locc in log_occ]
-
+        costs = entry_costs(entry_distr, core_trans)
         B = self.special_node.B
         for cost, node in zip(costs, self.core_nodes()):
             self.set_transition(B, node.M, cost)
@@ -423,66 +422,54 @@ class AltModel(Generic[TState]):
     def set_special_transitions(
         self, special_trans: SpecialTransitions, hmmer3_compat=False
     ):
-        t = special_trans
-        node = self.special_node
-        if self._dp is not None:
-            if hmmer3_compat:
-                t.NN = 0.0
-                t.CC = 0.0
-                t.JJ = 0.0
+        """
+        Set the transitions of the special states.
 
-            def dp_set(a, b, lprob):
+        The transitions are applied as a batch over a fixed list of state
+        pairs. Only those that differ from the previously applied values are
+        changed, which makes repeated calls for the same target length free.
+        """
+        lprobs = _special_lprobs(special_trans, hmmer3_compat)
+        pairs = self._special_pairs()
+        applied = self._special_lprobs
+
+        if self._dp is not None:
+            dp_ptr = self._dp.imm_dp
+            hmm_ptr = self._hmm.imm_hmm
+            for k, (a, b) in enumerate(pairs):
+                if applied is not None and applied[k] == lprobs[k]:
+                    continue
                 imm.lib.imm_dp_change_trans(
-                    self._dp.imm_dp,
-                    self._hmm.imm_hmm,
-                    a.imm_state,
-                    b.imm_state,
-                    lprob,
+                    dp_ptr, hmm_ptr, a.imm_state, b.imm_state, lprobs[k]
                 )
-
-            dp_set(node.S, node.B, t.NB)
-            dp_set(node.S, node.N, t.NN)
-            dp_set(node.N, node.N, t.NN)
-            dp_set(node.N, node.B, t.NB)
-
-            dp_set(node.E, node.T, t.EC + t.CT)
-            dp_set(node.E, node.C, t.EC + t.CC)
-            dp_set(node.C, node.C, t.CC)
-            dp_set(node.C, node.T, t.CT)
-
-            dp_set(node.E, node.B, t.EJ + t.JB)
-            dp_set(node.E, node.J, t.EJ + t.JJ)
-            dp_set(node.J, node.J, t.JJ)
-            dp_set(node.J, node.B, t.JB)
-
-            dp_set(node.B, self._core_nodes[1].D, lprob_zero())
-            dp_set(node.B, self._core_nodes[0].I, lprob_zero())
         else:
             self._dp = None
-
-            if hmmer3_compat:
-                t.NN = 0.0
-                t.CC = 0.0
-                t.JJ = 0.0
-
-            self.set_transition(node.S, node.B, t.NB)
-            self.set_transition(node.S, node.N, t.NN)
-            self.set_transition(node.N, node.N, t.NN)
-            self.set_transition(node.N, node.B, t.NB)
-
-            self.set_transition(node.E, node.T, t.EC + t.CT)
-            self.set_transition(node.E, node.C, t.EC + t.CC)
-            self.set_transition(node.C, node.C, t.CC)
-            self.set_transition(node.C, node.T, t.CT)
-
-            self.set_transition(node.E, node.B, t.EJ + t.JB)
-            self.set_transition(node.E, node.J, t.EJ + t.JJ)
-            self.set_transition(node.J, node.J, t.JJ)
-            self.set_transition(node.J, node.B, t.JB)
-
             # TODO: if fails for HMM having one core state
-            self.set_transition(node.B, self._core_nodes[1].D, lprob_zero())
-            self.set_transition(node.B, self._core_nodes[0].I, lprob_zero())
+            for (a, b), lprob in zip(pairs, lprobs):
+                self.set_transition(a, b, lprob)
+
+        self._special_lprobs = lprobs
+
+    def _special_pairs(self) -> List[Tuple[State, State]]:
+        if self._special_state_pairs is None:
+            node = self.special_node
+            self._special_state_pairs = [
+                (node.S, node.B),
+                (node.S, node.N),
+                (node.N, node.N),
+                (node.N, node.B),
+                (node.E, node.T),
+                (node.E, node.C),
+                (node.C, node.C),
+                (node.C, node.T),
+                (node.E, node.B),
+                (node.E, node.J),
+                (node.J, node.J),
+                (node.J, node.B),
+                (node.B, self._core_nodes[1].D),
+                (node.B, self._core_nodes[0].I),
+            ]
+        return self._special_state_pairs
 
     def __str__(self):
         msg = f"{self._hmm}\n"
@@ -490,6 +477,50 @@ class AltModel(Generic[TState]):
         return msg
 
 
+def entry_costs(entry_distr: EntryDistr, core_trans: List[Transitions]) -> List[float]:
+    """
+    Log-probabilities of the B -> M transitions of a profile.
+
+    Parameters
+    ----------
+    entry_distr
+        Entry distribution.
+    core_trans
+        Transitions of nodes 0 to M, as in a HMMER3 file.
+    """
+    if entry_distr == EntryDistr.UNIFORM:
+        M = len(core_trans) - 1
+        return [log(2.0 / (M * (M + 1)))] * M
+
+    log_occ, logZ = _calculate_occupancy(core_trans)
+    return [locc - logZ for locc in log_occ]
+
+
+def _special_lprobs(t: SpecialTransitions, hmmer3_compat: bool) -> List[float]:
+    """
+    Special transitions in the order of `AltModel._special_pairs`.
+    """
+    NN = CC = JJ = 0.0
+    if not hmmer3_compat:
+        NN, CC, JJ = t.NN, t.CC, t.JJ
+    return [
+        t.NB,
+        NN,
+        NN,
+        t.NB,
+        t.EC + t.CT,
+        t.EC + CC,
+        CC,
+        t.CT,
+        t.EJ + t.JB,
+        t.EJ + JJ,
+        JJ,
+        t.JB,
+        lprob_zero(),
+        lprob_zero(),
+    ]
+
+
 def _calculate_occupancy(core_trans: List[Transitions]) -> Tuple[List[float], float]:
     log_occ = [lprob_add(core_trans[0].MI, core_trans[0].MM)]
     for trans in core_trans[1:-1]:
@@ -0,0 +1,222 @@
+from dataclasses import dataclass
+from math import log, log2
+from typing import List, Optional, Tuple
+
+import numpy as np
+from imm import Interval
+
+from .codon_table import translation_table
+from .gencode import GeneticCode
+from .hmmer_model import HMMERModel
+
+__all__ = ["Prefilter", "PrefilterStats"]
+
+_BASE_CODES = np.full(256, 4, dtype=np.intp)
+for _i, _bases in enumerate([b"Aa", b"Cc", b"Gg", b"TtUu"]):
+    for _b in _bases:
+        _BASE_CODES[_b] = _i
+
+
+@dataclass
+class PrefilterStats:
+    """
+    Prefilter counters.
+
+    Attributes
+    ----------
+    pairs
+        Number of (profile, target) pairs screened.
+    skipped
+        Number of pairs for which no region was found.
+    bases
+        Number of target bases screened.
+    searched_bases
+        Number of target bases left for the frame-aware search.
+    """
+
+    pairs: int = 0
+    skipped: int = 0
+    bases: int = 0
+    searched_bases: int = 0
+
+    def update(self, length: int, regions: List[Interval]):
+        self.pairs += 1
+        self.bases += length
+        if len(regions) == 0:
+            self.skipped += 1
+        self.searched_bases += sum(r.stop - r.start for r in regions)
+
+    def __iadd__(self, other: "PrefilterStats") -> "PrefilterStats":
+        self.pairs += other.pairs
+        self.skipped += other.skipped
+        self.bases += other.bases
+        self.searched_bases += other.searched_bases
+        return self
+
+    def __str__(self) -> str:
+        msg = f"Prefilter skipped {self.skipped} of {self.pairs} profile/target pairs"
+        return msg + f" ({self.searched_bases} of {self.bases} bases searched)."
+
+
+class Prefilter:
+    """
+    Ungapped, protein-level screen of a target against a profile.
+
+    The target is translated in its three forward frames and each translation
+    is compared to the profile match emissions along every diagonal, like
+    HMMER's MSV filter does but without gaps between segments. A diagonal
+    passes when its best local score, in bits, is above `threshold` plus
+    log2(model length × translated length), which makes the threshold roughly
+    independent of the target size: expect noise pairs to pass at a rate in
+    the order of 0.1 × 2^-threshold.
+
+    Parameters
+    ----------
+    hmm
+        Protein HMMER model.
+    threshold
+        Sensitivity threshold, in bits. Lower values let more pairs through.
+        Defaults to 2.0.
+    gencode
+        NCBI genetic code. Defaults to `GeneticCode("Standard")`.
+    """
+
+    def __init__(
+        self,
+        hmm: HMMERModel,
+        threshold: float = 2.0,
+        gencode: Optional[GeneticCode] = None,
+    ):
+        symbols = hmm.alphabet.symbols.decode()
+        nsymbols = len(symbols)
+        unknown = nsymbols
+        stop = nsymbols + 1
+
+        if gencode is None:
+            gencode = GeneticCode("Standard")
+        table = translation_table(gencode)
+
+        self._codons = np.full(125, unknown, dtype=np.intp)
+        for triplet, aa in table.forward_table.items():
+            if aa in symbols:
+                self._codons[_codon_index(triplet.encode())] = symbols.index(aa)
+        for triplet in table.stop_codons:
+            self._codons[_codon_index(triplet.encode())] = stop
+
+        M = hmm.model_length
+        match = hmm.match_table
+        null = np.array(hmm.null_lprobs)
+        self._scores = np.zeros((M, nsymbols + 2))
+        with np.errstate(invalid="ignore"):
+            self._scores[:, :nsymbols] = (match - null) / log(2)
+        self._scores[np.isnan(self._scores)] = -np.inf
+        self._scores[:, stop] = -np.inf
+        self._stop = stop
+
+        self._threshold = threshold
+        self._block_size = max(1 << 16, 2 * M)
+
+    @property
+    def threshold(self) -> float:
+        return self._threshold
+
+    def regions(self, sequence: bytes) -> List[Interval]:
+        """
+        Target regions that deserve a frame-aware search.
+
+        Each diagonal that passes the threshold yields the nucleotide interval
+        of its best segment extended by one model length worth of codons on
+        both sides, so that a full alignment fits in it. Overlapping intervals
+        are merged.
+
+        Parameters
+        ----------
+        sequence
+            Nucleotide sequence.
+        """
+        M = self._scores.shape[0]
+        codes = _BASE_CODES[np.frombuffer(sequence, dtype=np.uint8)]
+
+        frames: List[np.ndarray] = []
+        for f in range(3):
+            n = (len(codes) - f) // 3
+            if n <= 0:
+                frames.append(np.zeros(0, dtype=np.intp))
+                continue
+            c = codes[f : f + 3 * n].reshape(n, 3)
+            frames.append(self._codons[c[:, 0] * 25 + c[:, 1] * 5 + c[:, 2]])
+
+        size = sum(len(x) for x in frames)
+        if size == 0:
+            return []
+        threshold = self._threshold + log2(M * size)
+
+        margin = 3 * M
+        intervals: List[Tuple[int, int]] = []
+        for f, x in enumerate(frames):
+            for start, stop in self._diagonals(x, threshold):
+                start = max(f + 3 * start - margin, 0)
+                stop = min(f + 3 * stop + margin, len(sequence))
+                intervals.append((start, stop))
+
+        return [Interval(start, stop) for start, stop in _merge(intervals)]
+
+    def _diagonals(self, x: np.ndarray, threshold: float) -> List[Tuple[int, int]]:
+        # A diagonal spans at most M residues, so blocks that overlap by M
+        # residues see every diagonal in full.
+        M = self._scores.shape[0]
+        segments: List[Tuple[int, int]] = []
+        offset = 0
+        while offset < len(x):
+            block = x[offset : offset + self._block_size]
+            segments += self._block_diagonals(block, offset, threshold)
+            if offset + self._block_size >= len(x):
+                break
+            offset += self._block_size - M
+        return segments
+
+    def _block_diagonals(
+        self, x: np.ndarray, offset: int, threshold: float
+    ) -> List[Tuple[int, int]]:
+        M = self._scores.shape[0]
+        pad = np.full(M - 1, self._stop, dtype=np.intp)
+        xp = np.concatenate([pad, x, pad])
+        ndiag = len(x) + M - 1
+
+        run = np.zeros(ndiag)
+        start = np.zeros(ndiag, dtype=np.intp)
+        best = np.full(ndiag, -np.inf)
+        best_start = np.zeros(ndiag, dtype=np.intp)
+        best_stop = np.zeros(ndiag, dtype=np.intp)
+
+        for k in range(M):
+            reset = run <= 0
+            run[reset] = 0.0
+            start[reset] = k
+            run += self._scores[k][xp[k : k + ndiag]]
+
+            better = run > best
+            best[better] = run[better]
+            best_start[better] = start[better]
+            best_stop[better] = k + 1
+
+        diags = np.flatnonzero(best >= threshold)
+        first = offset + diags - (M - 1)
+        starts = first + best_start[diags]
+        stops = first + best_stop[diags]
+        return [(int(a), int(b)) for a, b in zip(starts, stops)]
+
+
+def _codon_index(triplet: bytes) -> int:
+    codes = _BASE_CODES[np.frombuffer(triplet, dtype=np.uint8)]
+    return int(codes[0] * 25 + codes[1] * 5 + codes[2])
+
+
+def _merge(intervals: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    merged: List[Tuple[int, int]] = []
+    for start, stop in sorted(intervals):
+        if len(merged) > 0 and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+        else:
+            merged.append((start, stop))
+    return merged
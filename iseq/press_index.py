@@ -0,0 +1,415 @@
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from nmm import Input
+
+from iseq.profile import ProfileID
+from iseq.protein import KMER_COUNT, ProteinProfile
+
+__all__ = [
+    "DEFAULT_PRESS_CONFIG",
+    "KMER_DTYPE",
+    "PressConfig",
+    "PressedEntry",
+    "PressedIndex",
+    "PressedKmerTables",
+    "open_pressed_index",
+    "open_pressed_kmer_tables",
+    "pressed_index_filepath",
+    "pressed_prefix",
+    "read_press_header",
+    "read_pressed_offsets",
+    "read_pressed_profile",
+    "write_press_header",
+    "write_pressed_index",
+]
+
+PRESS_FORMAT_VERSION = 1
+
+# Settings a pressed database was built with: profile model ("1" or "2"),
+# target alphabet ("dna" or "rna"), indel probability and NCBI genetic code id.
+PressConfig = NamedTuple(
+    "PressConfig",
+    [
+        ("model", str),
+        ("alphabet", str),
+        ("epsilon", float),
+        ("genetic_code", int),
+    ],
+)
+DEFAULT_PRESS_CONFIG = PressConfig("1", "dna", 1e-2, 1)
+
+# Byte order and type of the k-mer tables of a ``.kmer`` file.
+KMER_DTYPE = "<f8"
+
+PressedEntry = NamedTuple(
+    "PressedEntry",
+    [
+        ("name", str),
+        ("acc", str),
+        ("alt_offset", int),
+        ("alt_size", int),
+        ("null_offset", int),
+        ("null_size", int),
+        ("model_length", Optional[int]),
+        ("digest", str),
+    ],
+)
+
+_OFFSET_FIELDS = [
+    ("alt_offset", "<u8"),
+    ("alt_size", "<u8"),
+    ("null_offset", "<u8"),
+    ("null_size", "<u8"),
+]
+_FIELDS = _OFFSET_FIELDS + [("model_length", "<u4"), ("digest", "S32")]
+
+
+class PressedIndex:
+    """
+    Binary index of a pressed database, memory-mapped at open.
+
+    The index is a NumPy ``.npy`` file holding one fixed-size record per
+    model, in database order: name, accession, offset and size of the model
+    in the ``.alt`` and ``.null`` files, model length, and the digest of the
+    HMM text block the model was built from. Records are read
+    straight from the mapped file, so a worker can seek to any model without
+    reading the text ``.meta`` and ``.idx`` files.
+
+    Databases pressed before the index existed have no model lengths nor
+    digests, which entries give as `None` and an empty string.
+
+    Parameters
+    ----------
+    table
+        Records, as opened by :func:`open_pressed_index`.
+    """
+
+    def __init__(self, table: np.ndarray):
+        self._table = table
+        self._keys: Optional[Dict[str, int]] = None
+        self._has_model_length = "model_length" in self._table.dtype.names
+        self._has_digest = "digest" in self._table.dtype.names
+
+    def __len__(self) -> int:
+        return self._table.shape[0]
+
+    def __getitem__(self, idx: int) -> PressedEntry:
+        r = self._table[idx]
+        return PressedEntry(
+            r["name"].decode(),
+            r["acc"].decode(),
+            int(r["alt_offset"]),
+            int(r["alt_size"]),
+            int(r["null_offset"]),
+            int(r["null_size"]),
+            int(r["model_length"]) if self._has_model_length else None,
+            r["digest"].decode() if self._has_digest else "",
+        )
+
+    def __iter__(self) -> Iterator[PressedEntry]:
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def find(self, key: str) -> int:
+        """
+        Position of the model having `key` as accession or name.
+
+        Parameters
+        ----------
+        key
+            Model accession or name.
+        """
+        if self._keys is None:
+            keys: Dict[str, int] = {}
+            for idx, name in enumerate(self._table["name"].tolist()):
+                keys.setdefault(name.decode(), idx)
+            for idx, acc in enumerate(self._table["acc"].tolist()):
+                keys[acc.decode()] = idx
+            self._keys = keys
+
+        idx = self._keys.get(key, None)
+        if idx is None:
+            raise KeyError(f"Profile {key} not found.")
+        return idx
+
+    def entry(self, key: str) -> PressedEntry:
+        """
+        Entry of the model having `key` as accession or name.
+        """
+        return self[self.find(key)]
+
+
+class PressedKmerTables:
+    """
+    K-mer emission tables of a pressed database, memory-mapped at open.
+
+    The ``.kmer`` file holds the :attr:`iseq.protein.ProteinProfile.kmer_tables`
+    of every model, in database order, as raw little-endian doubles; their
+    offsets are in its ``.idx`` file, as for the ``.alt`` and ``.null`` files.
+
+    Parameters
+    ----------
+    filepath
+        ``.kmer`` file.
+    """
+
+    def __init__(self, filepath: Union[str, Path]):
+        offsets, sizes = read_pressed_offsets(str(filepath))
+        self._offsets = offsets
+        self._sizes = sizes
+        self._data = np.zeros(0, dtype=KMER_DTYPE)
+        if os.path.getsize(filepath) > 0:
+            self._data = np.memmap(filepath, dtype=KMER_DTYPE, mode="r")
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __getitem__(self, idx: int) -> np.ndarray:
+        itemsize = self._data.itemsize
+        start = self._offsets[idx] // itemsize
+        stop = start + self._sizes[idx] // itemsize
+        return self._data[start:stop].reshape((-1, KMER_COUNT))
+
+
+def pressed_prefix(profile: Union[str, Path], config: PressConfig) -> str:
+    """
+    Path prefix of the files of a pressed database.
+
+    The default configuration is pressed next to `profile` as
+    ``PROFILE.alt``, ``PROFILE.null`` and so on. Every other configuration
+    gets its own tag, e.g. ``PROFILE.m2-rna-e0.01-gc1.alt``.
+
+    Parameters
+    ----------
+    profile
+        HMMER3 file.
+    config
+        Press settings.
+    """
+    if config == DEFAULT_PRESS_CONFIG:
+        return str(profile)
+    tag = (
+        f"m{config.model}-{config.alphabet}-e{config.epsilon:g}-gc{config.genetic_code}"
+    )
+    return f"{profile}.{tag}"
+
+
+def write_press_header(prefix: str, config: PressConfig):
+    """
+    Record the settings of a pressed database in its ``.header`` file.
+    """
+    header = {"version": PRESS_FORMAT_VERSION, **config._asdict()}
+    with open(prefix + ".header", "w") as file:
+        json.dump(header, file, indent=2)
+        file.write("\n")
+
+
+def read_press_header(prefix: str) -> PressConfig:
+    """
+    Settings a pressed database was built with.
+
+    Databases pressed before headers existed were built with the default
+    configuration.
+
+    Parameters
+    ----------
+    prefix
+        Pressed database, as returned by :func:`pressed_prefix`.
+    """
+    if not os.path.exists(prefix + ".header"):
+        return DEFAULT_PRESS_CONFIG
+
+    with open(prefix + ".header", "r") as file:
+        header = json.load(file)
+
+    version = header.get("version", None)
+    if version != PRESS_FORMAT_VERSION:
+        raise ValueError(f"Unsupported pressed database version {version}.")
+
+    return PressConfig(
+        str(header["model"]),
+        str(header["alphabet"]),
+        float(header["epsilon"]),
+        int(header["genetic_code"]),
+    )
+
+
+def pressed_index_filepath(prefix: Union[str, Path]) -> Path:
+    """
+    Binary index file of a pressed database.
+    """
+    return Path(str(prefix) + ".pidx")
+
+
+def write_pressed_index(
+    prefix: Union[str, Path],
+    names: Sequence[str],
+    accs: Sequence[str],
+    model_lengths: Sequence[int],
+    digests: Optional[Sequence[str]] = None,
+):
+    """
+    Write the binary index of a pressed database.
+
+    Offsets are taken from the ``.alt.idx`` and ``.null.idx`` files written
+    alongside the ``.alt`` and ``.null`` files.
+
+    Parameters
+    ----------
+    prefix
+        Pressed database, as returned by :func:`pressed_prefix`.
+    names
+        Model names, in database order.
+    accs
+        Model accessions, in database order.
+    model_lengths
+        Model lengths, in database order.
+    digests
+        Digests of the HMM text blocks, in database order. Defaults to `None`,
+        which means unknown.
+    """
+    n = len(names)
+    if digests is None:
+        digests = [""] * n
+    if not (len(model_lengths) == len(digests) == n):
+        raise ValueError("Number of models does not match the pressed files.")
+
+    table = _index_table(prefix, names, accs, _FIELDS)
+    table["model_length"] = model_lengths
+    table["digest"] = [i.encode() for i in digests]
+
+    filepath = pressed_index_filepath(prefix)
+    tmppath = filepath.with_name(filepath.name + f".{os.getpid()}.tmp")
+    with open(tmppath, "wb") as file:
+        np.save(file, table)
+    os.replace(tmppath, filepath)
+
+
+def _index_table(
+    prefix: Union[str, Path],
+    names: Sequence[str],
+    accs: Sequence[str],
+    fields: List[Tuple[str, str]],
+) -> np.ndarray:
+    """
+    Index records with the names, accessions and offsets of the models, and
+    further `fields` left to zero.
+    """
+    alt_offsets, alt_sizes = read_pressed_offsets(str(prefix) + ".alt")
+    null_offsets, null_sizes = read_pressed_offsets(str(prefix) + ".null")
+
+    n = len(names)
+    if not (len(accs) == len(alt_offsets) == len(null_offsets) == n):
+        raise ValueError("Number of models does not match the pressed files.")
+
+    name_width = max([len(i.encode()) for i in names] + [1])
+    acc_width = max([len(i.encode()) for i in accs] + [1])
+    dtype = np.dtype([("name", f"S{name_width}"), ("acc", f"S{acc_width}")] + fields)
+
+    table = np.zeros(n, dtype=dtype)
+    table["name"] = [i.encode() for i in names]
+    table["acc"] = [i.encode() for i in accs]
+    table["alt_offset"] = alt_offsets
+    table["alt_size"] = alt_sizes
+    table["null_offset"] = null_offsets
+    table["null_size"] = null_sizes
+    return table
+
+
+def open_pressed_index(prefix: Union[str, Path]) -> PressedIndex:
+    """
+    Open the binary index of a pressed database.
+
+    Databases pressed before the binary index existed only have the text
+    ``.meta`` and ``.idx`` files. Their index is built in memory from those
+    files, without model lengths nor digests, and is not written: the
+    database may be read-only or shared with concurrent scans. Pressing the
+    database again writes a complete index.
+
+    Parameters
+    ----------
+    prefix
+        Pressed database, as returned by :func:`pressed_prefix`.
+    """
+    filepath = pressed_index_filepath(prefix)
+    if filepath.exists():
+        return PressedIndex(np.load(filepath, mmap_mode="r"))
+
+    names: List[str] = []
+    accs: List[str] = []
+    with open(str(prefix) + ".meta", "r") as file:
+        for line in file:
+            name, acc = line.rstrip("\n").split("\t")
+            names.append(name)
+            accs.append(acc)
+    return PressedIndex(_index_table(prefix, names, accs, _OFFSET_FIELDS))
+
+
+def open_pressed_kmer_tables(prefix: Union[str, Path]) -> Optional[PressedKmerTables]:
+    """
+    Open the k-mer tables of a pressed database, if it was pressed with them.
+
+    Parameters
+    ----------
+    prefix
+        Pressed database, as returned by :func:`pressed_prefix`.
+    """
+    filepath = str(prefix) + ".kmer"
+    if not os.path.exists(filepath):
+        return None
+    return PressedKmerTables(filepath)
+
+
+def read_pressed_profile(prefix: Union[str, Path], key: str) -> ProteinProfile:
+    """
+    Load a single profile from a pressed database.
+
+    Its k-mer tables are loaded too, if the database has them.
+
+    Parameters
+    ----------
+    prefix
+        Pressed database, as returned by :func:`pressed_prefix`.
+    key
+        Model accession or name.
+    """
+    index = open_pressed_index(prefix)
+    idx = index.find(key)
+    entry = index[idx]
+    afile = Input.create((str(prefix) + ".alt").encode())
+    nfile = Input.create((str(prefix) + ".null").encode())
+    try:
+        afile.fseek(entry.alt_offset)
+        nfile.fseek(entry.null_offset)
+        alt = afile.read()
+        null = nfile.read()
+    finally:
+        afile.close()
+        nfile.close()
+    profid = ProfileID(entry.name, entry.acc)
+    prof = ProteinProfile.create_from_binary(profid, null, alt)
+
+    kmer_tables = open_pressed_kmer_tables(prefix)
+    if kmer_tables is not None:
+        prof.kmer_tables = np.array(kmer_tables[idx])
+    return prof
+
+
+def read_pressed_offsets(filepath: str) -> Tuple[List[int], List[int]]:
+    """
+    Offsets and sizes of the models in a binary file, from its ``.idx`` file.
+
+    Parameters
+    ----------
+    filepath
+        Binary ``.alt``, ``.null`` or ``.kmer`` file.
+    """
+    with open(filepath + ".idx", "r") as file:
+        offsets = [int(line.strip()) for line in file if line.strip() != ""]
+    size = os.path.getsize(filepath)
+    sizes = [b - a for a, b in zip(offsets, offsets[1:] + [size])]
+    return offsets, sizes
@@ -1,11 +1,12 @@
 from abc import ABC, abstractmethod
-from math import log
-from typing import Generic, NamedTuple, TypeVar
+from math import ceil, log
+from typing import Dict, Generic, List, NamedTuple, Optional, TypeVar
 
 from imm import Alphabet, Sequence, State, lprob_zero
 
+from .evalue import EValue
 from .model import AltModel, NullModel, SpecialTransitions
-from .result import SearchResults
+from .result import SearchResults, WindowScore
 
 TAlphabet = TypeVar("TAlphabet", bound=Alphabet)
 TState = TypeVar("TState", bound=State)
@@ -14,6 +15,9 @@ __all__ = ["Profile", "ProfileID"]
 
 ProfileID = NamedTuple("ProfileID", [("name", str), ("acc", str)])
 
+# Number of target lengths whose special transitions are kept by a profile.
+_SPECIAL_TRANS_CACHE_SIZE = 4096
+
 
 class Profile(Generic[TAlphabet, TState], ABC):
     def __init__(
@@ -29,10 +33,13 @@ class Profile(Generic[TAlphabet, TState], ABC):
         self._null_model = null_model
         self._alt_model = alt_model
         self._multiple_hits: bool = True
-        self._special_trans = SpecialTransitions()
+        self._special_trans: Dict[int, SpecialTransitions] = {}
         self._hmmer3_compat = hmmer3_compat
+        self._target_length = 0
+        self._target_length_bucket = 0
         self._set_target_length_model(1)
         self._window_length: int = 0
+        self._evalue: Optional[EValue] = None
 
     @property
     def profid(self) -> ProfileID:
@@ -46,6 +53,17 @@ class Profile(Generic[TAlphabet, TState], ABC):
     def window_length(self, length: int) -> None:
         self._window_length = length
 
+    @property
+    def evalue(self) -> Optional[EValue]:
+        """
+        E-value calculator applied to every search result, if any.
+        """
+        return self._evalue
+
+    @evalue.setter
+    def evalue(self, evalue: Optional[EValue]) -> None:
+        self._evalue = evalue
+
     @property
     def alphabet(self):
         return self._alphabet
@@ -70,16 +88,97 @@ class Profile(Generic[TAlphabet, TState], ABC):
     @multiple_hits.setter
     def multiple_hits(self, multiple_hits: bool):
         self._multiple_hits = multiple_hits
+        self._special_trans.clear()
+        self._target_length = 0
+
+    @property
+    def target_length_bucket(self) -> int:
+        """
+        Width of the target length buckets.
+
+        Target lengths are rounded up to a multiple of this width before the
+        target length model is computed, so that targets of similar lengths
+        share the same special transitions. Scores then differ slightly from
+        HMMER's. Zero, the default, uses exact target lengths.
+        """
+        return self._target_length_bucket
+
+    @target_length_bucket.setter
+    def target_length_bucket(self, width: int):
+        if width < 0:
+            raise ValueError("Bucket width must be non-negative.")
+        self._target_length_bucket = width
 
     @abstractmethod
     def search(self, sequence: Sequence) -> SearchResults[TAlphabet, TState]:
         del sequence
         raise NotImplementedError()
 
+    def search_batch(
+        self, sequences: List[Sequence], min_score: Optional[float] = None
+    ) -> List[SearchResults[TAlphabet, TState]]:
+        """
+        Search several sequences.
+
+        Profiles whose engine can align many sequences at once override this
+        to do so. The results are the same as searching each sequence in turn,
+        which is what this default does.
+
+        Parameters
+        ----------
+        sequences
+            Target sequences.
+        min_score
+            Only build the path and fragments of windows whose log-odds score,
+            in nats, is at least this. Defaults to `None`, which builds every
+            window.
+        """
+        return [self.search(seq, min_score=min_score) for seq in sequences]
+
+    @abstractmethod
+    def score(self, sequence: Sequence) -> List[WindowScore]:
+        """
+        Alt and null Viterbi scores of every window of a sequence.
+
+        Unlike `search`, no path is walked and no fragment is built.
+        """
+        del sequence
+        raise NotImplementedError()
+
     def _set_target_length_model(self, target_length: int):
-        t = self._get_target_length_model(target_length)
+        L = self._bucket_target_length(target_length)
+        if L == self._target_length:
+            return
+
+        t = self._special_transitions(L)
         self._null_model.set_special_transitions(t)
         self._alt_model.set_special_transitions(t, self._hmmer3_compat)
+        self._target_length = L
+
+    def _bucket_target_length(self, target_length: int) -> int:
+        L = target_length
+        if L == 0:
+            raise ValueError("Target length cannot be zero.")
+
+        width = self._target_length_bucket
+        if width > 0:
+            L = width * ceil(L / width)
+        return L
+
+    def _special_transitions(self, target_length: int) -> SpecialTransitions:
+        """
+        Special transitions of a target length, from the cache if possible.
+
+        Unlike `_set_target_length_model`, the models are left untouched.
+        """
+        L = self._bucket_target_length(target_length)
+        t = self._special_trans.get(L, None)
+        if t is None:
+            if len(self._special_trans) >= _SPECIAL_TRANS_CACHE_SIZE:
+                del self._special_trans[next(iter(self._special_trans))]
+            t = self._get_target_length_model(L)
+            self._special_trans[L] = t
+        return t
 
     def _get_target_length_model(self, target_length: int) -> SpecialTransitions:
         L = target_length
@@ -97,7 +196,7 @@ class Profile(Generic[TAlphabet, TState], ABC):
         l1p = log(2 + q / (1 - q)) - log(L + 2 + q / (1 - q))
         lr = log(L) - log(L + 1)
 
-        t = self._special_trans
+        t = SpecialTransitions()
 
         t.NN = t.CC = t.JJ = lp
         t.NB = t.CT = t.JB = l1p
@@ -1,11 +1,18 @@
 from . import typing
+from ._cache import FrameTableCache, NullScoreCache
 from ._fragment import ProteinFragment
+from ._frame import KMER_COUNT, FrameViterbi, iter_kmers
 from ._profile import ProteinProfile, create_profile, create_profile2
 
 __all__ = [
+    "FrameTableCache",
+    "FrameViterbi",
+    "KMER_COUNT",
+    "NullScoreCache",
     "ProteinFragment",
     "ProteinProfile",
     "create_profile",
+    "iter_kmers",
     "typing",
     "create_profile2",
 ]
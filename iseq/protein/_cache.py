@@ -0,0 +1,98 @@
+from collections import OrderedDict
+from typing import Generic, Hashable, Optional, Tuple, TypeVar
+
+from nmm import BaseAlphabet, BaseTable, CodonTable
+
+__all__ = ["FrameTableCache", "NullScoreCache"]
+
+T = TypeVar("T")
+
+
+class LRUCache(Generic[T]):
+    """
+    Least recently used cache with hit and miss counters.
+
+    Parameters
+    ----------
+    maxsize
+        Maximum number of entries.
+    """
+
+    def __init__(self, maxsize: int):
+        if maxsize < 1:
+            raise ValueError("Maximum size must be greater than zero.")
+        self._maxsize = maxsize
+        self._items: OrderedDict[Hashable, T] = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key: Hashable) -> Optional[T]:
+        item = self._items.get(key, None)
+        if item is None:
+            self._misses += 1
+            return None
+        self._items.move_to_end(key)
+        self._hits += 1
+        return item
+
+    def put(self, key: Hashable, item: T):
+        self._items[key] = item
+        self._items.move_to_end(key)
+        if len(self._items) > self._maxsize:
+            self._items.popitem(last=False)
+
+    def clear(self):
+        self._items.clear()
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def hits(self) -> int:
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        return self._misses
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class NullScoreCache(LRUCache[float]):
+    """
+    Null-model scores shared across profiles.
+
+    Profiles built from the same background amino acid table, indel
+    probability, and genetic code have the same null model. The null score of a
+    target window is therefore the same for all of them and only needs to be
+    computed once per run. The least recently used entries are evicted once
+    `maxsize` is reached.
+
+    Parameters
+    ----------
+    maxsize
+        Maximum number of scores to hold. Defaults to 1048576.
+    """
+
+    def __init__(self, maxsize: int = 1 << 20):
+        super().__init__(maxsize)
+
+
+class FrameTableCache(LRUCache[Tuple[BaseAlphabet, BaseTable, CodonTable]]):
+    """
+    Base and codon tables of frame states, keyed by content.
+
+    The tables of a frame state depend only on its amino acid table and on the
+    genetic code. In `create_profile2`, the insert states and the N, J, C, and
+    R special states of every model share the same background table, so most
+    states of a database can reuse tables built once. Match tables are
+    unique to each model, which is why the cache is bounded.
+
+    Parameters
+    ----------
+    maxsize
+        Maximum number of table pairs to hold. Defaults to 4096.
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        super().__init__(maxsize)
@@ -0,0 +1,476 @@
+from itertools import product
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from imm import Sequence
+from nmm import BaseAlphabet, FrameState
+
+from iseq.hmmer3._plan7 import plan7_buckets
+from iseq.model import SpecialTransitions, Transitions
+
+__all__ = [
+    "FrameResult",
+    "FrameViterbi",
+    "KMER_COUNT",
+    "iter_kmers",
+    "kmer_emissions",
+]
+
+# State kinds of the steps of a frame path.
+S, N, B, E, J, C, T, M, I, D = range(10)
+
+# Longest span emitted by a frame state.
+_MAX_SPAN = 5
+
+# Number of k-mers of one to five bases over a four-base alphabet.
+KMER_COUNT = sum(4**k for k in range(1, _MAX_SPAN + 1))
+
+# Index of the first k-mer of each length, from zero to five.
+_KMER_OFFSETS = [sum(4**j for j in range(1, k)) for k in range(_MAX_SPAN + 1)]
+
+_NEG = -np.inf
+
+# Alignment of a nucleotide sequence: its Viterbi score, in nats, and, if asked
+# for, its steps as (state kind, node, span) triplets from S to T.
+FrameResult = NamedTuple(
+    "FrameResult",
+    [("score", float), ("steps", Optional[List[Tuple[int, int, int]]])],
+)
+
+
+def iter_kmers(symbols: bytes) -> Iterator[bytes]:
+    """
+    K-mers of one to five symbols, shortest first and in lexicographic order.
+    """
+    for k in range(1, _MAX_SPAN + 1):
+        for kmer in product(symbols, repeat=k):
+            yield bytes(kmer)
+
+
+def kmer_emissions(state: FrameState, alphabet: BaseAlphabet) -> np.ndarray:
+    """
+    Log-probabilities of a frame state emitting each k-mer of `iter_kmers`.
+
+    Parameters
+    ----------
+    state
+        Frame state.
+    alphabet
+        Base alphabet of the state.
+    """
+    return np.array(
+        [
+            state.lprob(Sequence.create(kmer, alphabet))
+            for kmer in iter_kmers(alphabet.symbols)
+        ]
+    )
+
+
+class FrameViterbi:
+    """
+    Viterbi algorithm specialised for protein profiles on nucleotide targets.
+
+    Each frame state emits spans of one to five bases, so that every cell of
+    the dynamic programming matrix looks back up to five rows. The emissions
+    of every k-mer are looked up in tables built beforehand, one per state,
+    instead of being marginalised over codons on the fly. As in
+    :class:`iseq.hmmer3.Plan7Viterbi`, match, insert and delete scores are held
+    in vectors over the model nodes, and several sequences can be aligned at
+    once. It computes the same scores as the `imm` model built by
+    :class:`iseq.protein.ProteinProfile`.
+
+    Parameters
+    ----------
+    alphabet
+        Base alphabet of the target sequences.
+    match_emissions
+        M×K match emission log-probabilities, with K k-mers in `iter_kmers`
+        order.
+    insert_emissions
+        M×K insert emission log-probabilities.
+    special_emissions
+        3×K emission log-probabilities of the N, J and C states.
+    core_trans
+        Transitions of node k to node k + 1, for k from 0 to M - 2.
+    entry
+        Transitions from B to the match state of every node.
+    """
+
+    def __init__(
+        self,
+        alphabet: BaseAlphabet,
+        match_emissions: np.ndarray,
+        insert_emissions: np.ndarray,
+        special_emissions: np.ndarray,
+        core_trans: List[Transitions],
+        entry: List[float],
+    ):
+        symbols = alphabet.symbols
+        if len(symbols) != 4:
+            raise ValueError("Base alphabet must have four symbols.")
+        nodes = match_emissions.shape[0]
+
+        # Base codes, four for symbols the tables do not cover.
+        self._codes = np.full(256, 4, dtype=np.intp)
+        for i, symbol in enumerate(symbols):
+            self._codes[symbol] = i
+
+        # Tables are indexed by k-mer, the last row for spans that are not
+        # k-mers of the alphabet.
+        self._match = _table(match_emissions.T)
+        self._insert = _table(insert_emissions.T)
+        self._special = _table(special_emissions.T)
+
+        self._MM = np.array([t.MM for t in core_trans], dtype=float)
+        self._MI = np.array([t.MI for t in core_trans], dtype=float)
+        self._MD = np.array([t.MD for t in core_trans], dtype=float)
+        self._IM = np.array([t.IM for t in core_trans], dtype=float)
+        self._II = np.array([t.II for t in core_trans], dtype=float)
+        self._DM = np.array([t.DM for t in core_trans], dtype=float)
+        self._DD = np.array([t.DD for t in core_trans], dtype=float)
+        self._entry = np.array(entry, dtype=float)
+
+        self._DD_cumsum: Optional[np.ndarray] = None
+        if np.all(np.isfinite(self._DD)):
+            self._DD_cumsum = np.cumsum(self._DD)
+
+        self._nodes = nodes
+        self._special_trans = _special_scores(SpecialTransitions())
+
+    @property
+    def nodes(self) -> int:
+        return self._nodes
+
+    def set_special_transitions(self, special_trans: SpecialTransitions):
+        """
+        Set the transitions of the special states used by :meth:`viterbi`.
+        """
+        self._special_trans = _special_scores(special_trans)
+
+    def encode(self, sequence: bytes) -> np.ndarray:
+        """
+        Base codes of a sequence, four for symbols outside the alphabet.
+        """
+        return self._codes[np.frombuffer(sequence, dtype=np.uint8)]
+
+    def viterbi(self, codes: np.ndarray, path: bool = True) -> FrameResult:
+        """
+        Viterbi score and, optionally, path of an encoded sequence.
+
+        Parameters
+        ----------
+        codes
+            Sequence encoded by :meth:`encode`.
+        path
+            Trace the best path back. Defaults to `True`.
+        """
+        return self._viterbi_bucket([codes], self._special_trans[:, None], path)[0]
+
+    def viterbi_batch(
+        self,
+        codes: List[np.ndarray],
+        special_trans: List[SpecialTransitions],
+        path: bool = False,
+    ) -> List[FrameResult]:
+        """
+        Viterbi scores and, optionally, paths of several encoded sequences.
+
+        Sequences are aligned together in buckets of similar lengths, as
+        described in :func:`iseq.hmmer3._plan7.plan7_buckets`.
+
+        Parameters
+        ----------
+        codes
+            Sequences encoded by :meth:`encode`.
+        special_trans
+            Transitions of the special states for each sequence.
+        path
+            Trace the best paths back. Defaults to `False`.
+        """
+        results: List[Optional[FrameResult]] = [None] * len(codes)
+        for bucket in plan7_buckets([len(c) for c in codes], self._nodes):
+            special = np.array([_special_scores(special_trans[j]) for j in bucket])
+            bucket_results = self._viterbi_bucket(
+                [codes[j] for j in bucket], special.T, path
+            )
+            for j, result in zip(bucket, bucket_results):
+                results[j] = result
+
+        return [r for r in results if r is not None]
+
+    def _viterbi_bucket(
+        self, codes: List[np.ndarray], special: np.ndarray, path: bool
+    ) -> List[FrameResult]:
+        n = len(codes)
+        lengths = np.array([len(c) for c in codes])
+        if np.any(lengths == 0):
+            raise ValueError("Sequence length cannot be zero.")
+        L = int(lengths.max())
+        kmers = _kmer_indices(codes, L)
+
+        NN, NB, CC, CT, EC, ECT, JJ, JB, EJ, EJB = special
+        nodes = self._nodes
+        match, insert, emit = self._match, self._insert, self._special
+        MM, MI, MD = self._MM, self._MI, self._MD
+        IM, II, DM, DD = self._IM, self._II, self._DM, self._DD
+
+        # Scores of each row after the transitions out of it, waiting for the
+        # span emitted by the next state: the "pre" scores of M, I, N, J and C.
+        # Core states only need the last rows a span can reach back to.
+        ring = _MAX_SPAN + 1
+        preM = np.full((ring, n, nodes), _NEG)
+        preI = np.full((ring, n, nodes), _NEG)
+        preN = np.full((L + 1, n), _NEG)
+        preJ = np.full((L + 1, n), _NEG)
+        preC = np.full((L + 1, n), _NEG)
+
+        ptrs: Optional[_Pointers] = None
+        if path:
+            ptrs = _Pointers(
+                np.zeros((L + 1, n, nodes), dtype=np.int8),
+                np.zeros((L + 1, n, nodes), dtype=np.int8),
+                np.zeros((L + 1, n, nodes), dtype=np.bool_),
+                np.zeros((L + 1, n, nodes), dtype=np.int8),
+                np.zeros((L + 1, n, nodes), dtype=np.bool_),
+                np.zeros((L + 1, n), dtype=np.intp),
+                np.zeros((L + 1, n), dtype=np.int8),
+                np.zeros((L + 1, 3, n), dtype=np.int8),
+                np.zeros((L + 1, n), dtype=np.bool_),
+                np.zeros((L + 1, n), dtype=np.bool_),
+            )
+
+        Bv = NB.copy()
+        preM[0] = self._entry + Bv[:, None]
+        preN[0] = NN
+
+        score = np.full(n, _NEG)
+        end_in_C = np.zeros(n, dtype=np.bool_)
+        rows = np.arange(n)
+        cand = np.full((4, n, nodes), _NEG)
+        for i in range(1, L + 1):
+            Mv = np.full((n, nodes), _NEG)
+            Iv = np.full((n, nodes), _NEG)
+            special_v = np.full((3, n), _NEG)
+            for span in range(1, min(_MAX_SPAN, i) + 1):
+                r = i - span
+                kmer = kmers[i, span - 1]
+                fromM = preM[r % ring] + match[kmer]
+                fromI = preI[r % ring] + insert[kmer]
+                fromS = np.stack([preN[r], preJ[r], preC[r]]) + emit[kmer].T
+                if ptrs is not None:
+                    ptrs.spanM[i][fromM > Mv] = span
+                    ptrs.spanI[i][fromI > Iv] = span
+                    ptrs.spanS[i][fromS > special_v] = span
+                np.maximum(Mv, fromM, out=Mv)
+                np.maximum(Iv, fromI, out=Iv)
+                np.maximum(special_v, fromS, out=special_v)
+            Nv, Jv, Cv = special_v
+
+            Dv = self._delete_scan(Mv)
+            if ptrs is not None:
+                ptrs.D[i, :, 1:] = Dv[:, :-1] + DD > Mv[:, :-1] + MD
+
+            kM = Mv.argmax(1)
+            Ev = Mv[rows, kM]
+            if ptrs is not None:
+                ptrs.E[i] = kM
+            if nodes > 1:
+                kD = Dv[:, 1:].argmax(1) + 1
+                fromD = Dv[rows, kD]
+                use_D = fromD > Ev
+                Ev = np.where(use_D, fromD, Ev)
+                if ptrs is not None:
+                    ptrs.E[i] = np.where(use_D, nodes + kD, kM)
+
+            fromN = Nv + NB
+            fromE = Ev + EJB
+            fromJ = Jv + JB
+            Bv = np.maximum(np.maximum(fromN, fromE), fromJ)
+            if ptrs is not None:
+                ptrs.B[i] = np.where(Bv == fromN, 0, np.where(Bv == fromE, 1, 2))
+
+            ended = lengths == i
+            if np.any(ended):
+                fromE = Ev[ended] + ECT[ended]
+                fromC = Cv[ended] + CT[ended]
+                score[ended] = np.maximum(fromE, fromC)
+                end_in_C[ended] = fromC > fromE
+
+            # Transitions out of row i.
+            np.add(self._entry, Bv[:, None], out=cand[0])
+            np.add(Mv[:, :-1], MM, out=cand[1, :, 1:])
+            np.add(Iv[:, :-1], IM, out=cand[2, :, 1:])
+            np.add(Dv[:, :-1], DM, out=cand[3, :, 1:])
+            if ptrs is not None:
+                src = cand.argmax(0)
+                ptrs.M[i] = src
+                preM[i % ring] = np.take_along_axis(cand, src[None], 0)[0]
+            else:
+                preM[i % ring] = cand.max(0)
+
+            fromM = Mv[:, :-1] + MI
+            fromI = Iv[:, :-1] + II
+            np.maximum(fromM, fromI, out=preI[i % ring, :, :-1])
+            if ptrs is not None:
+                ptrs.I[i, :, :-1] = fromI > fromM
+
+            preN[i] = Nv + NN
+            fromE = Ev + EJ
+            fromJ = Jv + JJ
+            preJ[i] = np.maximum(fromE, fromJ)
+            if ptrs is not None:
+                ptrs.J[i] = fromJ > fromE
+            fromE = Ev + EC
+            fromC = Cv + CC
+            preC[i] = np.maximum(fromE, fromC)
+            if ptrs is not None:
+                ptrs.C[i] = fromC > fromE
+
+        results: List[FrameResult] = []
+        for b in range(n):
+            steps = None
+            if ptrs is not None:
+                steps = _traceback(ptrs, b, int(lengths[b]), nodes, end_in_C[b])
+            results.append(FrameResult(float(score[b]), steps))
+        return results
+
+    def _delete_scan(self, Mv: np.ndarray) -> np.ndarray:
+        """
+        Delete scores of a row from its match scores.
+        """
+        Dv = np.full(Mv.shape, _NEG)
+        if self._nodes < 2:
+            return Dv
+
+        fromM = Mv[:, :-1] + self._MD
+        shift = self._DD_cumsum
+        if shift is not None:
+            Dv[:, 1:] = np.maximum.accumulate(fromM - shift, axis=1) + shift
+            return Dv
+
+        for k in range(1, self._nodes):
+            Dv[:, k] = np.maximum(fromM[:, k - 1], Dv[:, k - 1] + self._DD[k - 1])
+        return Dv
+
+
+# Back pointers of a bucket, indexed by row, sequence and, for the core states,
+# node. M points to the source of the transition taken out of its row: B, M, I
+# or D; I to whether it came from I; D to whether it came from D. E points to a
+# match node, or to a delete node offset by the number of nodes, and B to N, E
+# or J. J and C tell whether the state looped on itself. The span pointers hold
+# the number of bases emitted by M, I and the N, J and C states.
+_Pointers = NamedTuple(
+    "_Pointers",
+    [
+        ("M", np.ndarray),
+        ("spanM", np.ndarray),
+        ("I", np.ndarray),
+        ("spanI", np.ndarray),
+        ("D", np.ndarray),
+        ("E", np.ndarray),
+        ("B", np.ndarray),
+        ("spanS", np.ndarray),
+        ("J", np.ndarray),
+        ("C", np.ndarray),
+    ],
+)
+
+
+def _traceback(
+    ptrs: _Pointers, b: int, L: int, nodes: int, end_in_C: bool
+) -> List[Tuple[int, int, int]]:
+    steps: List[Tuple[int, int, int]] = [(T, 0, 0)]
+    state, k, i = (C if end_in_C else E), 0, L
+    while state != S:
+        if state == M:
+            span = int(ptrs.spanM[i, b, k])
+            steps.append((M, k, span))
+            i -= span
+            src = ptrs.M[i, b, k]
+            state, k = [(B, 0), (M, k - 1), (I, k - 1), (D, k - 1)][src]
+        elif state == I:
+            span = int(ptrs.spanI[i, b, k])
+            steps.append((I, k, span))
+            i -= span
+            state = I if ptrs.I[i, b, k] else M
+        elif state == D:
+            steps.append((D, k, 0))
+            state, k = (D if ptrs.D[i, b, k] else M), k - 1
+        elif state == E:
+            steps.append((E, 0, 0))
+            node = int(ptrs.E[i, b])
+            state, k = (D, node - nodes) if node >= nodes else (M, node)
+        elif state == B:
+            steps.append((B, 0, 0))
+            state = S if i == 0 else [N, E, J][ptrs.B[i, b]]
+        else:
+            row = [N, J, C].index(state)
+            span = int(ptrs.spanS[i, row, b])
+            steps.append((state, 0, span))
+            i -= span
+            if state == N:
+                state = N if i > 0 else S
+            elif state == J:
+                state = J if ptrs.J[i, b] else E
+            else:
+                state = C if ptrs.C[i, b] else E
+    steps.append((S, 0, 0))
+    steps.reverse()
+    return steps
+
+
+def _table(emissions: np.ndarray) -> np.ndarray:
+    """
+    Emission table with an extra last row of impossible emissions.
+    """
+    table = np.full((KMER_COUNT + 1,) + emissions.shape[1:], _NEG)
+    table[:KMER_COUNT] = emissions
+    return table
+
+
+def _kmer_indices(codes: List[np.ndarray], L: int) -> np.ndarray:
+    """
+    Table row of the span of each length ending at each row of each sequence.
+
+    The result is indexed by row, span length minus one and sequence. Spans
+    that start before the sequence, or that hold a symbol outside the
+    alphabet, point to the last row of the tables.
+    """
+    n = len(codes)
+    X = np.full((n, L), 4, dtype=np.intp)
+    for b, c in enumerate(codes):
+        X[b, : len(c)] = c
+    bad = X >= 4
+    X[bad] = 0
+
+    kmers = np.full((L + 1, _MAX_SPAN, n), KMER_COUNT, dtype=np.intp)
+    value = np.zeros((n, L + 1), dtype=np.intp)
+    invalid = np.zeros((n, L + 1), dtype=np.bool_)
+    for span in range(1, _MAX_SPAN + 1):
+        value[:, 1:] = value[:, :-1] * 4 + X
+        invalid[:, 1:] = invalid[:, :-1] | bad
+        value[:, :span] = 0
+        invalid[:, :span] = True
+        index = np.where(invalid, KMER_COUNT, _KMER_OFFSETS[span] + value)
+        kmers[:, span - 1] = index.T
+    return kmers
+
+
+def _special_scores(t: SpecialTransitions) -> np.ndarray:
+    """
+    Special transitions in the order unpacked by `FrameViterbi._viterbi_bucket`.
+    """
+    return np.array(
+        [
+            t.NN,
+            t.NB,
+            t.CC,
+            t.CT,
+            t.EC + t.CC,
+            t.EC + t.CT,
+            t.JJ,
+            t.JB,
+            t.EJ + t.JJ,
+            t.EJ + t.JB,
+        ]
+    )
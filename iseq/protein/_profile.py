@@ -1,28 +1,36 @@
 from __future__ import annotations
 
-from math import log
-from typing import List, Type
+from hashlib import blake2b
+from math import inf, log
+from typing import Dict, Hashable, Iterator, List, Optional, Tuple, Type
 
 import nmm
+import numpy as np
 from imm import (
     Interval,
     MuteState,
     Path,
     Sequence,
     SequenceABC,
-    lprob_add,
+    State,
+    Step,
     lprob_normalize,
-    lprob_zero,
 )
-from nmm import AminoTable, BaseAlphabet, BaseTable, CodonProb, FrameState, codon_iter
+from nmm import AminoTable, BaseAlphabet, BaseTable, Codon, CodonProb, FrameState
 
 from iseq import wrap
+from iseq.alphabet import alphabet_name
 from iseq.codon_table import CodonTable
+from iseq.gencode import GeneticCode
+from iseq.hmmer3._plan7 import plan7_windows
 from iseq.hmmer_model import HMMERModel
-from iseq.model import EntryDistr, Transitions
+from iseq.model import EntryDistr, SpecialTransitions, Transitions
 from iseq.profile import Profile, ProfileID
+from iseq.result import WindowScore
 
+from ._cache import FrameTableCache, NullScoreCache
 from ._fragment import ProteinFragment
+from ._frame import KMER_COUNT, FrameViterbi, kmer_emissions
 from .typing import (
     ProteinAltModel,
     ProteinNode,
@@ -34,8 +42,31 @@ from .typing import (
 
 __all__ = ["ProteinProfile", "create_profile", "create_profile2"]
 
+_shared_null_cache = NullScoreCache()
+_shared_table_cache = FrameTableCache()
+
+# Window of a sequence with its alt path, if any, and its alt and null Viterbi
+# scores.
+_WindowResult = Tuple[Interval, Optional[Path[ProteinStep]], float, float]
+
 
 class ProteinProfile(Profile[BaseAlphabet, FrameState]):
+    def __init__(
+        self,
+        profid: ProfileID,
+        alphabet: BaseAlphabet,
+        null_model: ProteinNullModel,
+        alt_model: ProteinAltModel,
+        hmmer3_compat: bool,
+    ):
+        super().__init__(profid, alphabet, null_model, alt_model, hmmer3_compat)
+        self._null_key: Optional[Hashable] = None
+        self._null_cache = _shared_null_cache
+        self._frame: Optional[FrameViterbi] = None
+        self._frame_null: Optional[np.ndarray] = None
+        self._frame_states: Optional[List[State]] = None
+        self._kmer_tables: Optional[np.ndarray] = None
+
     @classmethod
     def create(
         cls: Type[ProteinProfile],
@@ -69,7 +100,12 @@ class ProteinProfile(Profile[BaseAlphabet, FrameState]):
             entry_distr,
         )
         # alt_model.set_fragment_length(self._special_transitions)
-        return cls(profid, base_alphabet, null_model, alt_model, False)
+        prof = cls(profid, base_alphabet, null_model, alt_model, False)
+        prof._null_key = (
+            _aminot_key(null_aminot, factory.genetic_code),
+            factory.epsilon,
+        )
+        return prof
 
     @property
     def epsilon(self) -> float:
@@ -111,64 +147,408 @@ class ProteinProfile(Profile[BaseAlphabet, FrameState]):
     def null_model(self) -> ProteinNullModel:
         return self._null_model
 
+    @property
+    def null_cache(self) -> NullScoreCache:
+        """
+        Null-model scores shared with other profiles of the same background.
+
+        Every profile shares a process-wide cache by default.
+        """
+        return self._null_cache
+
+    @null_cache.setter
+    def null_cache(self, cache: NullScoreCache) -> None:
+        self._null_cache = cache
+
     @property
     def alt_model(self) -> ProteinAltModel:
         return self._alt_model
 
-    def search(self, sequence: SequenceABC[BaseAlphabet]) -> ProteinSearchResults:
+    @property
+    def engine(self) -> str:
+        """
+        Viterbi engine: ``"imm"``, the generic state-graph engine, or
+        ``"numpy"``, the frame engine of :class:`iseq.protein.FrameViterbi`.
+
+        The frame engine looks k-mer emissions up in :attr:`kmer_tables`,
+        which are built when it is selected unless already set. Targets with
+        symbols outside the base alphabet are still searched with `imm`.
+        """
+        return "imm" if self._frame is None else "numpy"
+
+    @engine.setter
+    def engine(self, engine: str):
+        if engine not in ("imm", "numpy"):
+            raise ValueError(f"Unknown engine {engine}.")
+
+        if engine == "imm":
+            self._frame = None
+        elif self._frame is None:
+            self._frame = self._create_frame_viterbi()
 
-        # special_trans = self._get_target_length_model(len(sequence))
-        # self._alt_model.set_special_transitions(special_trans)
-        # self._null_model.set_special_transitions(special_trans)
+    @property
+    def kmer_tables(self) -> Optional[np.ndarray]:
+        """
+        Emission log-probabilities of the frame states for every k-mer, or
+        `None`.
+
+        One row per state: the match states of the M nodes, their insert
+        states, then the N, J and C states. One column per k-mer of one to
+        five bases, in :func:`iseq.protein.iter_kmers` order, so that the
+        k-mers of each span length take a contiguous range of columns. The
+        frame engine looks emissions up in them instead of marginalising
+        over codons.
+        """
+        return self._kmer_tables
+
+    @kmer_tables.setter
+    def kmer_tables(self, tables: Optional[np.ndarray]):
+        if tables is not None:
+            shape = (2 * self._alt_model.core_length + 3, KMER_COUNT)
+            if tables.shape != shape:
+                raise ValueError(f"K-mer tables must have shape {shape}.")
+        self._kmer_tables = tables
+        if self._frame is not None:
+            self._frame = self._create_frame_viterbi()
+
+    def search(
+        self,
+        sequence: SequenceABC[BaseAlphabet],
+        regions: Optional[List[Interval]] = None,
+        min_score: Optional[float] = None,
+    ) -> ProteinSearchResults:
+        """
+        Search a sequence.
+
+        Parameters
+        ----------
+        sequence
+            Target sequence.
+        regions
+            Restrict the search to those intervals of `sequence`, as given by
+            :class:`iseq.prefilter.Prefilter`. The target length model still
+            accounts for the whole sequence. Defaults to `None`, which means
+            the whole sequence.
+        min_score
+            Only build the path and fragments of windows whose log-odds score,
+            in nats, is at least this. The scores of the other windows are
+            still recorded. Defaults to `None`, which builds every window.
+        """
+
+        results = self._viterbi(sequence, regions, min_score)
+        return self._search_results(sequence, results, min_score)
+
+    def search_batch(
+        self,
+        sequences: List[SequenceABC[BaseAlphabet]],
+        min_score: Optional[float] = None,
+    ) -> List[ProteinSearchResults]:
+        """
+        Search several sequences.
+
+        With the frame engine, the windows of every sequence are aligned
+        together, in buckets of similar lengths. The results are the same as
+        those of :meth:`search`.
+
+        Parameters
+        ----------
+        sequences
+            Target sequences.
+        min_score
+            Only build the path and fragments of windows whose log-odds score,
+            in nats, is at least this. Defaults to `None`, which builds every
+            window.
+        """
+        frame = self._frame
+        if frame is None:
+            return super().search_batch(sequences, min_score)
+
+        windows: List[Tuple[int, Interval, float]] = []
+        codes: List[np.ndarray] = []
+        special: List[SpecialTransitions] = []
+        fallback: List[int] = []
+        for idx, sequence in enumerate(sequences):
+            seq_codes = frame.encode(bytes(sequence))
+            if np.any(seq_codes >= 4):
+                fallback.append(idx)
+                continue
+            t = self._special_transitions(len(sequence))
+            for start, stop in plan7_windows(len(seq_codes), self.window_length):
+                window_codes = seq_codes[start:stop]
+                viterbi_score0 = self._frame_null_score(window_codes, t)
+                windows.append((idx, Interval(start, stop), viterbi_score0))
+                codes.append(window_codes)
+                special.append(t)
+
+        results = frame.viterbi_batch(codes, special, min_score is None)
+        if min_score is not None:
+            hits = [
+                i
+                for i, (result, window) in enumerate(zip(results, windows))
+                if result.score - window[2] >= min_score
+            ]
+            hit_results = frame.viterbi_batch(
+                [codes[i] for i in hits], [special[i] for i in hits], True
+            )
+            for i, result in zip(hits, hit_results):
+                results[i] = result
+
+        items: List[List[_WindowResult]] = [[] for _ in sequences]
+        for (idx, window, viterbi_score0), result in zip(windows, results):
+            path = None
+            if result.steps is not None:
+                path = self._frame_path(result.steps)
+            items[idx].append((window, path, result.score, viterbi_score0))
+
+        search_results = [
+            self._search_results(seq, iter(seq_items), min_score)
+            for seq, seq_items in zip(sequences, items)
+        ]
+        for idx in fallback:
+            search_results[idx] = self.search(sequences[idx], min_score=min_score)
+        return search_results
 
-        # alt_results = self.alt_model.viterbi(sequence, window_length)
-        self._set_target_length_model(len(sequence))
-        alt_results = self._alt_model.viterbi(sequence, self.window_length)
+    def score(
+        self,
+        sequence: SequenceABC[BaseAlphabet],
+        regions: Optional[List[Interval]] = None,
+    ) -> List[WindowScore]:
+        """
+        Alt and null Viterbi scores of every window of a sequence.
+
+        Parameters
+        ----------
+        sequence
+            Target sequence.
+        regions
+            Restrict the search to those intervals of `sequence`. Defaults to
+            `None`, which means the whole sequence.
+        """
+        scores: List[WindowScore] = []
+        for window, _, viterbi_score1, viterbi_score0 in self._viterbi(
+            sequence, regions, inf
+        ):
+            score = viterbi_score1 - viterbi_score0
+            scores.append(WindowScore(window, score, viterbi_score1, viterbi_score0))
+        return scores
 
+    def _search_results(
+        self,
+        sequence: SequenceABC[BaseAlphabet],
+        results: Iterator[_WindowResult],
+        min_score: Optional[float],
+    ) -> ProteinSearchResults:
         def create_fragment(
             seq: SequenceABC[BaseAlphabet], path: Path[ProteinStep], homologous: bool
         ):
             return ProteinFragment(seq, path, homologous)
 
-        search_results = ProteinSearchResults(sequence, create_fragment)
+        search_results = ProteinSearchResults(sequence, create_fragment, self.evalue)
 
-        for alt_result in alt_results:
-            subseq = alt_result.sequence
-            # TODO: temporary fix for reading from binary file
-            # and consequently alt and null model having different alphabets
-            s = Sequence.create(bytes(subseq), self._null_model.hmm.alphabet)
-            viterbi_score0 = self._null_model.likelihood(s)
-            # viterbi_score0 = self._null_model.likelihood(subseq)
-            viterbi_score1 = alt_result.loglikelihood
+        for window, path, viterbi_score1, viterbi_score0 in results:
             score = viterbi_score1 - viterbi_score0
-            window = Interval(subseq.start, subseq.start + len(subseq))
-            search_results.append(
-                score, window, alt_result.path, viterbi_score1, viterbi_score0
-            )
+            if path is None or min_score is not None and score < min_score:
+                search_results.append_score(
+                    score, window, viterbi_score1, viterbi_score0
+                )
+                continue
+            search_results.append(score, window, path, viterbi_score1, viterbi_score0)
 
         return search_results
 
+    def _viterbi(
+        self,
+        sequence: SequenceABC[BaseAlphabet],
+        regions: Optional[List[Interval]],
+        min_score: Optional[float] = None,
+    ) -> Iterator[_WindowResult]:
+        """
+        Windows of a sequence with their alt path and Viterbi scores.
+
+        The frame engine only traces back the paths of windows whose log-odds
+        score is at least `min_score`.
+        """
+        self._set_target_length_model(len(sequence))
+
+        parts: List[Tuple[int, SequenceABC[BaseAlphabet]]] = [(0, sequence)]
+        if regions is not None:
+            data = bytes(sequence)
+            parts = [
+                (r.start, self.create_sequence(data[r.start : r.stop])) for r in regions
+            ]
+
+        target_key: Optional[Hashable] = None
+        if self._null_key is not None:
+            digest = blake2b(bytes(sequence), digest_size=16).digest()
+            target_key = (self._null_key, digest, len(sequence))
+
+        for offset, part in parts:
+            if self._frame is not None:
+                codes = self._frame.encode(bytes(part))
+                if not np.any(codes >= 4):
+                    special_trans = self._special_transitions(len(sequence))
+                    yield from self._frame_viterbi(
+                        offset, codes, special_trans, min_score
+                    )
+                    continue
+
+            alt_results = self._alt_model.viterbi(part, self.window_length)
+            for alt_result in alt_results:
+                subseq = alt_result.sequence
+                start = offset + subseq.start
+                window = Interval(start, start + len(subseq))
+                viterbi_score0 = self._null_likelihood(subseq, target_key, window)
+                yield window, alt_result.path, alt_result.loglikelihood, viterbi_score0
+
+    def _frame_viterbi(
+        self,
+        offset: int,
+        codes: np.ndarray,
+        special_trans: SpecialTransitions,
+        min_score: Optional[float],
+    ) -> Iterator[_WindowResult]:
+        frame = self._frame
+        assert frame is not None
+        frame.set_special_transitions(special_trans)
+
+        for start, stop in plan7_windows(len(codes), self.window_length):
+            window = Interval(offset + start, offset + stop)
+            window_codes = codes[start:stop]
+            viterbi_score0 = self._frame_null_score(window_codes, special_trans)
+
+            result = frame.viterbi(window_codes, min_score is None)
+            if result.steps is None:
+                assert min_score is not None
+                if result.score - viterbi_score0 < min_score:
+                    yield window, None, result.score, viterbi_score0
+                    continue
+                result = frame.viterbi(window_codes)
+
+            path = self._frame_path(result.steps)
+            yield window, path, result.score, viterbi_score0
+
+    def _frame_null_score(
+        self, codes: np.ndarray, special_trans: SpecialTransitions
+    ) -> float:
+        """
+        Null Viterbi score of a window, whose R state emits one base per step.
+        """
+        assert self._frame_null is not None
+        emission = float(self._frame_null[codes].sum())
+        return emission + (len(codes) - 1) * special_trans.RR
+
+    def _frame_path(self, steps: List[Tuple[int, int, int]]) -> Path[ProteinStep]:
+        """
+        Path of `imm` steps from the steps of a frame result.
+        """
+        if self._frame_states is None:
+            sn = self._alt_model.special_node
+            self._frame_states = [sn.S, sn.N, sn.B, sn.E, sn.J, sn.C, sn.T]
+        special = self._frame_states
+        nodes = self._alt_model.core_nodes()
+
+        imm_steps: List[ProteinStep] = []
+        for kind, k, span in steps:
+            if kind < len(special):
+                state = special[kind]
+            else:
+                # Kinds M, I and D follow the special ones.
+                node = nodes[k]
+                state = (node.M, node.I, node.D)[kind - len(special)]
+            imm_steps.append(Step.create(state, span))
+        return Path.create(imm_steps)
+
+    def _create_frame_viterbi(self) -> FrameViterbi:
+        """
+        Frame engine of the model, with the transitions of its `imm` HMM.
+        """
+        alt = self._alt_model
+        hmm = alt.hmm
+        nodes = alt.core_nodes()
+        sn = alt.special_node
+
+        core_trans: List[Transitions] = []
+        for prev, next in zip(nodes[:-1], nodes[1:]):
+            t = Transitions(
+                MM=hmm.transition(prev.M, next.M),
+                MI=hmm.transition(prev.M, prev.I),
+                MD=hmm.transition(prev.M, next.D),
+                IM=hmm.transition(prev.I, next.M),
+                II=hmm.transition(prev.I, prev.I),
+                DM=hmm.transition(prev.D, next.M),
+                DD=hmm.transition(prev.D, next.D),
+            )
+            core_trans.append(t)
+        entry = [hmm.transition(sn.B, node.M) for node in nodes]
+
+        abc = self.alphabet
+        if self._kmer_tables is None:
+            states = [node.M for node in nodes] + [node.I for node in nodes]
+            states += [sn.N, sn.J, sn.C]
+            self._kmer_tables = np.array([kmer_emissions(s, abc) for s in states])
+        tables = self._kmer_tables
+        M = len(nodes)
+        match, insert, special = tables[:M], tables[M : 2 * M], tables[2 * M :]
+
+        null_abc = self._null_model.hmm.alphabet
+        R = self._null_model.state
+        self._frame_null = np.array(
+            [R.lprob(Sequence.create(bytes([b]), null_abc)) for b in abc.symbols]
+        )
+        return FrameViterbi(abc, match, insert, special, core_trans, entry)
+
+    def _null_likelihood(
+        self,
+        subseq: SequenceABC[BaseAlphabet],
+        target_key: Optional[Hashable],
+        window: Interval,
+    ) -> float:
+        key = None
+        if target_key is not None:
+            key = (target_key, window.start, window.stop)
+            score = self._null_cache.get(key)
+            if score is not None:
+                return score
+
+        # TODO: temporary fix for reading from binary file
+        # and consequently alt and null model having different alphabets
+        s = Sequence.create(bytes(subseq), self._null_model.hmm.alphabet)
+        score = self._null_model.likelihood(s)
+        # score = self._null_model.likelihood(subseq)
+
+        if key is not None:
+            self._null_cache.put(key, score)
+        return score
+
 
 def create_profile(
     hmm: HMMERModel,
     base_abc: BaseAlphabet,
     window_length: int = 0,
     epsilon: float = 0.1,
+    gencode: Optional[GeneticCode] = None,
+    engine: str = "imm",
+    kmer_tables: bool = False,
 ) -> ProteinProfile:
 
     amino_abc = hmm.alphabet
 
     lprobs = lprob_normalize(hmm.insert_lprobs(0))
     null_aminot = AminoTable.create(amino_abc, lprobs)
-    factory = ProteinStateFactory(CodonTable(base_abc, amino_abc), epsilon)
+    gcode = CodonTable(base_abc, amino_abc, gencode)
+    factory = ProteinStateFactory(gcode, epsilon)
 
     nodes: List[ProteinNode] = []
+    aminots: List[Tuple[AminoTable, AminoTable]] = []
     for m in range(1, hmm.model_length + 1):
         lprobs = lprob_normalize(hmm.match_lprobs(m))
-        M = factory.create(f"M{m}".encode(), AminoTable.create(amino_abc, lprobs))
+        match_aminot = AminoTable.create(amino_abc, lprobs)
+        M = factory.create(f"M{m}".encode(), match_aminot)
 
         lprobs = lprob_normalize(hmm.insert_lprobs(m))
-        I = factory.create(f"I{m}".encode(), AminoTable.create(amino_abc, lprobs))
+        insert_aminot = AminoTable.create(amino_abc, lprobs)
+        I = factory.create(f"I{m}".encode(), insert_aminot)
+        aminots.append((match_aminot, insert_aminot))
 
         D = MuteState.create(f"D{m}".encode(), base_abc)
 
@@ -184,6 +564,9 @@ def create_profile(
         profid, factory, null_aminot, nodes, trans, EntryDistr.UNIFORM
     )
     prof.window_length = window_length
+    if kmer_tables or engine == "numpy":
+        prof.kmer_tables = _create_kmer_tables(factory, aminots, null_aminot)
+    prof.engine = engine
     return prof
 
 
@@ -192,6 +575,9 @@ def create_profile2(
     base_abc: BaseAlphabet,
     window_length: int = 0,
     epsilon: float = 0.1,
+    gencode: Optional[GeneticCode] = None,
+    engine: str = "imm",
+    kmer_tables: bool = False,
 ) -> ProteinProfile:
 
     amino_abc = hmm.alphabet
@@ -200,16 +586,19 @@ def create_profile2(
     null_log_odds = [0.0] * len(null_lprobs)
 
     null_aminot = AminoTable.create(amino_abc, null_lprobs)
-    factory = ProteinStateFactory(CodonTable(base_abc, amino_abc), epsilon)
+    gcode = CodonTable(base_abc, amino_abc, gencode)
+    factory = ProteinStateFactory(gcode, epsilon)
 
     nodes: List[ProteinNode] = []
+    aminots: List[Tuple[AminoTable, AminoTable]] = []
     for m in range(1, hmm.model_length + 1):
         lodds = [v0 - v1 for v0, v1 in zip(hmm.match_lprobs(m), null_lprobs)]
-        M = factory.create(f"M{m}".encode(), AminoTable.create(amino_abc, lodds))
+        match_aminot = AminoTable.create(amino_abc, lodds)
+        M = factory.create(f"M{m}".encode(), match_aminot)
 
-        I = factory.create(
-            f"I{m}".encode(), AminoTable.create(amino_abc, null_log_odds)
-        )
+        insert_aminot = AminoTable.create(amino_abc, null_log_odds)
+        I = factory.create(f"I{m}".encode(), insert_aminot)
+        aminots.append((match_aminot, insert_aminot))
 
         D = MuteState.create(f"D{m}".encode(), base_abc)
 
@@ -223,24 +612,85 @@ def create_profile2(
         profid, factory, null_aminot, nodes, trans, entry_distr
     )
     prof.window_length = window_length
+    if kmer_tables or engine == "numpy":
+        prof.kmer_tables = _create_kmer_tables(factory, aminots, null_aminot)
+    prof.engine = engine
     return prof
 
 
+def _create_kmer_tables(
+    factory: ProteinStateFactory,
+    aminots: List[Tuple[AminoTable, AminoTable]],
+    null_aminot: AminoTable,
+) -> np.ndarray:
+    """
+    K-mer tables of a profile, in :attr:`ProteinProfile.kmer_tables` order.
+    """
+    tables = [factory.kmer_emissions(match) for match, _ in aminots]
+    tables += [factory.kmer_emissions(insert) for _, insert in aminots]
+    tables += [factory.kmer_emissions(null_aminot)] * 3
+    return np.array(tables)
+
+
 class ProteinStateFactory:
     def __init__(
         self,
         gcode: CodonTable,
         epsilon: float,
+        cache: Optional[FrameTableCache] = None,
     ):
         self._gcode = gcode
         self._epsilon = epsilon
+        self._cache = _shared_table_cache if cache is None else cache
+        self._incidences: Dict[bytes, _CodonIncidence] = {}
+        self._kmer_tables: Dict[Hashable, np.ndarray] = {}
 
     def create(self, name: bytes, aminot: AminoTable) -> FrameState:
-        codonp = _create_codon_prob(aminot, self._gcode)
-        baset = _create_base_table(codonp)
-        codont = nmm.CodonTable.create(codonp)
+        # Tables are bound to the base alphabet object they were created with.
+        # The cached entry holds a reference to it, so its id cannot be reused
+        # while the entry is alive.
+        base_abc = self._gcode.base_alphabet
+        key = (_aminot_key(aminot, self._gcode), id(base_abc))
+        tables = self._cache.get(key)
+        if tables is None:
+            incidence = self._incidence(aminot.alphabet.symbols)
+            baset, codonp = _create_tables(aminot, self._gcode, incidence)
+            tables = (base_abc, baset, nmm.CodonTable.create(codonp))
+            self._cache.put(key, tables)
+        _, baset, codont = tables
         return FrameState.create(name, baset, codont, self._epsilon)
 
+    def kmer_emissions(self, aminot: AminoTable) -> np.ndarray:
+        """
+        Log-probabilities of a state created with `aminot` emitting each
+        k-mer, as given by :func:`iseq.protein.kmer_emissions`.
+
+        Tables are computed once per amino acid table content, so that the
+        insert and special states sharing a background table share one.
+        """
+        key = _aminot_key(aminot, self._gcode)
+        table = self._kmer_tables.get(key, None)
+        if table is None:
+            state = self.create(b"K", aminot)
+            table = kmer_emissions(state, self._gcode.base_alphabet)
+            self._kmer_tables[key] = table
+        return table
+
+    def _incidence(self, amino_symbols: bytes) -> _CodonIncidence:
+        if amino_symbols not in self._incidences:
+            incidence = _CodonIncidence(self._gcode, amino_symbols)
+            self._incidences[amino_symbols] = incidence
+        return self._incidences[amino_symbols]
+
+    @property
+    def cache(self) -> FrameTableCache:
+        """
+        Base and codon tables shared by states of the same amino acid table.
+
+        Every factory shares a process-wide cache by default.
+        """
+        return self._cache
+
     @property
     def genetic_code(self) -> CodonTable:
         return self._gcode
@@ -250,40 +700,86 @@ class ProteinStateFactory:
         return self._epsilon
 
 
-def _create_base_table(codonp: CodonProb):
-    base_abc = codonp.alphabet
-    base_lprob = {base: lprob_zero() for base in base_abc.symbols}
-    norm = log(3)
-    for codon in codon_iter(base_abc):
-        lprob = codonp.get_lprob(codon)
-        triplet = codon.symbols
-
-        base_lprob[triplet[0]] = lprob_add(base_lprob[triplet[0]], lprob - norm)
-        base_lprob[triplet[1]] = lprob_add(base_lprob[triplet[1]], lprob - norm)
-        base_lprob[triplet[2]] = lprob_add(base_lprob[triplet[2]], lprob - norm)
-
-    return BaseTable.create(base_abc, [base_lprob[base] for base in base_abc.symbols])
+def _aminot_key(aminot: AminoTable, gcode: CodonTable) -> Hashable:
+    symbols = aminot.alphabet.symbols
+    lprobs = tuple(aminot.lprob(symbols[i : i + 1]) for i in range(len(symbols)))
+    return (symbols, lprobs, alphabet_name(gcode.base_alphabet), gcode.gencode.id)
+
+
+class _CodonIncidence:
+    """
+    Amino acid → codon and codon → base incidences of a genetic code.
+
+    Parameters
+    ----------
+    gcode
+        Genetic code.
+    amino_symbols
+        Symbols of the amino acid tables the incidences will be applied to.
+    """
+
+    def __init__(self, gcode: CodonTable, amino_symbols: bytes):
+        self._codons: List[Codon] = []
+        amino_idx: List[int] = []
+        log_degen: List[float] = []
+        for i in range(len(amino_symbols)):
+            codons = gcode.codons(amino_symbols[i : i + 1])
+            for codon in codons:
+                self._codons.append(codon)
+                amino_idx.append(i)
+                log_degen.append(log(len(codons)))
+        self._amino_idx = np.array(amino_idx, dtype=int)
+        self._log_degen = np.array(log_degen)
+
+        base_symbols = gcode.base_alphabet.symbols
+        counts = np.zeros((len(base_symbols), len(self._codons)))
+        for j, codon in enumerate(self._codons):
+            for base in codon.symbols:
+                counts[base_symbols.index(base), j] += 1
+        with np.errstate(divide="ignore"):
+            self._log_counts = np.log(counts)
 
+    @property
+    def codons(self) -> List[Codon]:
+        return self._codons
+
+    def codon_lprobs(self, amino_lprobs: np.ndarray) -> np.ndarray:
+        """
+        Normalized codon log-probabilities, in `codons` order.
+
+        The probability of an amino acid is evenly split among its codons.
+        """
+        lprobs = amino_lprobs[self._amino_idx] - self._log_degen
+        return lprobs - _logsumexp(lprobs)
+
+    def base_lprobs(self, codon_lprobs: np.ndarray) -> np.ndarray:
+        """
+        Base log-probabilities, in base alphabet order, of a random codon position.
+        """
+        return _logsumexp(self._log_counts + codon_lprobs, axis=1) - log(3)
+
+
+def _logsumexp(x: np.ndarray, axis=None):
+    xmax = np.max(x, axis=axis, keepdims=True)
+    xmax[~np.isfinite(xmax)] = 0.0
+    with np.errstate(divide="ignore"):
+        r = np.log(np.sum(np.exp(x - xmax), axis=axis, keepdims=True)) + xmax
+    return np.squeeze(r, axis=axis) if axis is not None else r.item()
+
+
+def _create_tables(
+    aminot: AminoTable, gencode: CodonTable, incidence: _CodonIncidence
+) -> Tuple[BaseTable, CodonProb]:
+    symbols = aminot.alphabet.symbols
+    amino_lprobs = np.array(
+        [aminot.lprob(symbols[i : i + 1]) for i in range(len(symbols))]
+    )
 
-def _create_codon_prob(aminot: AminoTable, gencode: CodonTable) -> CodonProb:
+    codon_lprobs = incidence.codon_lprobs(amino_lprobs)
     codonp = CodonProb.create(gencode.base_alphabet)
+    for codon, lprob in zip(incidence.codons, codon_lprobs.tolist()):
+        codonp.set_lprob(codon, lprob)
 
-    codon_lprobs = []
-    lprob_norm = lprob_zero()
-    for i in range(len(aminot.alphabet.symbols)):
-        aa = aminot.alphabet.symbols[i : i + 1]
-        lprob = aminot.lprob(aa)
-
-        codons = gencode.codons(aa)
-        if len(codons) == 0:
-            continue
-
-        norm = log(len(codons))
-        for codon in codons:
-            codon_lprobs.append((codon, lprob - norm))
-            lprob_norm = lprob_add(lprob_norm, codon_lprobs[-1][1])
-
-    for codon, lprob in codon_lprobs:
-        codonp.set_lprob(codon, lprob - lprob_norm)
-
-    return codonp
+    base_lprobs = incidence.base_lprobs(codon_lprobs)
+    baset = BaseTable.create(gencode.base_alphabet, base_lprobs.tolist())
+    return baset, codonp
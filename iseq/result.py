@@ -1,24 +1,37 @@
 from __future__ import annotations
 
 from dataclasses import astuple, dataclass
-from typing import Callable, Generic, Iterable, List, NamedTuple, Tuple, TypeVar
+from math import log, nan
+from typing import (
+    Callable,
+    Generic,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    TypeVar,
+)
 
 from imm import Alphabet, Interval, Path, SequenceABC, State, Step
 
 from .fragment import Fragment
 
-__all__ = ["SearchResults", "SearchResult", "create_fragment_type"]
+__all__ = ["SearchResults", "SearchResult", "WindowScore", "create_fragment_type"]
 
 A = TypeVar("A", bound=Alphabet)
 S = TypeVar("S", bound=State)
 
 create_fragment_type = Callable[[SequenceABC[A], S, bool], Fragment[A, S]]
+e_value_type = Callable[[float], float]
 
 
 @dataclass
 class IFragment(Generic[A, S]):
     interval: Interval
     fragment: Fragment[A, S]
+    bit_score: float = nan
+    e_value: float = nan
 
     def __iter__(self):
         yield from astuple(self)
@@ -34,17 +47,30 @@ DebugRow = NamedTuple(
     ],
 )
 
+WindowScore = NamedTuple(
+    "WindowScore",
+    [
+        ("window", Interval),
+        ("loglikelihood", float),
+        ("alt_viterbi_score", float),
+        ("null_viterbi_score", float),
+    ],
+)
+
 
 class SearchResults(Generic[A, S]):
     def __init__(
         self,
         sequence: SequenceABC[A],
         create_fragment: create_fragment_type,
+        e_value: Optional[e_value_type] = None,
     ):
         self._sequence = sequence
         self._create_fragment = create_fragment
+        self._e_value = e_value
         self._results: List[SearchResult[A, S]] = []
         self._windows: List[Interval] = []
+        self._scores: List[WindowScore] = []
 
     def append(
         self,
@@ -55,6 +81,9 @@ class SearchResults(Generic[A, S]):
         null_viterbi_score: float,
     ):
         subseq = self._sequence[window.start : window.stop]
+        e_value = nan
+        if self._e_value is not None:
+            e_value = self._e_value(loglik)
         r = SearchResult[A, S](
             loglik,
             subseq,
@@ -62,9 +91,27 @@ class SearchResults(Generic[A, S]):
             self._create_fragment,
             alt_viterbi_score,
             null_viterbi_score,
+            e_value,
         )
         self._results.append(r)
         self._windows.append(window)
+        self._scores.append(
+            WindowScore(window, loglik, alt_viterbi_score, null_viterbi_score)
+        )
+
+    def append_score(
+        self,
+        loglik: float,
+        window: Interval,
+        alt_viterbi_score: float,
+        null_viterbi_score: float,
+    ):
+        """
+        Record the scores of a window without building its result.
+        """
+        self._scores.append(
+            WindowScore(window, loglik, alt_viterbi_score, null_viterbi_score)
+        )
 
     @property
     def results(self) -> List[SearchResult[A, S]]:
@@ -74,22 +121,27 @@ class SearchResults(Generic[A, S]):
     def windows(self) -> List[Interval]:
         return self._windows
 
+    @property
+    def scores(self) -> List[WindowScore]:
+        """
+        Scores of every window, including those without a result.
+        """
+        return self._scores
+
     @property
     def length(self) -> int:
         return len(self._results)
 
     def debug_table(self) -> List[DebugRow]:
-        windows = self.windows
-        results = self.results
         rows: List[DebugRow] = []
-        for win_num, (window, result) in enumerate(zip(windows, results)):
+        for win_num, score in enumerate(self._scores):
 
             rows.append(
                 DebugRow(
                     win_num,
-                    window,
-                    result.alt_viterbi_score,
-                    result.null_viterbi_score,
+                    score.window,
+                    score.alt_viterbi_score,
+                    score.null_viterbi_score,
                 )
             )
 
@@ -105,12 +157,16 @@ class SearchResults(Generic[A, S]):
 
             candidates: List[IFragment[A, S]] = []
 
-            for i, frag in zip(result.intervals, result.fragments):
-                if not frag.homologous:
+            for k, (i, homologous) in enumerate(
+                zip(result.intervals, result.homologies)
+            ):
+                if not homologous:
                     continue
 
+                frag = result.fragment(k)
                 interval = Interval(window.start + i.start, window.start + i.stop)
-                candidates.append(IFragment(interval, frag))
+                ifrag = IFragment(interval, frag, result.bit_score, result.e_value)
+                candidates.append(ifrag)
 
             ready, waiting = intersect_ifragments(waiting, candidates)
             ifragments.extend(ready)
@@ -127,6 +183,15 @@ class SearchResults(Generic[A, S]):
 
 
 class SearchResult(Generic[A, S]):
+    """
+    Alignment of a window against a profile.
+
+    Fragment intervals are found once, from the path, whose steps are listed
+    up front as the path may not outlive the results it came from. Fragments
+    themselves are only built when accessed, as most of them are not
+    homologous and are never looked at.
+    """
+
     def __init__(
         self,
         loglik: float,
@@ -135,22 +200,18 @@ class SearchResult(Generic[A, S]):
         create_fragment: create_fragment_type,
         alt_viterbi_score: float,
         null_viterbi_score: float,
+        e_value: float = nan,
     ):
         self._loglik = loglik
-        self._fragments: List[Fragment[A, S]] = []
-        self._intervals: List[Interval] = []
+        self._e_value = e_value
+        self._sequence = sequence
+        self._create_fragment = create_fragment
         self._alt_viterbi_score = alt_viterbi_score
         self._null_viterbi_score = null_viterbi_score
 
-        steps = list(path)
-        for fragi, stepi, homologous in create_fragments(path):
-            substeps = steps[stepi.start : stepi.stop]
-            new_steps = [Step.create(s.state, s.seq_len) for s in substeps]
-            new_path = Path.create(new_steps)
-            seq = sequence[fragi]
-            frag = create_fragment(seq, new_path, homologous)
-            self._fragments.append(frag)
-            self._intervals.append(fragi)
+        self._steps: List[Step] = list(path)
+        self._spans = list(create_fragments(path))
+        self._fragments: List[Optional[Fragment[A, S]]] = [None] * len(self._spans)
 
     @property
     def alt_viterbi_score(self) -> float:
@@ -160,20 +221,50 @@ class SearchResult(Generic[A, S]):
     def null_viterbi_score(self) -> float:
         return self._null_viterbi_score
 
+    def fragment(self, idx: int) -> Fragment[A, S]:
+        """
+        Fragment at position `idx`, built on first access.
+        """
+        frag = self._fragments[idx]
+        if frag is None:
+            fragi, stepi, homologous = self._spans[idx]
+            substeps = self._steps[stepi.start : stepi.stop]
+            new_steps = [Step.create(s.state, s.seq_len) for s in substeps]
+            new_path = Path.create(new_steps)
+            seq = self._sequence[fragi]
+            frag = self._create_fragment(seq, new_path, homologous)
+            self._fragments[idx] = frag
+        return frag
+
     @property
     def fragments(self) -> List[Fragment[A, S]]:
-        return self._fragments
+        return [self.fragment(i) for i in range(len(self._spans))]
 
     @property
     def intervals(self) -> List[Interval]:
-        return self._intervals
+        return [fragi for fragi, _, _ in self._spans]
+
+    @property
+    def homologies(self) -> List[bool]:
+        """
+        Homology of each fragment.
+        """
+        return [homologous for _, _, homologous in self._spans]
 
     @property
     def loglikelihood(self) -> float:
         return self._loglik
 
+    @property
+    def bit_score(self) -> float:
+        return self._loglik / log(2)
+
+    @property
+    def e_value(self) -> float:
+        return self._e_value
+
     def __str__(self) -> str:
-        return f"{str(self.loglikelihood)},{str(self._fragments)}"
+        return f"{str(self.loglikelihood)},{str(self.fragments)}"
 
     def __repr__(self) -> str:
         return f"<{self.__class__.__name__}:{str(self)}>"
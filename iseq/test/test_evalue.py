@@ -0,0 +1,32 @@
+from math import exp, log
+
+from assertpy import assert_that
+from hmmer_reader import open_hmmer
+
+from iseq.evalue import EValue, create_evalue
+from iseq.example import example_filepath
+from iseq.hmmer_model import HMMERModel, ScoreStats
+
+
+def test_evalue():
+    evalue = EValue(ScoreStats(-11.3811, 0.70785), db_size=10)
+    score = -11.3811 * log(2)
+    assert_that(evalue.p_value(score)).is_close_to(1 - exp(-1), 1e-12)
+    assert_that(evalue(score)).is_close_to(10 * (1 - exp(-1)), 1e-12)
+    assert evalue(100.0) < evalue(50.0) < evalue(10.0)
+    assert evalue.p_value(-1e6) == 1.0
+
+
+def test_evalue_from_model():
+    filepath = example_filepath("PF03373.hmm")
+    with open_hmmer(filepath) as reader:
+        hmm = HMMERModel(reader.read_model())
+
+    stats = hmm.local_stats("VITERBI")
+    assert stats is not None
+    assert hmm.local_stats("MSV") is not None
+    assert hmm.local_stats("FORWARD") is not None
+
+    evalue = create_evalue(hmm, db_size=2)
+    assert evalue.stats == stats
+    assert evalue.db_size == 2
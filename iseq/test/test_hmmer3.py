@@ -1,11 +1,15 @@
 import os
+from time import perf_counter
 
+import numpy as np
+import pytest
 from fasta_reader import read_fasta
 from hmmer_reader import open_hmmer
 from imm import Sequence
 from imm.testing import assert_allclose
 from numpy.testing import assert_equal
 
+import iseq.profile
 from iseq.example import example_filepath
 from iseq.hmmer3 import create_profile
 from iseq.hmmer_model import HMMERModel
@@ -260,3 +264,111 @@ def test_hmmer3_profile_window():
     assert_equal(bytes(frags[0].sequence), b"PGKEDNNK")
     assert_equal(frags[1].homologous, False)
     assert_equal(bytes(frags[1].sequence), b"EEEE")
+
+
+def test_hmmer3_profile_target_length_cache():
+    filepath = example_filepath("PF03373.hmm")
+    with open_hmmer(filepath) as reader:
+        hmmdata = HMMERModel(reader.read_model())
+
+    hmmer = create_profile(hmmdata, entry_distr=EntryDistr.UNIFORM)
+
+    alphabet = hmmer.alphabet
+    short_seq = Sequence.create(b"PGKEDNNK", alphabet)
+    long_seq = Sequence.create(b"AAAPGKEDNNKAAA", alphabet)
+
+    r0 = hmmer.search(short_seq).results[0]
+    r1 = hmmer.search(long_seq).results[0]
+    assert_allclose(hmmer.search(short_seq).results[0].loglikelihood, r0.loglikelihood)
+    assert_allclose(hmmer.search(long_seq).results[0].loglikelihood, r1.loglikelihood)
+    assert_allclose(r0.loglikelihood, 13.39978964458627)
+
+    hmmer.target_length_bucket = 16
+    r2 = hmmer.search(short_seq).results[0]
+    hmmer.search(long_seq)
+    assert_allclose(hmmer.search(short_seq).results[0].loglikelihood, r2.loglikelihood)
+    assert r2.loglikelihood != r0.loglikelihood
+
+    hmmer.target_length_bucket = 0
+    assert_allclose(hmmer.search(short_seq).results[0].loglikelihood, r0.loglikelihood)
+
+
+def test_hmmer3_profile_search_batch():
+    filepath = example_filepath("PF03373.hmm")
+    with open_hmmer(filepath) as reader:
+        hmmdata = HMMERModel(reader.read_model())
+
+    seqs = [
+        b"PPPPGKEDNNKDDDPGKEDNNKEEEE",
+        b"PGKEDNNK",
+        b"AAAPGKEDNNKAAA",
+        b"P",
+        b"EEEEEEEEEE",
+    ]
+    for engine in ["imm", "numpy"]:
+        hmmer = create_profile(
+            hmmdata, entry_distr=EntryDistr.UNIFORM, window_length=15, engine=engine
+        )
+        targets = [Sequence.create(seq, hmmer.alphabet) for seq in seqs]
+        for min_score in [None, 5.0]:
+            batch = hmmer.search_batch(targets, min_score)
+            assert_equal(len(batch), len(targets))
+            for target, r in zip(targets, batch):
+                expected = hmmer.search(target, min_score)
+                assert_equal(r.windows, expected.windows)
+                assert_allclose(
+                    [s.loglikelihood for s in r.scores],
+                    [s.loglikelihood for s in expected.scores],
+                )
+                assert_equal(len(r.results), len(expected.results))
+                for a, b in zip(r.results, expected.results):
+                    assert_allclose(a.loglikelihood, b.loglikelihood)
+                    assert_equal(a.intervals, b.intervals)
+
+
+def test_hmmer3_profile_search_after_eviction(monkeypatch):
+    monkeypatch.setattr(iseq.profile, "_SPECIAL_TRANS_CACHE_SIZE", 2)
+    filepath = example_filepath("PF03373.hmm")
+    with open_hmmer(filepath) as reader:
+        hmmdata = HMMERModel(reader.read_model())
+
+    hmmer = create_profile(hmmdata, engine="numpy")
+    target = Sequence.create(b"AAAPGKEDNNKAAA", hmmer.alphabet)
+    expected = hmmer.search(target)
+
+    # Other target lengths evict the one the models are set to.
+    others = [Sequence.create(b"P" * n, hmmer.alphabet) for n in [3, 4, 5]]
+    hmmer.search_batch(others)
+
+    r = hmmer.search(target)
+    assert_allclose(
+        [s.loglikelihood for s in r.scores],
+        [s.loglikelihood for s in expected.scores],
+    )
+
+
+@pytest.mark.slow
+def test_hmmer3_profile_search_batch_throughput():
+    filepath = example_filepath("2OG-FeII_Oxy_3-nt.hmm")
+    with open_hmmer(filepath) as reader:
+        hmmdata = HMMERModel(reader.read_model())
+
+    hmmer = create_profile(hmmdata, engine="numpy")
+    random = np.random.RandomState(0)
+    targets = []
+    for _ in range(500):
+        size = random.randint(150, 301)
+        seq = bytes(random.choice(list(b"ACGT"), size).tolist())
+        targets.append(Sequence.create(seq, hmmer.alphabet))
+
+    start = perf_counter()
+    expected = [hmmer.search(target, np.inf) for target in targets]
+    single = len(targets) / (perf_counter() - start)
+
+    start = perf_counter()
+    batch = hmmer.search_batch(targets, np.inf)
+    batched = len(targets) / (perf_counter() - start)
+
+    print(f"search: {single:.0f} reads/s, search_batch: {batched:.0f} reads/s")
+    for r, e in zip(batch, expected):
+        assert_allclose(r.scores[0].loglikelihood, e.scores[0].loglikelihood)
@@ -113,6 +113,31 @@ def test_hmmer3_viterbi_amino_scores_compat():
         assert_allclose(actual_scores, iseq_scores)
 
 
+def test_hmmer3_viterbi_numpy_engine_compat():
+    for name in ["2OG-FeII_Oxy_3", "2OG-FeII_Oxy_3-nt"]:
+        hmmprof = open_hmmer(example_filepath(f"{name}.hmm")).read_model()
+        hmm = HMMERModel(hmmprof)
+        prof = create_profile(hmm, hmmer3_compat=True)
+        nprof = create_profile(hmm, hmmer3_compat=True, engine="numpy")
+        assert nprof.engine == "numpy"
+        for align in ["local", "unilocal", "glocal", "uniglocal"]:
+            iseq_scores = loadtxt(
+                example_filepath(f"iseq_{name}_{align}.fasta.viterbi")
+            )
+
+            actual_scores = []
+            with read_fasta(example_filepath(f"{name}_{align}.fasta")) as fasta:
+                for target in fasta:
+                    seq = Sequence.create(target.sequence.encode(), prof.alphabet)
+                    r = prof.search(seq).results[0]
+                    nr = nprof.search(seq).results[0]
+                    assert_allclose(nr.loglikelihood, r.loglikelihood)
+                    assert nr.intervals == r.intervals
+                    actual_scores.append(nr.alt_viterbi_score)
+
+            assert_allclose(actual_scores, iseq_scores)
+
+
 def loadtxt(filepath: Path):
     arr = []
     with open(filepath, "r") as file:
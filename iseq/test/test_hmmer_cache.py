@@ -0,0 +1,55 @@
+import os
+import pickle
+import shutil
+from pathlib import Path
+
+from hmmer_reader import open_hmmer
+from numpy.testing import assert_allclose, assert_equal
+
+from iseq.example import example_filepath
+from iseq.hmmer_cache import cache_filepath, iter_hmmer_models, open_hmmer_cache
+from iseq.hmmer_model import HMMERModel
+
+
+def test_hmmer_model_arrays():
+    filepath = example_filepath("PF03373.hmm")
+    with open_hmmer(filepath) as reader:
+        hmm = HMMERModel(reader.read_model())
+
+    M = hmm.model_length
+    K = hmm.alphabet.length
+    assert hmm.match_table.shape == (M, K)
+    assert hmm.insert_table.shape == (M, K)
+    assert hmm.transition_table.shape == (M + 1, 7)
+    assert_equal(hmm.match_lprobs(1), hmm.match_table[0].tolist())
+    assert len(hmm.transitions) == M + 1
+
+    other = pickle.loads(pickle.dumps(hmm))
+    assert_equal(other.match_table, hmm.match_table)
+    assert other.model_id == hmm.model_id
+
+
+def test_hmmer_cache(tmp_path: Path):
+    filepath = tmp_path / "PF03373.hmm"
+    shutil.copyfile(example_filepath("PF03373.hmm"), filepath)
+
+    hmms = list(iter_hmmer_models(filepath))
+    cache = open_hmmer_cache(filepath)
+    assert cache_filepath(filepath).exists()
+    assert len(cache) == len(hmms) == 1
+
+    for hmm, cached in zip(hmms, cache):
+        assert cached.model_id == hmm.model_id
+        assert cached.model_length == hmm.model_length
+        assert cached.gathering_cutoff == hmm.gathering_cutoff
+        assert cached.local_stats("VITERBI") == hmm.local_stats("VITERBI")
+        assert_allclose(cached.match_table, hmm.match_table)
+        assert_allclose(cached.insert_table, hmm.insert_table)
+        assert_allclose(cached.transition_table, hmm.transition_table)
+        assert_equal(cached.null_lprobs, hmm.null_lprobs)
+
+    mtime_ns = cache.source_mtime_ns + 1_000_000_000
+    os.utime(filepath, ns=(mtime_ns, mtime_ns))
+    cache = open_hmmer_cache(filepath)
+    assert cache.source_mtime_ns == mtime_ns
+    assert len(list(iter_hmmer_models(filepath, use_cache=True))) == 1
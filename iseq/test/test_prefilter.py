@@ -0,0 +1,32 @@
+from hmmer_reader import open_hmmer
+
+from iseq.example import example_filepath
+from iseq.hmmer_model import HMMERModel
+from iseq.prefilter import Prefilter, PrefilterStats
+
+
+def test_prefilter_regions():
+    filepath = example_filepath("PF03373.hmm")
+    with open_hmmer(filepath) as reader:
+        hmm = HMMERModel(reader.read_model())
+
+    prefilter = Prefilter(hmm)
+    most_likely_seq = b"CCT GGT AAA GAA GAT AAT AAC AAA".replace(b" ", b"")
+    seq = b"A" * 600 + most_likely_seq + b"A" * 600
+
+    regions = prefilter.regions(seq)
+    assert len(regions) == 1
+    assert regions[0].start <= 600
+    assert regions[0].stop >= 600 + len(most_likely_seq)
+    assert regions[0].stop - regions[0].start < len(seq)
+
+    assert prefilter.regions(b"A" * len(seq)) == []
+    assert prefilter.regions(b"") == []
+
+    stats = PrefilterStats()
+    stats.update(len(seq), regions)
+    stats.update(len(seq), [])
+    assert stats.pairs == 2
+    assert stats.skipped == 1
+    assert stats.bases == 2 * len(seq)
+    assert stats.searched_bases == regions[0].stop - regions[0].start
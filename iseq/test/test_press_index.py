@@ -0,0 +1,97 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from iseq.press_index import (
+    DEFAULT_PRESS_CONFIG,
+    KMER_DTYPE,
+    PressConfig,
+    PressedEntry,
+    open_pressed_index,
+    open_pressed_kmer_tables,
+    pressed_index_filepath,
+    pressed_prefix,
+    read_press_header,
+    write_press_header,
+    write_pressed_index,
+)
+from iseq.protein import KMER_COUNT
+
+
+def _write_pressed(profile: Path, sizes):
+    for ext in [".alt", ".null"]:
+        offsets = [sum(sizes[:i]) for i in range(len(sizes))]
+        with open(str(profile) + ext, "wb") as file:
+            file.write(b"\0" * sum(sizes))
+        with open(str(profile) + ext + ".idx", "w") as file:
+            file.write("".join(f"{i}\n" for i in offsets))
+
+
+def test_pressed_index(tmp_path: Path):
+    profile = tmp_path / "db.hmm"
+    _write_pressed(profile, [10, 25, 7])
+
+    names = ["Ham", "Spam", "Eggs"]
+    accs = ["PF00001.1", "PF00002.3", "PF00003.2"]
+    digests = ["a" * 32, "b" * 32, "c" * 32]
+    write_pressed_index(profile, names, accs, [40, 120, 33], digests)
+    assert pressed_index_filepath(profile).exists()
+
+    index = open_pressed_index(profile)
+    assert len(index) == 3
+    assert index[1] == PressedEntry("Spam", "PF00002.3", 10, 25, 10, 25, 120, "b" * 32)
+    assert index.entry("PF00003.2") == index[2]
+    assert index.find("Ham") == 0
+    assert [e.alt_size for e in index] == [10, 25, 7]
+
+    with pytest.raises(KeyError):
+        index.find("Bacon")
+
+
+def test_pressed_index_from_meta(tmp_path: Path):
+    profile = tmp_path / "db.hmm"
+    _write_pressed(profile, [5, 6])
+    with open(str(profile) + ".meta", "w") as file:
+        file.write("Ham\tPF00001.1\nSpam\tPF00002.3\n")
+
+    index = open_pressed_index(profile)
+    assert index.find("PF00002.3") == 1
+    assert index[1].alt_offset == 5
+    assert index[1].model_length is None
+    assert index[1].digest == ""
+    assert not pressed_index_filepath(profile).exists()
+
+
+def test_press_header(tmp_path: Path):
+    profile = tmp_path / "db.hmm"
+    assert pressed_prefix(profile, DEFAULT_PRESS_CONFIG) == str(profile)
+
+    config = PressConfig("2", "rna", 0.1, 11)
+    prefix = pressed_prefix(profile, config)
+    assert prefix == f"{profile}.m2-rna-e0.1-gc11"
+
+    assert read_press_header(prefix) == DEFAULT_PRESS_CONFIG
+    write_press_header(prefix, config)
+    assert read_press_header(prefix) == config
+
+
+def test_pressed_kmer_tables(tmp_path: Path):
+    profile = tmp_path / "db.hmm"
+    assert open_pressed_kmer_tables(profile) is None
+
+    tables = [np.arange(n * KMER_COUNT, dtype=float).reshape(n, -1) for n in [5, 9]]
+    offsets = []
+    with open(str(profile) + ".kmer", "wb") as file:
+        for t in tables:
+            offsets.append(file.tell())
+            file.write(t.astype(KMER_DTYPE).tobytes())
+    with open(str(profile) + ".kmer.idx", "w") as file:
+        file.write("".join(f"{i}\n" for i in offsets))
+
+    kmer_tables = open_pressed_kmer_tables(profile)
+    assert kmer_tables is not None
+    assert len(kmer_tables) == 2
+    for i, t in enumerate(tables):
+        assert kmer_tables[i].shape == t.shape
+        assert np.array_equal(kmer_tables[i], t)
@@ -1,12 +1,25 @@
+from math import log
+from time import perf_counter
+
+import numpy as np
+import pytest
 from hmmer_reader import open_hmmer
 from imm import Sequence
 from imm.testing import assert_allclose
-from nmm import IUPACAminoAlphabet, RNAAlphabet
+from nmm import AminoTable, DNAAlphabet, IUPACAminoAlphabet, RNAAlphabet
 
 from iseq.codon_table import CodonTable
 from iseq.example import example_filepath
 from iseq.hmmer_model import HMMERModel
-from iseq.protein import create_profile
+from iseq.protein import (
+    KMER_COUNT,
+    FrameTableCache,
+    NullScoreCache,
+    create_profile,
+    create_profile2,
+)
+from iseq.protein._frame import kmer_emissions
+from iseq.protein._profile import ProteinStateFactory
 
 
 def test_protein_profile_frame1():
@@ -235,3 +248,226 @@ def test_protein_profile_codons():
     assert str(citems[7].step) == "<M8,3>"
     assert bytes(aaitems[7].sequence) == b"K"
     assert str(aaitems[7].step) == "<M8,1>"
+
+
+def test_protein_profile_null_cache():
+    filepath = example_filepath("PF03373.hmm")
+    with open_hmmer(filepath) as reader:
+        hmm = HMMERModel(reader.read_model())
+
+    cache = NullScoreCache()
+    prof1 = create_profile2(hmm, RNAAlphabet())
+    prof2 = create_profile2(hmm, RNAAlphabet())
+    prof1.null_cache = cache
+    prof2.null_cache = cache
+
+    seq = prof1.create_sequence(b"AAAAAACCUGGUAAAGAAGAUAAUAACAAA")
+    r1 = prof1.search(seq).results[0]
+    assert cache.hits == 0
+    assert cache.misses == 1
+
+    r2 = prof2.search(seq).results[0]
+    assert cache.hits == 1
+    assert cache.misses == 1
+    assert_allclose(r1.null_viterbi_score, r2.null_viterbi_score)
+    assert_allclose(r1.loglikelihood, r2.loglikelihood)
+
+    prof3 = create_profile2(hmm, RNAAlphabet(), epsilon=0.2)
+    prof3.null_cache = cache
+    prof3.search(seq)
+    assert cache.hits == 1
+    assert cache.misses == 2
+
+
+def test_null_score_cache_eviction():
+    cache = NullScoreCache(maxsize=2)
+    cache.put("a", 1.0)
+    cache.put("b", 2.0)
+    assert cache.get("a") == 1.0
+    cache.put("c", 3.0)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1.0
+    assert cache.get("c") == 3.0
+    assert len(cache) == 2
+
+
+def test_protein_state_factory_cache():
+    amino_abc = IUPACAminoAlphabet()
+    gcode = CodonTable(RNAAlphabet(), amino_abc)
+    cache = FrameTableCache()
+    factory = ProteinStateFactory(gcode, 0.01, cache)
+
+    lprobs = [log(1 / 20)] * 20
+    I1 = factory.create(b"I1", AminoTable.create(amino_abc, lprobs))
+    I2 = factory.create(b"I2", AminoTable.create(amino_abc, lprobs))
+    assert cache.misses == 1
+    assert cache.hits == 1
+    assert I1.name == b"I1"
+    assert I2.name == b"I2"
+
+    lprobs[0] = log(0.5)
+    factory.create(b"M1", AminoTable.create(amino_abc, lprobs))
+    assert cache.misses == 2
+    assert len(cache) == 2
+
+
+def test_protein_profile_score_only():
+    filepath = example_filepath("PF03373.hmm")
+    with open_hmmer(filepath) as reader:
+        hmm = HMMERModel(reader.read_model())
+
+    prof = create_profile2(hmm, RNAAlphabet())
+    seq = prof.create_sequence(b"AAAAAACCUGGUAAAGAAGAUAAUAACAAA")
+
+    results = prof.search(seq)
+    scores = prof.score(seq)
+    assert len(scores) == len(results.results) == 1
+    assert scores[0].window == results.windows[0]
+    assert_allclose(scores[0].loglikelihood, results.results[0].loglikelihood)
+    assert_allclose(scores[0].alt_viterbi_score, results.results[0].alt_viterbi_score)
+
+    skipped = prof.search(seq, min_score=float("inf"))
+    assert skipped.length == 0
+    assert skipped.ifragments() == []
+    assert skipped.debug_table() == results.debug_table()
+
+    kept = prof.search(seq, min_score=scores[0].loglikelihood)
+    assert kept.length == 1
+
+
+def test_protein_profile_lazy_fragments():
+    filepath = example_filepath("PF03373.hmm")
+    with open_hmmer(filepath) as reader:
+        plain_model = reader.read_model()
+        hmmer = create_profile(HMMERModel(plain_model), RNAAlphabet(), epsilon=0.00001)
+
+    rna_seq = b"CCUU GGU AAA GAA GAU AAU AAC AAA GAA GAA CCU GGU AAA GAA GAU AAU AAC AAA GAA GAA GA"
+    seq = Sequence.create(rna_seq.replace(b" ", b""), hmmer.alphabet)
+
+    results = hmmer.search(seq)
+    r = results.results[0]
+    assert r.homologies == [True, False, True, False]
+    assert len(r.intervals) == 4
+
+    ifrags = results.ifragments()
+    assert len(ifrags) == 2
+    assert ifrags[0].fragment is r.fragment(0)
+    assert [frag.homologous for frag in r.fragments] == r.homologies
+    assert bytes(r.fragments[1].sequence) == b"GAAGAA"
+
+
+def test_protein_profile_numpy_engine():
+    filepath = example_filepath("PF03373.hmm")
+    with open_hmmer(filepath) as reader:
+        hmm = HMMERModel(reader.read_model())
+
+    rna_seqs = [
+        b"CCU GGU AAA GAA GAU AAU AAC AAA",
+        b"AAA AAA AAA CCU GGU AAA GAA GAU AAU AAC AAA",
+        b"AAGA AAA AAA CCU GGU AAA GAA GAU AAU AAC AAA G",
+        b"CCUU GGU AAA GAA GAU AAU AAC AAA GAA GAA CCU GGU AAA GAA GAU AAU AAC AAA GAA GAA GA",
+    ]
+    for create, epsilon, window in [
+        (create_profile, 0.1, 0),
+        (create_profile, 0.00001, 0),
+        (create_profile2, 0.01, 30),
+    ]:
+        prof = create(hmm, RNAAlphabet(), window, epsilon)
+        nprof = create(hmm, RNAAlphabet(), window, epsilon, engine="numpy")
+        assert prof.engine == "imm"
+        assert nprof.engine == "numpy"
+
+        seqs = [prof.create_sequence(s.replace(b" ", b"")) for s in rna_seqs]
+        batch = nprof.search_batch(seqs)
+        for seq, b in zip(seqs, batch):
+            for multiple_hits in [True, False]:
+                prof.multiple_hits = multiple_hits
+                nprof.multiple_hits = multiple_hits
+                r = prof.search(seq)
+                nr = nprof.search(seq)
+                assert nr.windows == r.windows
+                for x, y in zip(nr.results, r.results):
+                    assert_allclose(x.loglikelihood, y.loglikelihood)
+                    assert_allclose(x.null_viterbi_score, y.null_viterbi_score)
+                    assert x.intervals == y.intervals
+                    assert x.homologies == y.homologies
+
+            nprof.multiple_hits = True
+            r = nprof.search(seq)
+            assert b.windows == r.windows
+            for x, y in zip(b.results, r.results):
+                assert_allclose(x.loglikelihood, y.loglikelihood)
+                assert x.intervals == y.intervals
+
+
+def test_protein_profile_kmer_tables():
+    filepath = example_filepath("PF03373.hmm")
+    with open_hmmer(filepath) as reader:
+        hmm = HMMERModel(reader.read_model())
+
+    seq = b"AAGAAAAAACCUGGUAAAGAAGAUAAUAACAAAG"
+    for create in [create_profile, create_profile2]:
+        prof = create(hmm, RNAAlphabet(), 0, 0.01, kmer_tables=True)
+        assert prof.engine == "imm"
+        tables = prof.kmer_tables
+        assert tables is not None
+        assert tables.shape == (2 * hmm.model_length + 3, KMER_COUNT)
+
+        abc = prof.alphabet
+        nodes = prof.alt_model.core_nodes()
+        sn = prof.alt_model.special_node
+        M = hmm.model_length
+        for row, state in [(0, nodes[0].M), (M + 1, nodes[1].I), (-1, sn.C)]:
+            assert_allclose(tables[row], kmer_emissions(state, abc))
+
+        nprof = create(hmm, RNAAlphabet(), 0, 0.01)
+        assert nprof.kmer_tables is None
+        with pytest.raises(ValueError):
+            nprof.kmer_tables = tables[1:]
+        nprof.kmer_tables = tables.copy()
+        nprof.engine = "numpy"
+
+        target = prof.create_sequence(seq)
+        expected = prof.score(target)
+        actual = nprof.score(target)
+        assert_allclose(actual[0].loglikelihood, expected[0].loglikelihood)
+        assert_allclose(actual[0].alt_viterbi_score, expected[0].alt_viterbi_score)
+
+
+@pytest.mark.slow
+def test_protein_profile_numpy_engine_speed():
+    filepath = example_filepath("2OG-FeII_Oxy_3.hmm")
+    with open_hmmer(filepath) as reader:
+        hmm = HMMERModel(reader.read_model())
+
+    prof = create_profile2(hmm, DNAAlphabet())
+    start = perf_counter()
+    nprof = create_profile2(hmm, DNAAlphabet(), engine="numpy")
+    build = perf_counter() - start
+
+    random = np.random.RandomState(0)
+    seqs = []
+    for _ in range(20):
+        size = random.randint(150, 301)
+        seq = bytes(random.choice(list(b"ACGT"), size).tolist())
+        seqs.append(prof.create_sequence(seq))
+
+    start = perf_counter()
+    expected = [prof.score(seq) for seq in seqs]
+    imm_time = perf_counter() - start
+
+    start = perf_counter()
+    actual = [nprof.score(seq) for seq in seqs]
+    numpy_time = perf_counter() - start
+
+    start = perf_counter()
+    batch = nprof.search_batch(seqs, np.inf)
+    batch_time = perf_counter() - start
+
+    print(
+        f"imm: {imm_time:.3f}s, numpy: {numpy_time:.3f}s, "
+        f"numpy batch: {batch_time:.3f}s, numpy tables: {build:.3f}s"
+    )
+    for e, a, b in zip(expected, actual, batch):
+        assert_allclose(a[0].loglikelihood, e[0].loglikelihood)
+        assert_allclose(b.scores[0].loglikelihood, e[0].loglikelihood)